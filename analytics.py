@@ -0,0 +1,279 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import historyStore
+
+# Rough time a length is worth at Hong Kong race pace
+SECONDS_PER_LENGTH = 0.17
+
+# Figure points for running 1% faster than par
+POINTS_PER_PERCENT = 10
+
+# Races needed at a (venue, course, distance) before its own par time is trusted
+MIN_PAR_RACES = 3
+
+# History store columns the analysis reads, loading only these keeps it fast on years of history
+RESULT_COLUMNS = ['race_date', 'venue', 'race_no', 'horse', 'place', 'place_num', 'lbw_lengths',
+                  'running_position', 'finish_seconds']
+RACE_COLUMNS = ['race_date', 'venue', 'race_no', 'race_class', 'distance', 'going', 'course', 'total_seconds']
+SECTIONAL_COLUMNS = ['race_date', 'venue', 'race_no', 'section', 'seconds']
+
+
+def build_history(results, races):
+    """
+    Joins runner results to their race details and works out each run's time and position data.
+
+    Runners without a recorded finish time are given the winner's time plus their
+    beaten margin, and the field size is counted per race.
+
+    Args:
+        results (pd.DataFrame): From historyStore.load_results.
+        races (pd.DataFrame): From historyStore.load_races.
+
+    Returns:
+        pd.DataFrame: One row per run.
+    """
+    keys = ['race_date', 'venue', 'race_no']
+    runs = results.merge(races[keys + ['distance', 'going', 'course', 'race_class', 'total_seconds']],
+                         on=keys, how='left')
+    for column in ('venue', 'going', 'course'):
+        runs[column] = runs[column].astype(str)
+
+    estimated = runs['total_seconds'] + runs['lbw_lengths'] * SECONDS_PER_LENGTH
+    runs['time'] = runs['finish_seconds'].fillna(estimated)
+
+    runs['field_size'] = runs.groupby(keys)['horse'].transform('size')
+    runs['surface'] = np.where(runs['course'].str.contains('ALL WEATHER', case=False), 'AWT', 'TURF')
+    return runs
+
+
+def par_times(runs, benchmarks=None):
+    """
+    Works out a par (median winning) time for each run's venue, course and distance.
+
+    Tracks with fewer than MIN_PAR_RACES races fall back to the venue and distance,
+    then to the distance alone.
+
+    Args:
+        runs (pd.DataFrame): From build_history.
+        benchmarks (pd.DataFrame): From historyStore.load_par_times. The pars are then rolled up
+            from its stored final times (of every stored race, not only those in runs)
+            instead of grouping every winner in runs.
+
+    Returns:
+        pd.Series: Par time in seconds, aligned with runs.
+    """
+    if benchmarks is not None:
+        times = benchmarks[['venue', 'course', 'distance', 'times']].explode('times').dropna(subset=['times'])
+        times['times'] = times['times'].astype(float)
+
+    def level(keys):
+        # Median winning time and number of races of each run's group
+        if benchmarks is None:
+            grouped = runs['time'].where(runs['place_num'] == 1).groupby([runs[key] for key in keys])
+            return grouped.transform('median'), grouped.transform('count')
+        table = times.groupby(keys)['times'].agg(['median', 'count']).reset_index()
+        aligned = runs[keys].astype({'distance': float}).merge(table.astype({'distance': float}), on=keys, how='left')
+        return aligned['median'].set_axis(runs.index), aligned['count'].fillna(0).set_axis(runs.index)
+
+    par = pd.Series(np.nan, index=runs.index)
+    for keys in (['venue', 'course', 'distance'], ['venue', 'distance'], ['distance']):
+        median, count = level(keys)
+        par = par.fillna(median.where(count >= MIN_PAR_RACES))
+    # Anything left (a distance run fewer than MIN_PAR_RACES times) uses whatever median there is
+    return par.fillna(level(['distance'])[0])
+
+
+def speed_figures(runs, benchmarks=None):
+    """
+    Adds distance-, course- and going-adjusted speed figures to every run.
+
+    The raw figure is how much faster than par a run was, POINTS_PER_PERCENT
+    points per 1%, around 100. The going adjustment is the meeting's track
+    variant: the median amount by which that day's winners on the same surface
+    were slower than par.
+
+    Args:
+        runs (pd.DataFrame): From build_history.
+        benchmarks (pd.DataFrame): Optional stored par times, see par_times.
+
+    Returns:
+        pd.DataFrame: runs with 'par', 'variant' and 'figure' columns added.
+    """
+    runs = runs.copy()
+    runs['par'] = par_times(runs, benchmarks)
+    relative = (runs['par'] - runs['time']) / runs['par']
+    winner_slowness = (-relative).where(runs['place_num'] == 1)
+    runs['variant'] = winner_slowness.groupby([runs['race_date'], runs['venue'], runs['surface']]) \
+        .transform('median').fillna(0.0)
+    runs['figure'] = 100 + 100 * POINTS_PER_PERCENT * (relative + runs['variant'])
+    return runs
+
+
+def form_lines(runs, today, last_runs=6):
+    """
+    Summarises each horse's recent form before a given date.
+
+    Args:
+        runs (pd.DataFrame): From speed_figures.
+        today (str): Card date 'YYYY-MM-DD'. Only earlier runs count.
+        last_runs (int): Runs included in the form line and averages.
+
+    Returns:
+        pd.DataFrame: Indexed by horse, with the form line (latest first), figures, pace profile and days since the last run.
+    """
+    today = pd.Timestamp(today)
+    recent = runs[runs['race_date'] < today].sort_values(['horse', 'race_date'], ascending=[True, False])
+    recent = recent[recent.groupby('horse').cumcount() < last_runs].copy()
+    recent['place'] = recent['place'].fillna('-').astype(str)
+
+    # Running position '3 4 2': first call against the field size, and places made up from first call to finish
+    positions = recent['running_position'].fillna('').str.extract(r'^\s*(\d+)(?:.*\s(\d+))?\s*$').astype(float)
+    early, late = positions[0], positions[1].fillna(positions[0])
+    recent['early_fraction'] = early / recent['field_size']
+    recent['late_gain'] = early - late
+
+    grouped = recent.groupby('horse', sort=False)
+    form = grouped.agg(
+        runs=('figure', 'size'),
+        form=('place', '/'.join),
+        last_figure=('figure', 'first'),
+        mean_figure=('figure', 'mean'),
+        best_figure=('figure', 'max'),
+        mean_place=('place_num', 'mean'),
+        early_fraction=('early_fraction', 'mean'),
+        late_gain=('late_gain', 'mean'),
+        last_run=('race_date', 'first'),
+        last_distance=('distance', 'first'),
+    )
+    form['days_since'] = (today - form['last_run']).dt.days
+    return form.drop(columns='last_run')
+
+
+def sectional_profiles(runs, sectionals):
+    """
+    Describes the pace of every race a horse ran in, from the race's sectional splits.
+
+    The early pace is the first section's share of the race time and the finish
+    is the last section's share. A lower share means a faster part of the race.
+
+    Args:
+        runs (pd.DataFrame): From build_history.
+        sectionals (pd.DataFrame): From historyStore.load_sectionals.
+
+    Returns:
+        pd.DataFrame: Indexed by horse, mean early and finishing shares of the races it ran.
+    """
+    keys = ['race_date', 'venue', 'race_no']
+    if sectionals.empty:
+        return pd.DataFrame(columns=['race_early_share', 'race_finish_share'])
+    sectionals = sectionals.assign(venue=sectionals['venue'].astype(str)).sort_values(keys + ['section'])
+    grouped = sectionals.groupby(keys)['seconds']
+    pace = pd.DataFrame({'first': grouped.first(), 'last': grouped.last(), 'total': grouped.sum()}).reset_index()
+    pace['race_early_share'] = pace['first'] / pace['total']
+    pace['race_finish_share'] = pace['last'] / pace['total']
+    per_run = runs[keys + ['horse']].merge(pace[keys + ['race_early_share', 'race_finish_share']], on=keys)
+    return per_run.groupby('horse')[['race_early_share', 'race_finish_share']].mean()
+
+
+def distance_form(runs, card, today, window=200):
+    """
+    Mean figure of each card runner's earlier runs within `window` metres of today's distance.
+
+    Args:
+        runs (pd.DataFrame): From speed_figures.
+        card (pd.DataFrame): From historyStore.load_racecards, one row per runner.
+        today (str): Card date 'YYYY-MM-DD'.
+        window (int): Distance tolerance in metres.
+
+    Returns:
+        pd.Series: Mean figure at the trip, indexed like card.
+    """
+    past = runs.loc[runs['race_date'] < pd.Timestamp(today), ['horse', 'distance', 'figure']]
+    pairs = card[['horse', 'distance']].reset_index().merge(past, on='horse', suffixes=('', '_run'))
+    pairs = pairs[(pairs['distance'] - pairs['distance_run']).abs() <= window]
+    return pairs.groupby('index')['figure'].mean().reindex(card.index)
+
+
+def rank_card(card, runs, sectionals, today, last_runs=6, speed_pro=None):
+    """
+    Rates every runner on a card against its history in one pass.
+
+    Args:
+        card (pd.DataFrame): From historyStore.load_racecards for one date.
+        runs (pd.DataFrame): From speed_figures.
+        sectionals (pd.DataFrame): From historyStore.load_sectionals.
+        today (str): Card date 'YYYY-MM-DD'.
+        last_runs (int): Runs counted in each horse's form.
+        speed_pro (pd.DataFrame): Optional Speed Pro table, matched to runners by brand number.
+
+    Returns:
+        pd.DataFrame: One row per runner, with form, figures, pace profile and 'rank' within its race
+            (1 = best mean figure over the last runs).
+    """
+    columns = ['race_date', 'venue', 'race_no', 'horse_no', 'horse', 'horse_name', 'draw', 'weight',
+               'rating', 'distance', 'going', 'jockey', 'trainer']
+    ranked = card[[column for column in columns if column in card.columns]].copy()
+
+    # Pars and variants need every race, the rest only the runners on the card
+    runs = runs[runs['horse'].isin(card['horse'])]
+    ranked = ranked.join(form_lines(runs, today, last_runs), on='horse')
+    ranked = ranked.join(sectional_profiles(runs[runs['race_date'] < pd.Timestamp(today)], sectionals), on='horse')
+    ranked['figure_at_trip'] = distance_form(runs, card, today)
+
+    if speed_pro is not None and 'Horse' in speed_pro.columns:
+        ratings = speed_pro.assign(horse=speed_pro['Horse'].str.extract(r'\(([A-Z]\d+)\)', expand=False))
+        ratings = ratings.dropna(subset=['horse']).drop_duplicates('horse').set_index('horse')
+        numeric = ratings.drop(columns=['Horse']).apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
+        ranked = ranked.join(numeric.add_prefix('speedpro_'), on='horse')
+
+    ranked['rank'] = ranked.groupby('race_no')['mean_figure'].rank(ascending=False, method='min')
+    return ranked.sort_values(['race_no', 'rank', 'horse_no'], na_position='last').reset_index(drop=True)
+
+
+def analyse_card(conn, today, last_runs=6, speed_pro=None):
+    """
+    Loads the history store and rates the card stored for a date.
+
+    Args:
+        conn: Connection from historyStore.connect().
+        today (str): Card date 'YYYY-MM-DD'.
+        last_runs (int): Runs counted in each horse's form.
+        speed_pro (pd.DataFrame): Optional Speed Pro table.
+
+    Returns:
+        pd.DataFrame: From rank_card (empty if no card is stored for the date).
+    """
+    card = historyStore.load_racecards(conn, start=today, end=today)
+    results = historyStore.load_results(conn, end=today, columns=RESULT_COLUMNS)
+    races = historyStore.load_races(conn, end=today, columns=RACE_COLUMNS)
+    runs = speed_figures(build_history(results, races), historyStore.load_par_times(conn))
+    sectionals = historyStore.load_sectionals(conn, end=today, columns=SECTIONAL_COLUMNS)
+    return rank_card(card, runs, sectionals, today, last_runs, speed_pro)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate a stored racecard against the race history store.")
+    parser.add_argument("--date", required=True, help="Card date (YYYY-MM-DD).")
+    parser.add_argument("--db", default=historyStore.HISTORY_DB, help="SQLite history store.")
+    parser.add_argument("--runs", type=int, default=6, help="Past runs counted in each horse's form.")
+    parser.add_argument("--output", help="Also save the ratings to this workbook.")
+    args = parser.parse_args()
+
+    conn = historyStore.connect(args.db)
+    try:
+        start = time.perf_counter()
+        ratings = analyse_card(conn, args.date, args.runs)
+        print(f"Rated {len(ratings)} runners in {time.perf_counter() - start:.2f}s")
+    finally:
+        conn.close()
+
+    if ratings.empty:
+        print(f"No racecard stored for {args.date}")
+    else:
+        print(ratings[['race_no', 'rank', 'horse_no', 'horse_name', 'form', 'last_figure', 'mean_figure',
+                       'figure_at_trip', 'days_since']].to_string(index=False, float_format='%.1f'))
+        if args.output:
+            ratings.to_excel(args.output, index=False)
+            print(f"Data saved to {args.output}")
@@ -0,0 +1,461 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl
+import pandas as pd
+from fetchBackend import HttpFetcher
+from pageCache import PageCache, CachedFetcher
+from pageArchive import ARCHIVE_FOLDER, PageArchive, ArchivingFetcher
+from fetchPolicy import FetchPolicy
+from pastRaces import fetch_meeting_results, fetch_dates, parse_result_urls, parse_results_records
+from utils import save_to_csv_with_sheets
+from exportWriter import EXPORT_FORMATS, with_format
+from historyStore import HISTORY_DB, connect, upsert_meeting_results, upsert_race_records
+from workQueue import QUEUE_FILE, WorkQueue, Heartbeat, worker_name
+
+RESULTS_URL = 'https://racing.hkjc.com/racing/information/English/racing/LocalResults.aspx'
+DATES_FILE = 'Data/all-past-dates.xlsx'
+CHECKPOINT_FILE = 'Data/backfill-checkpoint.json'
+
+
+class Checkpoint:
+    """
+    Durable record of which meetings a backfill has finished.
+
+    The file is rewritten atomically after every meeting, so an interrupted run
+    never leaves it half written and the next run skips everything recorded here.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): JSON file holding the checkpoint.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed = {}
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.completed = state.get('completed', {})
+            self.failed = state.get('failed', {})
+
+    def is_done(self, date):
+        return date.isoformat() in self.completed
+
+    def mark_done(self, date, races, file_name):
+        with self._lock:
+            self.completed[date.isoformat()] = {'races': races, 'file': file_name}
+            self.failed.pop(date.isoformat(), None)
+            self._save()
+
+    def mark_failed(self, date, error):
+        with self._lock:
+            attempts = self.failed.get(date.isoformat(), {}).get('attempts', 0) + 1
+            self.failed[date.isoformat()] = {'attempts': attempts, 'error': str(error)}
+            self._save()
+
+    def _save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'completed': self.completed, 'failed': self.failed}, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+def parse_meeting_date(text):
+    """
+    Parses a date from the results page date dropdown.
+
+    Args:
+        text (str): Date such as '19/10/2025' (or '2025/10/19').
+
+    Returns:
+        datetime.date: The meeting date.
+    """
+    for date_format in ('%d/%m/%Y', '%Y/%m/%d', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text.strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised meeting date: {text}")
+
+
+def load_meeting_dates(dates_file, fetcher=None, results_url=RESULTS_URL):
+    """
+    Loads every meeting date, from the saved dates workbook or, if a fetcher is given, from the live dropdown.
+
+    Args:
+        dates_file (str): Workbook written by the crawler's past race dates stage.
+        fetcher: Optional fetch backend used to refresh the list.
+        results_url (str): Results page carrying the date dropdown.
+
+    Returns:
+        list: Sorted meeting dates (datetime.date).
+    """
+    if fetcher is not None:
+        all_dates = fetch_dates(fetcher, pd, results_url)
+        if all_dates:
+            if os.path.dirname(dates_file):
+                os.makedirs(os.path.dirname(dates_file), exist_ok=True)
+            save_to_csv_with_sheets(all_dates, dates_file, pd)
+
+    df = pd.read_excel(dates_file, sheet_name=0, dtype=str)
+    dates = set()
+    for text in df['Dates'].dropna():
+        try:
+            dates.add(parse_meeting_date(text))
+        except ValueError as e:
+            print(e)
+    return sorted(dates)
+
+
+def meeting_url(date, results_url=RESULTS_URL):
+    return f"{results_url}?RaceDate={date.strftime('%Y/%m/%d')}"
+
+
+def scrape_meeting(fetcher, date, data_folder, results_url=RESULTS_URL, export_format='xlsx'):
+    """
+    Scrapes every race of one meeting into Data/<date>/past_races_data_<date>.xlsx (or .csv.gz / .parquet).
+
+    Args:
+        fetcher: Fetch backend.
+        date (datetime.date): Meeting date.
+        data_folder (str): Root data folder.
+        results_url (str): Results page URL.
+        export_format (str): 'xlsx', 'csv' or 'parquet'.
+
+    Returns:
+        tuple: ((race number, DataFrame) pairs, output file).
+
+    Raises:
+        RuntimeError: If any race of the meeting could not be scraped, so the meeting is retried next run.
+    """
+    races = fetch_meeting_results(fetcher, meeting_url(date, results_url), pd)
+    failed = [race_num for race_num, df in races if df.empty]
+    if failed:
+        raise RuntimeError(f"races {', '.join(failed)} failed")
+
+    folder_path = os.path.join(data_folder, date.isoformat())
+    os.makedirs(folder_path, exist_ok=True)
+    file_name = with_format(os.path.join(folder_path, f'past_races_data_{date.isoformat()}.xlsx'), export_format)
+    save_to_csv_with_sheets((df for race_num, df in races), file_name, pd)
+    return races, file_name
+
+
+def backfill(start, end, concurrency=4, data_folder='Data', dates_file=DATES_FILE,
+             checkpoint_file=CHECKPOINT_FILE, refresh_dates=False, rate=2.0, results_url=RESULTS_URL,
+             history_db=HISTORY_DB, export_format='xlsx', archive_folder=ARCHIVE_FOLDER, cache_folder=None):
+    """
+    Scrapes every meeting between two dates, resuming from the checkpoint.
+
+    Args:
+        start (datetime.date): First meeting date to include, or None for the earliest.
+        end (datetime.date): Last meeting date to include, or None for the latest.
+        concurrency (int): Meetings scraped at once, and the size of the HTTP connection pool.
+        data_folder (str): Root data folder.
+        dates_file (str): Workbook of meeting dates.
+        checkpoint_file (str): JSON checkpoint file.
+        refresh_dates (bool): Re-read the date dropdown before starting.
+        rate (float): Starting request rate (requests per second) of the fetch policy's adaptive limiter.
+        results_url (str): Results page URL.
+        history_db (str): History store every finished meeting is added to.
+        export_format (str): Output format of the per-meeting files, 'xlsx', 'csv' or 'parquet'.
+        archive_folder (str): Page archive the fetched pages are kept in, or None to not archive them.
+        cache_folder (str): Page cache folder, defaults to 'cache' inside data_folder.
+
+    Returns:
+        dict: Counts of 'done', 'skipped' and 'failed' meetings.
+    """
+    checkpoint = Checkpoint(checkpoint_file)
+    conn = connect(history_db)
+    # Paced, retried and circuit broken per host, so failed pages are retried instead of lost
+    policy = FetchPolicy(rate=rate, burst=concurrency)
+    limiter = policy.limiter(results_url)
+    summary = {'done': 0, 'skipped': 0, 'failed': 0}
+
+    cache = PageCache(cache_folder or os.path.join(data_folder, 'cache'))
+    archive = PageArchive(archive_folder) if archive_folder else None
+    fetcher = HttpFetcher(max_connections=concurrency, policy=policy)
+    if archive is not None:
+        fetcher = ArchivingFetcher(fetcher, archive)
+    with CachedFetcher(fetcher, cache) as fetcher:
+        dates = load_meeting_dates(dates_file, fetcher if refresh_dates else None, results_url)
+        dates = [date for date in dates if (start is None or date >= start) and (end is None or date <= end)]
+
+        pending = [date for date in dates if not checkpoint.is_done(date)]
+        summary['skipped'] = len(dates) - len(pending)
+        print(f"{len(dates)} meetings in range, {summary['skipped']} already done, {len(pending)} to scrape")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(scrape_meeting, fetcher, date, data_folder, results_url,
+                                       export_format): date for date in pending}
+            for future in as_completed(futures):
+                date = futures[future]
+                try:
+                    races, file_name = future.result()
+                    upsert_meeting_results(conn, races)
+                    checkpoint.mark_done(date, len(races), file_name)
+                    summary['done'] += 1
+                    print(f"Finished {date} ({len(races)} races, {limiter.rate:.1f} req/s)")
+                except Exception as e:
+                    checkpoint.mark_failed(date, e)
+                    summary['failed'] += 1
+                    print(f"Failed {date}: {e}")
+
+    conn.close()
+    stats = cache.stats()
+    cache.close()
+    if archive is not None:
+        archive.close()
+    print(f"Page cache: {stats['hits']} hits, {stats['misses']} misses")
+    policy_stats = policy.stats()
+    print(f"Fetch policy: {policy_stats['retries']} retries, {policy_stats['failures']} failed pages")
+    print(f"Backfill finished: {summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed")
+    return summary
+
+
+def meeting_task(date, results_url=RESULTS_URL):
+    """Queue task for a meeting: its first race, which also lists the others."""
+    return (f'meeting {date.isoformat()}', 'meeting', {'url': meeting_url(date, results_url), 'race_no': 1}, 1)
+
+
+def race_task(url):
+    """Queue task for one race of a meeting, or None for the first race (done by the meeting task)."""
+    params = {key.lower(): value for key, value in parse_qsl(urlsplit(url).query)}
+    race_no = int(params.get('raceno', 1))
+    if race_no == 1:
+        return None
+    race_date = params.get('racedate', '').replace('/', '-')
+    # Races go before meetings, so meetings already started are finished first
+    return (f"race {race_date} {params.get('racecourse', '')} {race_no:02d}", 'race', {'url': url, 'race_no': race_no}, 0)
+
+
+def run_task(kind, payload, fetcher, conn, queue):
+    """
+    Scrapes one race into the history store. A meeting task also queues the meeting's other races.
+
+    Returns:
+        int: Number of runners stored.
+
+    Raises:
+        RuntimeError: If the page has no results, so the task is retried.
+    """
+    html = fetcher.get(payload['url'])
+    records = parse_results_records(html, payload['race_no'])
+    if records is None:
+        raise RuntimeError("no results on the page")
+    stored = upsert_race_records(conn, *records)
+
+    if kind == 'meeting':
+        urls = [url for url in parse_result_urls(html, payload['url']) if 'Racecourse=S1' not in url]
+        queue.add(task for task in map(race_task, urls) if task is not None)
+    return stored
+
+
+def queue_worker(queue_file=QUEUE_FILE, history_db=HISTORY_DB, fetch_backend='http', rate=2.0, lease_seconds=120.0,
+                 max_attempts=4, archive_folder=None, idle_wait=0.5):
+    """
+    Works through a backfill queue until no task is left, then returns.
+
+    Runs in its own process with its own HTTP session (or browser) and database
+    connections. Leases are renewed in the background while a task runs, so a
+    task only goes back to the queue if the worker dies or gives it up.
+
+    Args:
+        queue_file (str): SQLite work queue.
+        history_db (str): History store the races are written to.
+        fetch_backend (str): 'http', or 'selenium' for a headless browser per worker.
+        rate (float): Starting request rate of this worker.
+        lease_seconds (float): Lease length; a crashed worker's tasks are picked up this long after it died.
+        max_attempts (int): Claims of a task before it is given up.
+        archive_folder (str): Page archive the fetched pages are kept in, or None.
+        idle_wait (float): Seconds to wait for other workers' tasks when nothing can be claimed.
+
+    Returns:
+        dict: worker id, tasks done and failed, runners stored and seconds.
+    """
+    worker_id = worker_name()
+    queue = WorkQueue(queue_file, lease_seconds, max_attempts)
+    conn = connect(history_db)
+    driver = None
+    if fetch_backend == 'selenium':
+        from browser import create_driver
+        from fetchBackend import SeleniumFetcher
+        driver = create_driver(lean=True)
+        fetcher = SeleniumFetcher(driver)
+    else:
+        fetcher = HttpFetcher(max_connections=1, policy=FetchPolicy(rate=rate, burst=1))
+    archive = PageArchive(archive_folder) if archive_folder else None
+    if archive is not None:
+        fetcher = ArchivingFetcher(fetcher, archive)
+
+    summary = {'worker': worker_id, 'done': 0, 'failed': 0, 'runners': 0}
+    start = time.perf_counter()
+    try:
+        with Heartbeat(queue_file, worker_id, lease_seconds):
+            while True:
+                tasks = queue.claim(worker_id)
+                if not tasks:
+                    # Other workers' meetings may still add races, or their tasks may still fail back
+                    stats = queue.stats()
+                    if not stats['pending'] and not stats['leased'] and not stats['expired']:
+                        break
+                    time.sleep(idle_wait)
+                    continue
+
+                for task_id, kind, payload, attempt in tasks:
+                    try:
+                        summary['runners'] += run_task(kind, payload, fetcher, conn, queue)
+                        queue.complete(task_id, worker_id)
+                        summary['done'] += 1
+                    except Exception as e:
+                        queue.fail(task_id, worker_id, e)
+                        summary['failed'] += 1
+                        print(f"{worker_id}: {task_id} failed on attempt {attempt}: {e}")
+    finally:
+        fetcher.close()
+        if driver is not None:
+            driver.quit()
+        if archive is not None:
+            archive.close()
+        conn.close()
+        queue.close()
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def backfill_queue(start, end, processes=4, queue_file=QUEUE_FILE, dates_file=DATES_FILE, refresh_dates=False,
+                   rate=2.0, results_url=RESULTS_URL, history_db=HISTORY_DB, fetch_backend='http',
+                   lease_seconds=120.0, max_attempts=4, archive_folder=ARCHIVE_FOLDER, retry_failed=False):
+    """
+    Backfills through a shared SQLite work queue, with any number of worker processes.
+
+    Every meeting in range is queued (meetings already queued are left as
+    they are, so the queue doubles as the checkpoint) and each meeting queues
+    its races as it is scraped. More workers can join from other terminals by
+    running the same command on the same queue file; each one leaves when the
+    queue is empty. Results go to the history store only: export workbooks
+    from it (or run backfill without --queue) when per-meeting files are needed.
+
+    Args:
+        start (datetime.date): First meeting date to include, or None for the earliest.
+        end (datetime.date): Last meeting date to include, or None for the latest.
+        processes (int): Worker processes to start here, 0 to only queue the meetings.
+        queue_file (str): SQLite work queue.
+        dates_file (str): Workbook of meeting dates.
+        refresh_dates (bool): Re-read the date dropdown before queueing.
+        rate (float): Starting request rate of each worker.
+        results_url (str): Results page URL.
+        history_db (str): History store the races are written to.
+        fetch_backend (str): 'http', or 'selenium' for a headless browser per worker.
+        lease_seconds (float): Lease length.
+        max_attempts (int): Claims of a task before it is given up.
+        archive_folder (str): Page archive the fetched pages are kept in, or None.
+        retry_failed (bool): Requeue the tasks earlier runs gave up on.
+
+    Returns:
+        dict: Task counts by state once the workers have finished.
+    """
+    queue = WorkQueue(queue_file, lease_seconds, max_attempts)
+    if refresh_dates:
+        with HttpFetcher() as fetcher:
+            dates = load_meeting_dates(dates_file, fetcher, results_url)
+    else:
+        dates = load_meeting_dates(dates_file, None, results_url)
+    dates = [date for date in dates if (start is None or date >= start) and (end is None or date <= end)]
+    added = queue.add(meeting_task(date, results_url) for date in dates)
+    if retry_failed:
+        print(f"Requeued {queue.retry_failed()} failed tasks")
+    print(f"{len(dates)} meetings in range, {added} newly queued: {queue.stats()}")
+
+    if processes > 0:
+        print(f"Starting {processes} workers on {queue_file}...")
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(queue_worker, queue_file, history_db, fetch_backend, rate, lease_seconds,
+                                       max_attempts, archive_folder) for _ in range(processes)]
+            for future in as_completed(futures):
+                try:
+                    worker = future.result()
+                    print(f"Worker {worker['worker']} finished: {worker['done']} tasks done, {worker['failed']} failed, "
+                          f"{worker['runners']} runners in {worker['seconds']:.1f}s")
+                except Exception as e:
+                    print(f"Worker crashed: {e}")
+        print(f"Workers finished in {time.perf_counter() - start_time:.1f}s")
+
+    stats = queue.stats()
+    for task_id, attempts, error in queue.failures():
+        print(f"Gave up on {task_id} after {attempts} attempts: {error}")
+    queue.close()
+    print(f"Queue: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill past race results for a range of meeting dates.")
+    parser.add_argument("--start", help="First date to include (YYYY-MM-DD). Defaults to the earliest meeting.")
+    parser.add_argument("--end", help="Last date to include (YYYY-MM-DD). Defaults to the latest meeting.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Meetings and HTTP requests in flight at once.")
+    parser.add_argument("--rate", type=float, default=2.0, help="Starting request rate in requests per second.")
+    parser.add_argument("--data-folder", default="Data", help="Root folder for the scraped workbooks.")
+    parser.add_argument("--dates-file", default=DATES_FILE, help="Workbook of meeting dates from the crawler.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint file used to resume.")
+    parser.add_argument("--db", default=HISTORY_DB, help="History store to add the results to.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="xlsx",
+                        help="Output format: xlsx, gzip-compressed csv, or parquet (needs pyarrow).")
+    parser.add_argument("--archive", default=ARCHIVE_FOLDER, help="Page archive folder for the fetched pages.")
+    parser.add_argument("--no-archive", action="store_true", help="Do not archive the fetched pages.")
+    parser.add_argument("--cache-folder", default=None,
+                        help="Page cache folder. Defaults to 'cache' inside --data-folder.")
+    parser.add_argument("--refresh-dates", action="store_true", help="Re-read the meeting dates from the site first.")
+    parser.add_argument("--queue", nargs="?", const=QUEUE_FILE, default=None,
+                        help=f"Share the work through a SQLite queue (default file: {QUEUE_FILE}) between worker "
+                             "processes; run the same command elsewhere to add workers.")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes with --queue, 0 to only queue.")
+    parser.add_argument("--fetch-backend", choices=["http", "selenium"], default="http",
+                        help="How --queue workers load pages: one HTTP session or one headless browser each.")
+    parser.add_argument("--lease", type=float, default=120.0,
+                        help="Seconds before the tasks of a --queue worker that stopped responding are picked up again.")
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue the --queue tasks earlier runs gave up on.")
+    args = parser.parse_args()
+
+    if args.queue:
+        backfill_queue(
+            parse_meeting_date(args.start) if args.start else None,
+            parse_meeting_date(args.end) if args.end else None,
+            processes=args.processes,
+            queue_file=args.queue,
+            dates_file=args.dates_file,
+            refresh_dates=args.refresh_dates,
+            rate=args.rate,
+            history_db=args.db,
+            fetch_backend=args.fetch_backend,
+            lease_seconds=args.lease,
+            archive_folder=None if args.no_archive else args.archive,
+            retry_failed=args.retry_failed,
+        )
+    else:
+        backfill(
+            parse_meeting_date(args.start) if args.start else None,
+            parse_meeting_date(args.end) if args.end else None,
+            concurrency=args.concurrency,
+            data_folder=args.data_folder,
+            dates_file=args.dates_file,
+            checkpoint_file=args.checkpoint,
+            refresh_dates=args.refresh_dates,
+            rate=args.rate,
+            history_db=args.db,
+            export_format=args.format,
+            archive_folder=None if args.no_archive else args.archive,
+            cache_folder=args.cache_folder,
+        )
@@ -0,0 +1,275 @@
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from scrapeRacePage import scrape_race, parse_race_page, extract_urls_from_racingNum, scrape_all_pages, fetch_all_pages
+from trainerJockey import scrape_trainer_jockey, fetch_trainer_jockey
+from speedPro import scrape_all_pages_speed_pro
+from pastRaces import scrape_pastRaces, fetch_pastRaces
+from pageSnapshot import take_snapshot
+from fetchBackend import HttpFetcher
+from replayServer import SITE_FIXTURES, PAGE_PATHS, start_replay_server
+import runMetrics
+
+RACECARD_FIXTURES = 'fixtures/racecard'
+
+
+def load_fixtures(folder):
+    """
+    Lists the saved HTML fixtures in a folder.
+
+    Args:
+        folder (str): Folder containing .html fixtures.
+
+    Returns:
+        list: Sorted fixture file paths.
+    """
+    return sorted(glob.glob(os.path.join(folder, '*.html')))
+
+
+def benchmark_parse(paths, repeat):
+    """
+    Times the in-process snapshot parser on each fixture.
+
+    Args:
+        paths (list): Fixture file paths.
+        repeat (int): Number of times each fixture is parsed.
+
+    Returns:
+        dict: Fixture name -> average milliseconds per page.
+    """
+    results = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parse_race_page(html, pd)
+        results[os.path.basename(path)] = (time.perf_counter() - start) * 1000 / repeat
+    return results
+
+
+def benchmark_browser(driver, By, paths, repeat):
+    """
+    Loads each fixture in Chrome and times the per-cell WebDriver scrape against the snapshot scrape.
+
+    Both modes must produce the same DataFrame, otherwise the fixture is reported as a mismatch.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        By: Selenium By module.
+        paths (list): Fixture file paths.
+        repeat (int): Number of times each page is scraped in each mode.
+
+    Returns:
+        dict: Fixture name -> (webdriver ms, snapshot ms, frames match).
+    """
+    results = {}
+    for path in paths:
+        url = 'file://' + os.path.abspath(path)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            webdriver_df = scrape_race(driver, url, By, pd)
+        webdriver_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            snapshot_df = scrape_race(driver, url, By, pd, snapshot=True)
+        snapshot_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        match = webdriver_df is not None and snapshot_df is not None and webdriver_df.equals(snapshot_df)
+        results[os.path.basename(path)] = (webdriver_ms, snapshot_ms, match)
+    return results
+
+
+def scraper_scenarios(base_url, out_folder, driver=None, By=None):
+    """
+    Lists the scrapers to benchmark against a replay server.
+
+    The HTTP scenarios always run; the browser scenarios (the original
+    per-element scrapers) only when a driver is given.
+
+    Args:
+        base_url (str): Replay server URL.
+        out_folder (str): Folder the scrapers write their workbooks into.
+        driver: Selenium WebDriver instance, or None to skip the browser scrapers.
+        By: Selenium By module.
+
+    Returns:
+        list: (name, callable) pairs. Each callable runs one full scrape.
+    """
+    url = {kind: base_url + path for kind, path in PAGE_PATHS.items()}
+    out = lambda name: os.path.join(out_folder, f'{name}.xlsx')
+    fetcher = HttpFetcher()
+
+    scenarios = [
+        ('racecard (http)', lambda: fetch_all_pages(fetcher, url['racecard'], pd, out('racecard_http'))),
+        ('trainer (http)', lambda: fetch_trainer_jockey(fetcher, url['trainer'], pd, out('trainer_http'))),
+        ('jockey (http)', lambda: fetch_trainer_jockey(fetcher, url['jockey'], pd, out('jockey_http'))),
+        ('results (http)', lambda: fetch_pastRaces(fetcher, url['results'], pd, out('results_http'))),
+    ]
+    if driver is not None:
+        scenarios += [
+            ('racecard (webdriver)', lambda: scrape_all_pages(driver, url['racecard'], By, pd, out('racecard'))),
+            ('racecard (snapshot)', lambda: scrape_all_pages(driver, url['racecard'], By, pd, out('racecard'), snapshot=True)),
+            ('trainer (webdriver)', lambda: scrape_trainer_jockey(driver, url['trainer'], By, pd, out('trainer'))),
+            ('jockey (webdriver)', lambda: scrape_trainer_jockey(driver, url['jockey'], By, pd, out('jockey'))),
+            ('speedpro (webdriver)', lambda: scrape_all_pages_speed_pro(driver, url['speedpro'], By, pd, out('speedpro'))),
+            ('results (webdriver)', lambda: scrape_pastRaces(driver, url['results'], By, pd, out('results'))),
+            ('results (batched)', lambda: scrape_pastRaces(driver, url['results'], By, pd, out('results'), batched=True)),
+        ]
+    return scenarios
+
+
+def benchmark_scrapers(scenarios, repeat, trace_memory=False):
+    """
+    Runs each scraper scenario and measures its throughput, page latency and memory.
+
+    Args:
+        scenarios (list): (name, callable) pairs from scraper_scenarios.
+        repeat (int): Times each scenario is run.
+        trace_memory (bool): Also measure the peak Python heap with tracemalloc (slows the run down).
+
+    Returns:
+        dict: Scenario name -> pages, seconds, pages_per_sec, p50/p95/max latency (seconds),
+              WebDriver calls, peak RSS (MB) and, with trace_memory, peak heap (MB).
+    """
+    results = {}
+    for name, scenario in scenarios:
+        metrics = runMetrics.RunMetrics()
+        runMetrics.activate(metrics)
+        if trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            for _ in range(repeat):
+                scenario()
+        finally:
+            seconds = time.perf_counter() - start
+            runMetrics.activate(None)
+
+        latencies = [page['seconds'] for page in metrics.pages]
+        results[name] = {
+            'pages': len(latencies),
+            'failed_pages': sum(1 for page in metrics.pages if not page['ok']),
+            'seconds': round(seconds, 3),
+            'pages_per_sec': round(len(latencies) / seconds, 2) if seconds else None,
+            'p50': runMetrics.percentile(latencies, 0.5),
+            'p95': runMetrics.percentile(latencies, 0.95),
+            'max': max(latencies) if latencies else None,
+            'webdriver_calls': sum(metrics.commands.values()),
+            'peak_rss_mb': runMetrics.peak_memory_mb(),
+        }
+        if trace_memory:
+            results[name]['peak_heap_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+    return results
+
+
+def print_scraper_results(results):
+    print(f"  {'scenario':<22} {'pages':>5} {'pages/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'calls':>6} {'RSS MB':>7}")
+    for name, result in results.items():
+        ms = lambda value: f"{value * 1000:.1f}" if value is not None else '-'
+        print(f"  {name:<22} {result['pages']:>5} {result['pages_per_sec'] or 0:>8.1f} {ms(result['p50']):>8} "
+              f"{ms(result['p95']):>8} {ms(result['max']):>8} {result['webdriver_calls']:>6} "
+              f"{result['peak_rss_mb'] or 0:>7.1f}"
+              + (f"  heap {result['peak_heap_mb']} MB" if 'peak_heap_mb' in result else ''))
+
+
+def record_racecards(driver, By, url, folder):
+    """
+    Saves a snapshot of every racecard page reachable from the given URL as a fixture.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        By: Selenium By module.
+        url (str): Racecard URL to start from.
+        folder (str): Folder to write the fixtures into.
+
+    Returns:
+        None
+    """
+    os.makedirs(folder, exist_ok=True)
+    driver.get(url)
+    urls = extract_urls_from_racingNum(driver, By)
+    urls.insert(0, url)
+    urls = [url for url in urls if 'Racecourse=S1' not in url]
+
+    for i, page_url in enumerate(urls):
+        driver.get(page_url)
+        path = os.path.join(folder, f'race_{i + 1}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(take_snapshot(driver))
+        print(f"Recorded {page_url} -> {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing and scraping against saved fixtures.")
+    parser.add_argument("--fixtures", default=RACECARD_FIXTURES, help="Folder of saved racecard pages.")
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per page.")
+    parser.add_argument("--browser", action="store_true",
+                        help="Also load each fixture in headless Chrome and compare per-cell scraping with snapshot scraping.")
+    parser.add_argument("--record", metavar="URL",
+                        help="Record live racecard pages from URL into the fixtures folder before benchmarking.")
+    parser.add_argument("--lean", action="store_true",
+                        help="Use the lean browser profile (eager page loads, images and trackers blocked).")
+    parser.add_argument("--replay", action="store_true",
+                        help="Run the scrapers end to end against a local server replaying the recorded site.")
+    parser.add_argument("--site-fixtures", default=SITE_FIXTURES, help="Folder of recorded site pages for --replay.")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of delay the replay server adds to every response.")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the peak Python heap per scenario.")
+    parser.add_argument("--output", help="Write the --replay results to this JSON file, to compare runs.")
+    args = parser.parse_args()
+
+    if args.record or args.browser:
+        from selenium.webdriver.common.by import By
+        from browser import create_driver
+        driver = create_driver(lean=args.lean)
+    else:
+        driver = None
+
+    try:
+        if args.record:
+            record_racecards(driver, By, args.record, args.fixtures)
+
+        paths = load_fixtures(args.fixtures)
+        if not paths:
+            print(f"No fixtures found in {args.fixtures}")
+        else:
+            print(f"Snapshot parse ({len(paths)} pages, {args.repeat} iterations):")
+            for name, ms in benchmark_parse(paths, args.repeat).items():
+                print(f"  {name}: {ms:.2f} ms/page")
+
+            if driver is not None:
+                print("Browser scrape, per-cell WebDriver vs snapshot:")
+                for name, (webdriver_ms, snapshot_ms, match) in benchmark_browser(driver, By, paths, args.repeat).items():
+                    speedup = webdriver_ms / snapshot_ms if snapshot_ms else float('inf')
+                    status = 'same DataFrame' if match else 'MISMATCH'
+                    print(f"  {name}: {webdriver_ms:.1f} ms -> {snapshot_ms:.1f} ms ({speedup:.1f}x, {status})")
+
+        if args.replay:
+            server, base_url = start_replay_server(args.site_fixtures, latency=args.latency)
+            if driver is not None:
+                runMetrics.instrument_driver(driver)
+            try:
+                with tempfile.TemporaryDirectory() as out_folder:
+                    scenarios = scraper_scenarios(base_url, out_folder, driver, By if driver is not None else None)
+                    print(f"Scrapers against {base_url} ({args.repeat} runs each):")
+                    results = benchmark_scrapers(scenarios, args.repeat, args.trace_memory)
+                print_scraper_results(results)
+                if args.output:
+                    with open(args.output, 'w', encoding='utf-8') as f:
+                        json.dump(results, f, indent=2)
+            finally:
+                server.shutdown()
+    finally:
+        if driver is not None:
+            driver.quit()
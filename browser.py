@@ -0,0 +1,178 @@
+import os
+import threading
+
+PROFILE_FOLDER = 'Data/chrome-profile'
+
+# Requests a lean browser never makes. Stylesheets and scripts are kept: hidden
+# racecard columns are detected from computed styles and Speed Pro is rendered by its scripts.
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*scorecardresearch.com*', '*adobedtm.com*',
+]
+
+_profiles_lock = threading.Lock()
+_profiles_in_use = set()
+
+
+def chrome_options(lean=False, page_load_strategy='eager', profile_dir=None, capture_network=False):
+    """
+    Builds the headless Chrome options used by every scraper.
+
+    Args:
+        lean (bool): Return from driver.get as soon as the DOM is ready and skip images.
+        page_load_strategy (str): 'eager' or 'none', used when lean. With 'none' every
+            scraper relies on its explicit waits (see wait_for_element).
+        profile_dir (str): Chrome user data directory to reuse, so the HTTP cache survives between runs.
+        capture_network (bool): Record DevTools network events in the 'performance' log (see driver.get_log).
+
+    Returns:
+        webdriver.ChromeOptions: Options for webdriver.Chrome.
+    """
+    # Selenium is imported on first use, so runs that never start a browser do not pay for it
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')  # Run in headless mode (optional)
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+
+    if lean:
+        options.page_load_strategy = page_load_strategy
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-extensions')
+        options.add_argument('--disable-background-networking')
+        options.add_argument('--disable-component-update')
+        options.add_argument('--disable-default-apps')
+        options.add_argument('--disable-sync')
+        options.add_argument('--no-first-run')
+        options.add_argument('--mute-audio')
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+        })
+
+    if profile_dir:
+        options.add_argument(f'--user-data-dir={os.path.abspath(profile_dir)}')
+        options.add_argument('--disk-cache-size=268435456')
+
+    if capture_network:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    """
+    Stops a Chrome driver from requesting URLs that match any of the patterns.
+
+    Args:
+        driver: Chrome WebDriver instance.
+        patterns (list): URL patterns, '*' matching any run of characters.
+    """
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+def create_driver(lean=False, page_load_strategy='eager', profile_folder=None, blocked_patterns=BLOCKED_URL_PATTERNS,
+                  capture_network=False):
+    """
+    Starts a headless Chrome WebDriver.
+
+    Args:
+        lean (bool): Use the lean profile: eager page loads, no images and blocked_patterns blocked.
+        page_load_strategy (str): 'eager' or 'none', used when lean.
+        profile_folder (str): Folder of reusable ("warm") Chrome profiles, one per concurrent driver,
+            or None for a throwaway profile. Only one process may use a folder at a time.
+        blocked_patterns (list): URL patterns blocked when lean.
+        capture_network (bool): Record network events, for reading the responses pages load (see speedPro.capture_feed).
+
+    Returns:
+        webdriver.Chrome: A new driver. Ensure ChromeDriver is in your PATH.
+    """
+    from selenium import webdriver
+    profile_dir = _claim_profile(profile_folder) if profile_folder else None
+    try:
+        driver = webdriver.Chrome(options=chrome_options(lean, page_load_strategy, profile_dir, capture_network))
+    except Exception:
+        _release_profile(profile_dir)
+        raise
+
+    if lean and blocked_patterns:
+        block_resources(driver, blocked_patterns)
+
+    if profile_dir:
+        # Hand the profile back once the browser is gone, for the next driver to reuse
+        quit = driver.quit
+
+        def quit_and_release():
+            try:
+                quit()
+            finally:
+                _release_profile(profile_dir)
+
+        driver.quit = quit_and_release
+    return driver
+
+
+def wait_for_element(driver, by, value, timeout=10):
+    """
+    Waits for an element to be present in the DOM and visible.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        by: The locator strategy (e.g., By.ID, By.CLASS_NAME).
+        value: The value of the locator.
+        timeout (int): Maximum wait time in seconds.
+
+    Returns:
+        WebElement: The located element.
+
+    Raises:
+        TimeoutException: If the element is not found within the timeout.
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    try:
+        element = WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((by, value))
+        )
+        return element
+    except TimeoutException:
+        print(f"Timeout: Element with {by} = {value} not found within {timeout} seconds.")
+        return None
+
+
+def wait_for_dom(driver, timeout=10):
+    """
+    Waits until the current page's HTML has been parsed, for pages loaded with an 'eager' or 'none' strategy.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        timeout (int): Maximum wait time in seconds.
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script('return document.readyState') in ('interactive', 'complete')
+        )
+    except TimeoutException:
+        print(f"Timeout: {driver.current_url} was not parsed within {timeout} seconds.")
+
+
+def _claim_profile(profile_folder):
+    with _profiles_lock:
+        i = 0
+        while os.path.join(profile_folder, f'worker-{i}') in _profiles_in_use:
+            i += 1
+        profile_dir = os.path.join(profile_folder, f'worker-{i}')
+        _profiles_in_use.add(profile_dir)
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def _release_profile(profile_dir):
+    with _profiles_lock:
+        _profiles_in_use.discard(profile_dir)
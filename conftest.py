@@ -0,0 +1,30 @@
+import os
+import pytest
+from replayServer import PAGE_PATHS, SITE_FIXTURES, start_replay_server
+
+# Fixture folders relative to the repository, wherever pytest is run from
+SITE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), SITE_FIXTURES)
+
+
+@pytest.fixture(scope='session')
+def replay_site():
+    """Serves fixtures/site on localhost for the whole test session and yields its base URL."""
+    server, base_url = start_replay_server(SITE_FOLDER)
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def page_url(replay_site):
+    """Returns the replayed URL of a scraper's entry page, e.g. page_url('results')."""
+    return lambda page: replay_site + PAGE_PATHS[page]
+
+
+@pytest.fixture
+def site_html():
+    """Returns the HTML of a recorded page, e.g. site_html('results_race1.html')."""
+    def read(file_name):
+        with open(os.path.join(SITE_FOLDER, file_name), encoding='utf-8') as f:
+            return f.read()
+    return read
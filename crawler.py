@@ -1,26 +1,79 @@
-import pandas as pd
 import argparse
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from scrapeRacePage import scrape_all_pages
-from trainerJockey import scrape_trainer_jockey
-from speedPro import scrape_all_pages_speed_pro
-from pastRaces import scrape_pastRaces, extract_dates
-from utils import send_email_with_attachments, save_to_csv_with_sheets
+from concurrent.futures import ThreadPoolExecutor
+from browser import PROFILE_FOLDER
+import runMetrics
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 
-def main(send_email):
+HKJC_BASE_URL = 'https://racing.hkjc.com'
+
+# Everything a run can do, in the order they are reported
+STAGES = ['racecard', 'trainer', 'jockey', 'speedpro', 'dates', 'results', 'email']
+# Stages that load server-rendered pages through the fetch backend
+FETCHED_STAGES = {'racecard', 'trainer', 'jockey', 'dates', 'results'}
+# Stages whose workbook is emailed, in attachment order
+EMAILED_STAGES = ['results', 'racecard', 'trainer', 'jockey', 'speedpro']
+
+def main(send_email, fetch_backend='http', base_url=HKJC_BASE_URL, max_connections=4, workers=None, use_cache=True,
+         incremental=False, metrics_summary=False, lean_browser=False, page_load_strategy='eager',
+         browser_profile=None, pipeline=False, archive_pages=True, stages=None, speed_pro_source='table'):
     #Adding a comment for git
-    print("Setting up web driver, please wait...")
-    # Initialize WebDriver for Chrome
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')  # Run in headless mode (optional)
-    options.add_argument('--disable-gpu')
-    options.add_argument('--no-sandbox')
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+
+    # Every scraping stage by default, --send-email adds the email
+    selected = set(stages or [stage for stage in STAGES if stage != 'email'])
+    if send_email:
+        selected.add('email')
+    scraping = selected - {'email'}
+    # Only Speed Pro, or the selenium backend, needs a browser at all
+    needs_browser = 'speedpro' in scraping or (fetch_backend != 'http' and bool(scraping & FETCHED_STAGES))
+    # Speed Pro read from the form guide's data feed, fetched directly once the first race's has been captured
+    speed_pro_feed = speed_pro_source == 'feed' and 'speedpro' in scraping and not pipeline and not incremental
+    print(f"Running stages: {', '.join(stage for stage in STAGES if stage in selected)}")
+
+    # Timings, page latencies and WebDriver call counts for this run
+    metrics = runMetrics.RunMetrics()
+    runMetrics.activate(metrics)
+
+    # pandas, Selenium and the scrapers are only imported by the runs that use them
+    pool = fetcher = cache = archive = policy = None
+    if needs_browser:
+        from driverPool import DriverPool
+        from browser import create_driver
+        # Browsers are started on demand by the pool, up to one per worker
+        print(f"Setting up a pool of up to {workers} web drivers...")
+        # A lean browser skips images, fonts and trackers and returns as soon as the DOM is ready
+        pool = DriverPool(workers, driver_factory=lambda: runMetrics.instrument_driver(
+            create_driver(lean_browser, page_load_strategy, browser_profile, capture_network=speed_pro_feed)))
+
+    if scraping:
+        import fetchPolicy
+        from pageCache import PageCache, CachedFetcher
+        from pageArchive import PageArchive, ArchivingFetcher
 
-    driver = webdriver.Chrome(options=options)  # Ensure ChromeDriver is in your PATH
+        # One policy paces, retries and circuit-breaks every page load of the run, HTTP and browser alike
+        policy = fetchPolicy.FetchPolicy(rate=max_connections, burst=max_connections)
+        fetchPolicy.use(policy)
+
+        # Every page actually fetched is kept in the archive, so it can be re-parsed later (see reparseArchive.py)
+        archive = PageArchive() if archive_pages else None
+        # Every page is looked up in the local cache first, so re-runs only fetch what changed
+        cache = PageCache() if use_cache else None
+
+    if scraping & FETCHED_STAGES or (speed_pro_feed and fetch_backend == 'http'):
+        # Server-rendered pages go through the fetch backend, only Speed Pro needs the browser
+        if fetch_backend == 'http':
+            from fetchBackend import HttpFetcher
+            fetcher = HttpFetcher(max_connections=max_connections, policy=policy)
+        else:
+            from driverPool import PooledSeleniumFetcher
+            fetcher = PooledSeleniumFetcher(pool)
+        if archive is not None:
+            fetcher = ArchivingFetcher(fetcher, archive)
+        if cache is not None:
+            fetcher = CachedFetcher(fetcher, cache)
 
     # Load environment variables
     load_dotenv()
@@ -33,72 +86,246 @@ def main(send_email):
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
+    raceUrl = f'{base_url}/racing/information/English/racing/RaceCard.aspx'
+    raceOutputFile = os.path.join(folder_path, f'race_data_{today_date}.xlsx')
+    trainerUrl = f'{base_url}/racing/information/English/Trainers/TrainerRanking.aspx'
+    trainerOutputFile = os.path.join(folder_path, f'trainer_data_{today_date}.xlsx')
+    jockeyUrl = f'{base_url}/racing/information/English/Jockey/JockeyRanking.aspx'
+    jockeyOutputFile = os.path.join(folder_path, f'jockey_data_{today_date}.xlsx')
+    speedProUrl = f'{base_url}/racing/speedpro/english/formguide/formguide.html'
+    speedProOutputFile = os.path.join(folder_path, f'speed_pro_data_{today_date}.xlsx')
+    allDatesUrl = f'{base_url}/racing/information/English/racing/LocalResults.aspx'
+    # CHASE READ THIS: If you want to scrape a specific date then add "?RaceDate=2025/01/31" to the end of pastRacesUrl then use one of the dates from the allDates table above.
+    # To scrape a whole range of past meetings use backfill.py (e.g. python backfill.py --start 2024-09-01 --end 2025-07-16).
+    pastRacesUrl = f'{base_url}/racing/information/English/racing/LocalResults.aspx'
+    pastRacesOutputFile = os.path.join(folder_path, f'past_races_data_{today_date}.xlsx')
+    metricsFile = os.path.join(folder_path, f'run_metrics_{today_date}.json')
+    raceFormFile = os.path.join(folder_path, f'race_form_{today_date}.xlsx')
+    outputFiles = {'racecard': raceOutputFile, 'trainer': trainerOutputFile, 'jockey': jockeyOutputFile,
+                   'speedpro': speedProOutputFile, 'results': pastRacesOutputFile}
+
     try:
-        print("Attempting racecard scraping...")
-        raceUrl = 'https://racing.hkjc.com/racing/information/English/racing/RaceCard.aspx'
-        raceOutputFile = os.path.join(folder_path, f'race_data_{today_date}.xlsx')
-        scrape_all_pages(driver, raceUrl, By, pd, raceOutputFile)
-        print("Finished racecard scraping.")
-
-        print("Attempting trainer scraping...")
-        trainerUrl = 'https://racing.hkjc.com/racing/information/English/Trainers/TrainerRanking.aspx'
-        trainerOutputFile = os.path.join(folder_path, f'trainer_data_{today_date}.xlsx')
-        scrape_trainer_jockey(driver, trainerUrl, By, pd, trainerOutputFile)
-        print("Finished trainer scraping.")
-
-        print("Attempting jockey scraping...")
-        jockeyUrl = 'https://racing.hkjc.com/racing/information/English/Jockey/JockeyRanking.aspx'
-        jockeyOutputFile = os.path.join(folder_path, f'jockey_data_{today_date}.xlsx')
-        scrape_trainer_jockey(driver, jockeyUrl, By, pd, jockeyOutputFile)
-        print("Finished jockey scraping.")
-
-        print("Attempting Speed Pro scraping...")
-        speedProUrl = 'https://racing.hkjc.com/racing/speedpro/english/formguide/formguide.html'
-        speedProOutputFile = os.path.join(folder_path, f'speed_pro_data_{today_date}.xlsx')
-        scrape_all_pages_speed_pro(driver, speedProUrl, By, pd, speedProOutputFile)
-        print("Finished Speed Pro scraping.")
-
-        print("Attempting to extract all past race dates.")
-        allDatesUrl = 'https://racing.hkjc.com/racing/information/English/racing/LocalResults.aspx'
-        allDates = extract_dates(driver, By, pd, allDatesUrl)
-        if allDates:
-            save_to_csv_with_sheets(allDates, 'Data/all-past-dates.xlsx', pd)
+        if scraping and incremental:
+            from incremental import run_incremental, print_report
+            # Only scrape what changed since the last run
+            attachments, report = run_incremental(
+                fetcher, pool, cache,
+                {'racecard': raceUrl, 'trainer': trainerUrl, 'jockey': jockeyUrl,
+                 'speedpro': speedProUrl, 'results': pastRacesUrl},
+                dict(outputFiles, dates='Data/all-past-dates.xlsx'),
+                today_date, stages=scraping)
+            print_report(report)
+        elif scraping:
+            stage_list = build_stages(scraping, fetcher, pool, cache, archive, pipeline, workers,
+                                      {'racecard': raceUrl, 'trainer': trainerUrl, 'jockey': jockeyUrl,
+                                       'speedpro': speedProUrl, 'dates': allDatesUrl, 'results': pastRacesUrl},
+                                      outputFiles, speed_pro_feed, fetcher if fetch_backend == 'http' else None)
+            results = run_stages(stage_list)
+            if scraping & {'racecard', 'trainer', 'jockey', 'results'}:
+                with runMetrics.stage("history store"):
+                    store_history(results, today_date, form_file=raceFormFile if 'racecard' in scraping else None)
+            attachments = [outputFiles[stage] for stage in EMAILED_STAGES if stage in scraping]
         else:
-            print("Unable to save past race dates.")
-
+            # Nothing scraped: send whatever today's run has already saved
+            attachments = [outputFiles[stage] for stage in EMAILED_STAGES if os.path.exists(outputFiles[stage])]
 
-        # CHASE READ THIS: If you want to scrape a specific date then add "?RaceDate=2025/01/31" to the end of pastRacesUrl then use one of the dates from the allDates table above.
-        print("Attempting Past Races scraping...")
-        pastRacesUrl = 'https://racing.hkjc.com/racing/information/English/racing/LocalResults.aspx'
-        pastRacesOutputFile = os.path.join(folder_path, f'past_races_data_{today_date}.xlsx')
-        scrape_pastRaces(driver, pastRacesUrl, By, pd, pastRacesOutputFile)
-        print("Finished Past Races scraping.")
-
-        if send_email:
+        if 'email' in selected and not attachments:
+            print("Nothing changed since the last run, no email sent.")
+        elif 'email' in selected:
+            from utils import send_email_with_attachments
             print("Sending data via email...")
             # Send email with the files
             sender_email = os.getenv('SENDER_EMAIL')
             receiver_email = os.getenv('RECEIVER_EMAIL')
             subject = f"Today's Horse Racing Information - {today_date}"
             body = "Please find attached the scraped data files."
-            attachments = [pastRacesOutputFile, raceOutputFile, trainerOutputFile, jockeyOutputFile, speedProOutputFile] 
             smtp_server = "smtp.gmail.com"
             smtp_port = 587
             login = sender_email
             password = os.getenv('EMAIL_PASSWORD')
 
             print("Sending email with attachments...")
-            send_email_with_attachments(
-                sender_email, receiver_email, subject, body, attachments, smtp_server, smtp_port, login, password
-            )
+            with runMetrics.stage("email"):
+                send_email_with_attachments(
+                    sender_email, receiver_email, subject, body, attachments, smtp_server, smtp_port, login, password
+                )
             print("Email sent successfully.")
         else:
             print("Data will not be sent via email.")
 
     finally:
-        # Quit the driver
-        driver.quit()
+        # Quit the drivers
+        if fetcher is not None:
+            fetcher.close()
+        if pool is not None:
+            pool.close()
+            metrics.extra['drivers_replaced'] = pool.replaced
+        if cache is not None:
+            stats = cache.stats()
+            metrics.extra['page_cache'] = stats
+            print(f"Page cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+            cache.close()
+        if archive is not None:
+            metrics.extra['page_archive'] = archive.stats()
+            archive.close()
+
+        # Save the run's metrics next to the day's data
+        if policy is not None:
+            metrics.extra['fetch_policy'] = policy.stats()
+        metrics.write(metricsFile)
+        if metrics_summary:
+            metrics.print_summary()
+        runMetrics.activate(None)
+
+def build_stages(selected, fetcher, pool, cache, archive, pipeline, workers, urls, files, speed_pro_feed=False,
+                 feed_fetcher=None):
+    """
+    Builds the selected scraping stages for run_stages.
+
+    Args:
+        selected (set): Stage keys from STAGES.
+        fetcher: Fetch backend for server-rendered pages, or None if no selected stage needs one.
+        pool (driverPool.DriverPool): Browser pool, or None if no selected stage needs one.
+        cache (pageCache.PageCache): Page cache, or None.
+        archive (pageArchive.PageArchive): Page archive, or None.
+        pipeline (bool): Stream the multi-race stages (see pipeline.stream_scrape).
+        workers (int): Concurrent Speed Pro page loads when streaming.
+        urls (dict): Page URLs keyed 'racecard', 'trainer', 'jockey', 'speedpro', 'dates' and 'results'.
+        files (dict): Output workbooks keyed 'racecard', 'trainer', 'jockey', 'speedpro' and 'results'.
+        speed_pro_feed (bool): Read Speed Pro from its data feed (see speedPro.scrape_all_pages_speed_pro_feed),
+            with a pool whose drivers capture network traffic.
+        feed_fetcher: HTTP fetch backend for the Speed Pro feeds, or None to capture each one in the browser.
+
+    Returns:
+        list: (name, callable) pairs, in STAGES order.
+    """
+    import pandas as pd
+
+    def racecard():
+        if pipeline:
+            from pipeline import stream_scrape
+            return stream_scrape('racecard', fetcher.get, urls['racecard'], files['racecard'])
+        from scrapeRacePage import fetch_all_pages
+        return fetch_all_pages(fetcher, urls['racecard'], pd, files['racecard'])
+
+    def ranking(kind):
+        from trainerJockey import fetch_trainer_jockey
+        return fetch_trainer_jockey(fetcher, urls[kind], pd, files[kind])
+
+    def speed_pro():
+        from selenium.webdriver.common.by import By
+        if pipeline:
+            from pipeline import stream_scrape
+            from speedPro import load_speed_pro_snapshot
 
+            def speed_pro_page(page_url):
+                html = cache.get(page_url) if cache is not None else None
+                if html is None:
+                    html = pool.run(load_speed_pro_snapshot, page_url, By)
+                    if html is not None and cache is not None:
+                        cache.put(page_url, html)
+                    if html is not None and archive is not None:
+                        archive.put(page_url, html)
+                return html
+
+            return stream_scrape('speedpro', speed_pro_page, urls['speedpro'], files['speedpro'],
+                                 fetch_workers=workers)
+        if speed_pro_feed:
+            from speedPro import scrape_all_pages_speed_pro_feed
+            return scrape_all_pages_speed_pro_feed(pool, urls['speedpro'], By, pd, files['speedpro'],
+                                                   feed_fetcher)
+        from speedPro import scrape_all_pages_speed_pro_pooled
+        return scrape_all_pages_speed_pro_pooled(pool, urls['speedpro'], By, pd, files['speedpro'], cache)
+
+    def save_dates():
+        from pastRaces import fetch_dates
+        from utils import save_to_csv_with_sheets
+        allDates = fetch_dates(fetcher, pd, urls['dates'])
+        if allDates:
+            save_to_csv_with_sheets(allDates, 'Data/all-past-dates.xlsx', pd)
+        else:
+            print("Unable to save past race dates.")
+        return allDates
+
+    def past_races():
+        if pipeline:
+            from pipeline import stream_scrape
+            return stream_scrape('results', fetcher.get, urls['results'], files['results'])
+        from pastRaces import fetch_pastRaces
+        return fetch_pastRaces(fetcher, urls['results'], pd, files['results'])
+
+    # The stages are independent, so they all run at once and share the driver pool
+    stages = {
+        'racecard': ("racecard", racecard),
+        'trainer': ("trainer", lambda: ranking('trainer')),
+        'jockey': ("jockey", lambda: ranking('jockey')),
+        'speedpro': ("Speed Pro", speed_pro),
+        'dates': ("past race dates", save_dates),
+        'results': ("Past Races", past_races),
+    }
+    return [stages[stage] for stage in STAGES if stage in selected and stage in stages]
+
+def store_history(results, today_date, history_db=None, form_file=None, last_runs=6):
+    """
+    Adds the scraped racecards, results and rankings to the history store.
+
+    Args:
+        results (dict): Stage name -> stage return value, from run_stages.
+        today_date (str): Date of this run, used for the ranking snapshots.
+        history_db (str): SQLite history store, defaults to historyStore.HISTORY_DB.
+        form_file (str): Workbook for each racecard race joined to its runners' last runs, or None.
+        last_runs (int): Past runs per runner in form_file.
+    """
+    import pandas as pd
+    import historyStore
+    from utils import save_to_csv_with_sheets
+    print("Updating race history store...")
+    conn = historyStore.connect(history_db or historyStore.HISTORY_DB)
+    try:
+        for key, df in results.get("racecard") or []:
+            if key is not None:
+                historyStore.upsert_racecard(conn, key[0], key[1], key[2], df)
+        historyStore.upsert_meeting_results(conn, results.get("Past Races") or [])
+        historyStore.upsert_rankings(conn, today_date, 'trainer', results.get("trainer"))
+        historyStore.upsert_rankings(conn, today_date, 'jockey', results.get("jockey"))
+        if form_file:
+            # Looked up through the horse index, after today's results are in
+            save_to_csv_with_sheets(
+                (historyStore.enrich_racecard(conn, df, last_runs, key[0] if key else None)
+                 for key, df in results.get("racecard") or []),
+                form_file, pd)
+    finally:
+        conn.close()
+
+def run_stages(stages):
+    """
+    Runs scraping stages concurrently and waits for all of them.
+
+    Args:
+        stages (list): (name, callable) pairs.
+
+    Returns:
+        dict: Stage name -> whatever the stage returned.
+
+    Raises:
+        Exception: The first error raised by a stage, after every stage has finished.
+    """
+    def run(name, stage):
+        print(f"Attempting {name} scraping...")
+        with runMetrics.stage(name) as entry:
+            result = stage()
+            if entry is not None:
+                entry['rows'] = runMetrics.count_rows(result)
+        print(f"Finished {name} scraping.")
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = [executor.submit(run, name, stage) for name, stage in stages]
+
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    return {name: future.result() for (name, stage), future in zip(stages, futures)}
 
 
 if __name__ == "__main__":
@@ -112,8 +339,105 @@ if __name__ == "__main__":
         help="Include this flag to send the data via email."
     )
     
+    # Add arguments for the fetch backend
+    parser.add_argument(
+        "--fetch-backend",
+        choices=["http", "selenium"],
+        default="http",
+        help="How server-rendered pages are loaded. Speed Pro always uses the browser."
+    )
+    parser.add_argument(
+        "--base-url",
+        default=HKJC_BASE_URL,
+        help="Site to scrape, e.g. a local server replaying recorded pages."
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=4,
+        help="Maximum concurrent HTTP requests for the http backend."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Maximum number of headless browsers running at once (default: CPU count, up to 4)."
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore the local page cache and fetch every page."
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only scrape new meetings and skip stages whose pages have not changed since the last run."
+    )
+
+    parser.add_argument(
+        "--metrics-summary",
+        action="store_true",
+        help="Print a summary of stage times and page latencies (they are always saved to Data/<date>/run_metrics_<date>.json)."
+    )
+
+    parser.add_argument(
+        "--lean-browser",
+        action="store_true",
+        help="Load pages eagerly, block images, fonts and trackers, and reuse a warm Chrome profile."
+    )
+
+    parser.add_argument(
+        "--page-load-strategy",
+        choices=["eager", "none"],
+        default="eager",
+        help="When driver.get returns with --lean-browser. Scrapers wait for the elements they need either way."
+    )
+
+    parser.add_argument(
+        "--browser-profile",
+        default=None,
+        help=f"Folder of reusable Chrome profiles (default with --lean-browser: {PROFILE_FOLDER})."
+    )
+
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Stream the racecard, Speed Pro and past race pages through overlapping fetch, parse and write stages."
+    )
+
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=None,
+        help="Only run these stages (default: every scraping stage, plus email with --send-email). "
+             "A browser is only started for speedpro or the selenium backend; 'email' alone re-sends today's files."
+    )
+
+    parser.add_argument(
+        "--speed-pro-source",
+        choices=["table", "feed"],
+        default="table",
+        help="Read Speed Pro from its rendered table, or from the JSON data feed the form guide loads "
+             "(captured from the browser for the first race, then fetched directly)."
+    )
+
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Do not keep the raw HTML of fetched pages in the page archive."
+    )
+
     # Parse the arguments
     args = parser.parse_args()
+    browser_profile = args.browser_profile or (PROFILE_FOLDER if args.lean_browser else None)
     
     # Call the main function with the parsed argument
-    main(args.send_email)
+    main(args.send_email, fetch_backend=args.fetch_backend, base_url=args.base_url.rstrip('/'),
+         max_connections=args.max_connections, workers=args.workers, use_cache=not args.no_cache,
+         incremental=args.incremental, metrics_summary=args.metrics_summary, lean_browser=args.lean_browser,
+         page_load_strategy=args.page_load_strategy, browser_profile=browser_profile, pipeline=args.pipeline,
+         archive_pages=not args.no_archive, stages=args.stages, speed_pro_source=args.speed_pro_source)
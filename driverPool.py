@@ -0,0 +1,223 @@
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from browser import create_driver, wait_for_dom
+from pageSnapshot import take_snapshot
+from fetchPolicy import load_page
+
+
+class DriverPool:
+    """
+    A bounded pool of headless WebDriver workers.
+
+    Drivers are started lazily up to `size`, handed out one task at a time and
+    recycled after `max_pages_per_driver` tasks. A driver that stops responding
+    (crashed browser, lost session) is quit and replaced, and the task that hit
+    the crash is retried once on the replacement.
+    """
+
+    def __init__(self, size, driver_factory=create_driver, max_pages_per_driver=200):
+        """
+        Args:
+            size (int): Maximum number of drivers alive at once.
+            driver_factory (callable): Returns a new WebDriver.
+            max_pages_per_driver (int): Tasks a driver runs before it is restarted, or None to never restart.
+        """
+        self.size = size
+        self.driver_factory = driver_factory
+        self.max_pages_per_driver = max_pages_per_driver
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._all = set()
+        self.replaced = 0
+
+    def acquire(self):
+        """
+        Takes a driver from the pool, starting one if none is idle. Blocks while all drivers are busy.
+
+        Returns:
+            WebDriver: A driver reserved for the caller until release().
+        """
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._all.add(driver)
+            self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, broken=False):
+        """
+        Returns a driver to the pool.
+
+        Args:
+            driver: Driver obtained from acquire().
+            broken (bool): The driver crashed and must be discarded.
+        """
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            worn_out = self.max_pages_per_driver is not None and self._pages[id(driver)] >= self.max_pages_per_driver
+
+        if broken or worn_out:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """
+        Context manager that reserves a driver, replacing it if it crashed while in use.
+
+        Yields:
+            WebDriver: A driver reserved for the block.
+        """
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = not is_alive(driver)
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def run(self, task, *args):
+        """
+        Runs task(driver, *args) on a pooled driver, retrying once on a fresh driver if the browser crashed.
+
+        Args:
+            task (callable): Function taking a driver as its first argument.
+
+        Returns:
+            The task's return value.
+        """
+        for attempt in range(2):
+            driver = self.acquire()
+            try:
+                result = task(driver, *args)
+            except Exception:
+                alive = is_alive(driver)
+                self.release(driver, broken=not alive)
+                if alive or attempt == 1:
+                    raise
+                with self._lock:
+                    self.replaced += 1
+                print("WebDriver crashed, retrying on a new driver...")
+                continue
+            self.release(driver)
+            return result
+
+    def map(self, task, items):
+        """
+        Runs task(driver, item) for every item across the pool.
+
+        Args:
+            task (callable): Function taking a driver and one item.
+            items (list): Items to process, e.g. race URLs.
+
+        Returns:
+            list: Results in the same order as items. Items whose task raised give None.
+        """
+        def run_one(item):
+            try:
+                return self.run(task, item)
+            except Exception as e:
+                print(f"Error processing {item}: {e}")
+                return None
+
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(items))) as executor:
+            return list(executor.map(run_one, items))
+
+    def close(self):
+        """Quits every driver the pool started."""
+        with self._lock:
+            drivers = list(self._all)
+            self._all.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def _discard(self, driver):
+        with self._lock:
+            self._all.discard(driver)
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PooledSeleniumFetcher:
+    """
+    Fetch backend (see fetchBackend) that loads pages on a DriverPool, so get_many fans out across the browsers.
+    """
+
+    def __init__(self, pool):
+        """
+        Args:
+            pool (DriverPool): Pool to load pages on.
+        """
+        self.pool = pool
+
+    def get(self, url):
+        return self.pool.run(load_snapshot, url)
+
+    def get_many(self, urls):
+        return self.pool.map(load_snapshot, urls)
+
+    def close(self):
+        # The pool is owned by the caller
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_snapshot(driver, url):
+    load_page(driver, url)
+    wait_for_dom(driver)
+    return take_snapshot(driver)
+
+
+def is_alive(driver):
+    """
+    Checks whether a driver's browser session still responds.
+
+    Args:
+        driver: Selenium WebDriver instance.
+
+    Returns:
+        bool: False if the browser has crashed or the session is gone.
+    """
+    try:
+        driver.window_handles
+        return True
+    except Exception:
+        return False
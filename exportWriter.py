@@ -0,0 +1,302 @@
+import csv
+import gzip
+import math
+import os
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def cell_value(value):
+    """
+    Converts a DataFrame value to something every output format can store, the way pandas' to_excel does.
+
+    Lists (e.g. 'Sectional Times') become their string form and missing values become None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (list, tuple, dict, set)):
+        return str(value)
+    if hasattr(value, 'item') and not isinstance(value, str):
+        # numpy scalars
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
+
+
+class ExcelStreamWriter:
+    """
+    Writes DataFrames to an Excel workbook in openpyxl's write-only mode.
+
+    Each sheet's rows are streamed to disk as they are added, so memory stays flat
+    however many sheets the workbook ends up with.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sheets = 0
+        self._workbook = Workbook(write_only=True)
+
+    def write(self, df, sheet_name=None):
+        """
+        Adds a DataFrame as a new sheet.
+
+        Args:
+            df (pd.DataFrame): Data to write.
+            sheet_name (str): Sheet name, defaults to 'Page_<n>'.
+        """
+        self.sheets += 1
+        sheet = self._workbook.create_sheet(title=(sheet_name or f"Page_{self.sheets}")[:31])
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        for row in df.itertuples(index=False, name=None):
+            sheet.append([cell_value(value) for value in row])
+
+    def close(self):
+        """
+        Saves the workbook.
+
+        Raises:
+            ValueError: If no sheet was written, rather than save an empty workbook.
+        """
+        if self.sheets == 0:
+            raise ValueError(f"No sheets to write to {self.path}")
+        self._workbook.save(self.path)
+
+    def abort(self):
+        # Nothing is saved until close(), only the sheets' temporary files need removing
+        for sheet in self._workbook.worksheets:
+            sheet.close()
+            sheet._writer.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CsvStreamWriter:
+    """
+    Writes DataFrames to one CSV file, with a leading 'Sheet' column naming the race.
+    The file is gzip-compressed if its name ends in .csv.gz.
+
+    The columns are fixed by the first DataFrame. Later DataFrames are aligned to them:
+    missing columns are left empty and extra columns are dropped with a warning.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sheets = 0
+        self.columns = None
+        if path.lower().endswith('.gz'):
+            self._file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        else:
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+
+    def write(self, df, sheet_name=None):
+        self.sheets += 1
+        sheet_name = sheet_name or f"Page_{self.sheets}"
+        first = self.columns is None
+        rows = _aligned_rows(self, df)
+        if first:
+            self._writer.writerow(['Sheet'] + self.columns)
+        for row in rows:
+            self._writer.writerow([sheet_name] + ['' if value is None else value for value in row])
+
+    def close(self):
+        """
+        Finishes the file.
+
+        Raises:
+            ValueError: If no sheet was written; the empty file is removed.
+        """
+        if self.sheets == 0:
+            self.abort()
+            raise ValueError(f"No sheets to write to {self.path}")
+        self._file.close()
+
+    def abort(self):
+        # Drops a partly written file
+        self._file.close()
+        _remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ParquetStreamWriter:
+    """
+    Writes DataFrames to one Parquet file, one row group per race, with a leading 'Sheet' column.
+
+    Values are stored as strings, as scraped. Column handling matches CsvStreamWriter.
+    Needs the optional pyarrow package.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.sheets = 0
+        self.columns = None
+        self._writer = None
+
+    def write(self, df, sheet_name=None):
+        self.sheets += 1
+        sheet_name = sheet_name or f"Page_{self.sheets}"
+        first = self._writer is None
+        rows = _aligned_rows(self, df)
+
+        names = ['Sheet'] + self.columns
+        columns = [[sheet_name] * len(rows)]
+        for i in range(len(self.columns)):
+            columns.append([None if row[i] is None else str(row[i]) for row in rows])
+        table = self._pa.table({name: self._pa.array(values, type=self._pa.string())
+                                for name, values in zip(_unique(names), columns)})
+        if first:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        """
+        Finishes the file.
+
+        Raises:
+            ValueError: If no sheet was written.
+        """
+        if self._writer is None:
+            raise ValueError(f"No sheets to write to {self.path}")
+        self._writer.close()
+
+    def abort(self):
+        # Drops a partly written file
+        if self._writer is not None:
+            self._writer.close()
+            _remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _unique(names):
+    # Parquet needs distinct column names, scraped headers occasionally repeat
+    seen = {}
+    unique = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        unique.append(name if seen[name] == 1 else f"{name}.{seen[name] - 1}")
+    return unique
+
+
+def _aligned_rows(writer, df):
+    # The first DataFrame fixes the writer's columns, later ones are aligned to them
+    columns = [str(column) for column in df.columns]
+    if writer.columns is None:
+        writer.columns = columns
+    elif columns != writer.columns:
+        extra = [column for column in columns if column not in writer.columns]
+        if extra:
+            print(f"Dropping columns not in the first sheet: {', '.join(extra)}")
+
+    positions = {column: i for i, column in enumerate(columns)}
+    rows = []
+    for row in df.itertuples(index=False, name=None):
+        values = [cell_value(value) for value in row]
+        rows.append([values[positions[column]] if column in positions else None for column in writer.columns])
+    return rows
+
+
+def export_format(path):
+    """
+    Works out the export format from a file name.
+
+    Args:
+        path (str): Output path ending in .xlsx, .csv.gz, .csv (written uncompressed) or .parquet.
+
+    Returns:
+        str: One of EXPORT_FORMATS.
+    """
+    name = path.lower()
+    if name.endswith('.parquet'):
+        return 'parquet'
+    if name.endswith('.csv.gz') or name.endswith('.csv'):
+        return 'csv'
+    return 'xlsx'
+
+
+def with_format(path, fmt):
+    """
+    Swaps a file name's extension for the one matching an export format.
+
+    Args:
+        path (str): Output path, e.g. 'Data/2025-10-19/race_data_2025-10-19.xlsx'.
+        fmt (str): One of EXPORT_FORMATS.
+
+    Returns:
+        str: Path with the matching extension.
+    """
+    for suffix in ('.csv.gz', '.xlsx', '.csv', '.parquet'):
+        if path.lower().endswith(suffix):
+            path = path[:-len(suffix)]
+            break
+    return path + {'xlsx': '.xlsx', 'csv': '.csv.gz', 'parquet': '.parquet'}[fmt]
+
+
+def open_writer(path, fmt=None):
+    """
+    Opens a streaming writer for the given format.
+
+    Args:
+        path (str): Output file.
+        fmt (str): One of EXPORT_FORMATS, or None to go by the file extension.
+
+    Returns:
+        A writer with write(df, sheet_name=None), close() to finish the file (ValueError if nothing
+            was written) and abort() to drop it. Used as a context manager, an exception aborts.
+    """
+    fmt = fmt or export_format(path)
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    if fmt == 'parquet':
+        return ParquetStreamWriter(path)
+    if fmt == 'csv':
+        return CsvStreamWriter(path)
+    return ExcelStreamWriter(path)
@@ -0,0 +1,181 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from pageSnapshot import take_snapshot
+from browser import wait_for_dom
+from fetchPolicy import load_page
+import runMetrics
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+}
+
+
+class HttpFetcher:
+    """
+    Fetches server-rendered pages over a pooled keep-alive HTTP session.
+
+    Responses are requested compressed, connections are reused across pages and
+    get_many never has more than max_connections requests in flight.
+    """
+
+    def __init__(self, max_connections=4, timeout=30, headers=None, policy=None):
+        """
+        Args:
+            max_connections (int): Size of the connection pool and the maximum number of concurrent requests.
+            timeout (float): Per-request timeout in seconds, used without a policy.
+            headers (dict): Extra request headers, merged over DEFAULT_HEADERS.
+            policy (fetchPolicy.FetchPolicy): Optional policy every request goes through, for per-host
+                rate limiting, retries, per-page timeouts and circuit breaking.
+        """
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.policy = policy
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url):
+        """
+        Fetches a single page.
+
+        Args:
+            url (str): Page URL.
+
+        Returns:
+            str: The page HTML.
+
+        Raises:
+            requests.RequestException: If the request fails or returns an error status.
+            fetchPolicy.CircuitOpenError: If the policy's circuit for the host is open.
+        """
+        return self._send(url).text
+
+    def get_conditional(self, url, etag=None, last_modified=None):
+        """
+        Fetches a page only if it changed since an earlier fetch, using that fetch's validators.
+
+        Args:
+            url (str): Page URL.
+            etag (str): ETag the page was last returned with, or None.
+            last_modified (str): Last-Modified header the page was last returned with, or None.
+
+        Returns:
+            tuple: (html, etag, last_modified), where html is None if the server answered 304 Not Modified
+                (the validators passed in are then returned unchanged).
+
+        Raises:
+            requests.RequestException: If the request fails or returns an error status.
+            fetchPolicy.CircuitOpenError: If the policy's circuit for the host is open.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = self._send(url, headers)
+        if response.status_code == 304:
+            return None, etag, last_modified
+        return response.text, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def _send(self, url, headers=None):
+        if self.policy is not None:
+            return self.policy.call(url, lambda timeout: self._request(url, timeout, headers))
+        return self._request(url, self.timeout, headers)
+
+    def _request(self, url, timeout, headers=None):
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=timeout, headers=headers)
+            response.raise_for_status()
+        except Exception:
+            runMetrics.record_page(url, time.monotonic() - start, 'http', ok=False)
+            raise
+        runMetrics.record_page(url, time.monotonic() - start, 'http')
+
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = 'utf-8'
+        return response
+
+    def get_many(self, urls):
+        """
+        Fetches several pages concurrently, bounded by max_connections.
+
+        Args:
+            urls (list): Page URLs.
+
+        Returns:
+            list: Page HTML in the same order as urls, with None for pages that failed.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            return list(executor.map(self._get_or_none, urls))
+
+    def _get_or_none(self, url):
+        try:
+            return self.get(url)
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+            return None
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SeleniumFetcher:
+    """
+    Fetches pages through a WebDriver, for use where a real browser is still required.
+
+    Each page is returned as a single snapshot (see pageSnapshot.take_snapshot) so it
+    can be fed to the same HTML parsers as HttpFetcher.
+    """
+
+    def __init__(self, driver, policy=None):
+        """
+        Args:
+            driver: Selenium WebDriver instance.
+            policy (fetchPolicy.FetchPolicy): Policy every load goes through, defaults to the shared one
+                (see fetchPolicy.load_page).
+        """
+        self.driver = driver
+        self.policy = policy
+
+    def get(self, url):
+        load_page(self.driver, url, self.policy)
+        wait_for_dom(self.driver)
+        return take_snapshot(self.driver)
+
+    def get_many(self, urls):
+        pages = []
+        for url in urls:
+            try:
+                pages.append(self.get(url))
+            except Exception as e:
+                print(f"Error fetching {url}: {e}")
+                pages.append(None)
+        return pages
+
+    def close(self):
+        # The driver is owned by the caller
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
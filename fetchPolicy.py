@@ -0,0 +1,278 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from pageCache import classify
+from rateLimit import AdaptiveRateLimiter
+
+# Seconds a single load of each class of page may take before it is abandoned and retried
+PAGE_TIMEOUTS = {
+    'results': 30,
+    'latest-results': 30,
+    'racecard': 20,
+    'speedpro': 45,
+    'ranking': 20,
+    'other': 30,
+}
+
+# HTTP statuses worth another attempt: rate limited or a struggling server
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of fetching while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host that keeps failing.
+
+    After failure_threshold failures in a row the circuit opens and every
+    request fails fast for reset_after seconds. Then a single trial request is
+    let through (half open): success closes the circuit, failure opens it again.
+    Safe to share between threads.
+    """
+
+    def __init__(self, failure_threshold=8, reset_after=60.0):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_after (float): Seconds the circuit stays open before a trial request.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if time.monotonic() - self.opened_at < self.reset_after else 'half-open'
+
+    def allow(self):
+        """
+        Returns whether a request may be sent now.
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record(self, ok):
+        """
+        Feeds back the outcome of a request.
+
+        Args:
+            ok (bool): Whether the request succeeded.
+        """
+        with self._lock:
+            self._trial_running = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+
+
+def is_retryable(error):
+    """
+    Decides whether a failed fetch is worth another attempt.
+
+    Timeouts, dropped connections, rate limiting and server errors are; a
+    missing page, a bad URL or a parsing bug are not.
+
+    Args:
+        error (Exception): What the fetch raised.
+
+    Returns:
+        bool: True to retry.
+    """
+    # Each library is only imported for its own errors, so HTTP-only runs never load Selenium
+    # and browser-only runs never load requests
+    module = type(error).__module__
+    if module.startswith('requests'):
+        import requests
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in RETRYABLE_STATUSES
+        return isinstance(error, (requests.Timeout, requests.ConnectionError))
+    if module.startswith('selenium'):
+        from selenium.common.exceptions import TimeoutException, WebDriverException, InvalidArgumentException
+        if isinstance(error, InvalidArgumentException):
+            return False
+        return isinstance(error, (TimeoutException, WebDriverException))
+    return False
+
+
+class FetchPolicy:
+    """
+    Rate limiting, retries, timeouts and circuit breaking shared by every fetch.
+
+    Each host gets its own adaptive token bucket (see rateLimit.AdaptiveRateLimiter)
+    and circuit breaker. A failed load is retried with exponential backoff and
+    full jitter, and every load gets the timeout of its page class (PAGE_TIMEOUTS).
+    Safe to share between threads, and meant to be: one policy per run lets the
+    HTTP fetcher and the browsers pace themselves against the same limit.
+    """
+
+    def __init__(self, rate=2.0, burst=4, max_rate=20.0, target_latency=2.0, attempts=4, backoff=1.0,
+                 max_backoff=30.0, failure_threshold=8, reset_after=60.0, timeouts=None):
+        """
+        Args:
+            rate (float): Starting requests per second per host.
+            burst (float): Requests per host that may go out back to back.
+            max_rate (float): Highest rate the limiter adapts up to.
+            target_latency (float): Responses slower than this slow the host's rate down.
+            attempts (int): Tries per page, including the first.
+            backoff (float): Base delay in seconds before the first retry, doubled for each later one.
+            max_backoff (float): Longest delay between tries.
+            failure_threshold (int): Consecutive failures that open a host's circuit.
+            reset_after (float): Seconds an open circuit waits before a trial request.
+            timeouts (dict): Overrides for PAGE_TIMEOUTS.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.timeouts = dict(PAGE_TIMEOUTS, **(timeouts or {}))
+        self.retries = 0
+        self.failures = 0
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url):
+        """Returns the rate limiter of a URL's host."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveRateLimiter(rate=self.rate, max_rate=self.max_rate,
+                                                           target_latency=self.target_latency, burst=self.burst)
+            return self._limiters[host]
+
+    def breaker(self, url):
+        """Returns the circuit breaker of a URL's host."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_after)
+            return self._breakers[host]
+
+    def timeout(self, url):
+        """Returns the load timeout in seconds for a URL's page class."""
+        return self.timeouts.get(classify(url), self.timeouts['other'])
+
+    def call(self, url, load):
+        """
+        Loads a page under the policy.
+
+        Args:
+            url (str): Page URL, used for the host and the timeout.
+            load (callable): Does one attempt, called as load(timeout). Raises on failure.
+
+        Returns:
+            Whatever load returned.
+
+        Raises:
+            CircuitOpenError: If the host's circuit is open.
+            Exception: The last error, once the attempts are used up or the error is not retryable.
+        """
+        limiter, breaker = self.limiter(url), self.breaker(url)
+        timeout = self.timeout(url)
+        for attempt in range(self.attempts):
+            if not breaker.allow():
+                with self._lock:
+                    self.failures += 1
+                raise CircuitOpenError(f"{urlsplit(url).netloc} is failing, not fetching {url}")
+
+            limiter.wait()
+            start = time.monotonic()
+            try:
+                result = load(timeout)
+            except Exception as e:
+                # A missing page is the server answering fine, only overload and outages count against the host
+                retryable = is_retryable(e)
+                limiter.record(time.monotonic() - start, ok=not retryable)
+                breaker.record(ok=not retryable)
+                if attempt == self.attempts - 1 or not retryable:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                with self._lock:
+                    self.retries += 1
+                print(f"Retrying {url} in {delay:.1f}s ({type(e).__name__})")
+                time.sleep(delay)
+                continue
+            limiter.record(time.monotonic() - start, ok=True)
+            breaker.record(ok=True)
+            return result
+
+    def stats(self):
+        """
+        Returns retry and failure counts with each host's current rate and circuit state.
+
+        Returns:
+            dict: retries, failures and hosts (host -> rate, circuit and trips).
+        """
+        with self._lock:
+            hosts = {host: {'rate': limiter.rate} for host, limiter in self._limiters.items()}
+            for host, breaker in self._breakers.items():
+                hosts.setdefault(host, {}).update(circuit=breaker.state, trips=breaker.trips)
+            return {'retries': self.retries, 'failures': self.failures, 'hosts': hosts}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def use(policy):
+    """Makes a policy the one shared() returns, e.g. the crawler's for the whole run."""
+    global _shared
+    _shared = policy
+
+
+def shared():
+    """
+    Returns the shared policy used by scrapers that were not handed one, creating it with the defaults.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FetchPolicy()
+        return _shared
+
+
+def load_page(driver, url, policy=None):
+    """
+    driver.get under a fetch policy: paced, retried and with the page class's timeout.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        url (str): Page URL.
+        policy (FetchPolicy): Policy to use, defaults to shared().
+
+    Raises:
+        Exception: The last error if every attempt failed (see FetchPolicy.call).
+    """
+    def load(timeout):
+        driver.set_page_load_timeout(timeout)
+        driver.get(url)
+
+    (policy or shared()).call(url, load)
@@ -0,0 +1,1157 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from raceRecords import clean as _clean, to_int, parse_meeting, results_from_frame, racecard_from_frame
+
+HISTORY_DB = 'Data/history.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS races (
+    race_date TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    race_no INTEGER NOT NULL,
+    season TEXT NOT NULL,
+    race_class TEXT,
+    distance INTEGER,
+    going TEXT,
+    course TEXT,
+    total_seconds REAL,
+    PRIMARY KEY (race_date, venue, race_no)
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    race_date TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    race_no INTEGER NOT NULL,
+    horse TEXT NOT NULL,
+    season TEXT NOT NULL,
+    horse_name TEXT,
+    brand_no TEXT,
+    place TEXT,
+    place_num INTEGER,
+    horse_no INTEGER,
+    jockey TEXT,
+    trainer TEXT,
+    actual_weight INTEGER,
+    declared_weight INTEGER,
+    draw INTEGER,
+    lbw TEXT,
+    lbw_lengths REAL,
+    running_position TEXT,
+    finish_seconds REAL,
+    win_odds REAL,
+    PRIMARY KEY (race_date, venue, race_no, horse)
+);
+
+CREATE TABLE IF NOT EXISTS sectionals (
+    race_date TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    race_no INTEGER NOT NULL,
+    section INTEGER NOT NULL,
+    season TEXT NOT NULL,
+    seconds REAL,
+    PRIMARY KEY (race_date, venue, race_no, section)
+);
+
+CREATE TABLE IF NOT EXISTS racecards (
+    race_date TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    race_no INTEGER NOT NULL,
+    horse TEXT NOT NULL,
+    season TEXT NOT NULL,
+    horse_name TEXT,
+    brand_no TEXT,
+    horse_no INTEGER,
+    last_6_runs TEXT,
+    weight INTEGER,
+    jockey TEXT,
+    draw INTEGER,
+    trainer TEXT,
+    rating INTEGER,
+    rating_change TEXT,
+    horse_weight INTEGER,
+    age INTEGER,
+    gear TEXT,
+    surface TEXT,
+    course TEXT,
+    distance INTEGER,
+    going TEXT,
+    extra TEXT,
+    PRIMARY KEY (race_date, venue, race_no, horse)
+);
+
+-- Rankings are a time series per kind: a full snapshot now and then, and for the days in between only
+-- the names whose row changed since the previous day (see store_ranking_day)
+CREATE TABLE IF NOT EXISTS ranking_days (
+    kind TEXT NOT NULL,
+    ranking_date TEXT NOT NULL,
+    season TEXT NOT NULL,
+    snapshot INTEGER NOT NULL,
+    names INTEGER NOT NULL,
+    PRIMARY KEY (kind, ranking_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ranking_snapshots (
+    kind TEXT NOT NULL,
+    ranking_date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    wins INTEGER,
+    seconds INTEGER,
+    thirds INTEGER,
+    fourths INTEGER,
+    fifths INTEGER,
+    total_runs INTEGER,
+    stakes INTEGER,
+    extra TEXT,
+    PRIMARY KEY (kind, ranking_date, name)
+) WITHOUT ROWID;
+
+-- changes: the fields that changed as JSON, or NULL when the name dropped out of the table
+CREATE TABLE IF NOT EXISTS ranking_deltas (
+    kind TEXT NOT NULL,
+    ranking_date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    changes TEXT,
+    PRIMARY KEY (kind, ranking_date, name)
+) WITHOUT ROWID;
+
+-- Horse -> the rowids of its results rows, clustered by horse and date so a horse's runs are one range read
+CREATE TABLE IF NOT EXISTS horse_runs (
+    horse_key TEXT NOT NULL,
+    race_date TEXT NOT NULL,
+    result_id INTEGER NOT NULL,
+    PRIMARY KEY (horse_key, race_date, result_id)
+) WITHOUT ROWID;
+
+-- Benchmarks per (venue, course, distance, class, going), kept up to date as races are stored.
+-- 'times' holds the group's sorted values, so coarser groupings can be rolled up without the races.
+CREATE TABLE IF NOT EXISTS par_times (
+    venue TEXT NOT NULL,
+    course TEXT NOT NULL,
+    distance INTEGER NOT NULL,
+    race_class TEXT NOT NULL,
+    going TEXT NOT NULL,
+    races INTEGER NOT NULL,
+    par_seconds REAL,
+    best_seconds REAL,
+    p10 REAL,
+    p25 REAL,
+    p75 REAL,
+    p90 REAL,
+    pace_ratio REAL,
+    times TEXT NOT NULL,
+    PRIMARY KEY (venue, course, distance, race_class, going)
+);
+
+CREATE TABLE IF NOT EXISTS sectional_pars (
+    venue TEXT NOT NULL,
+    course TEXT NOT NULL,
+    distance INTEGER NOT NULL,
+    race_class TEXT NOT NULL,
+    going TEXT NOT NULL,
+    section INTEGER NOT NULL,
+    races INTEGER NOT NULL,
+    par_seconds REAL,
+    best_seconds REAL,
+    p10 REAL,
+    p25 REAL,
+    p75 REAL,
+    p90 REAL,
+    times TEXT NOT NULL,
+    PRIMARY KEY (venue, course, distance, race_class, going, section)
+);
+
+CREATE TABLE IF NOT EXISTS pace_shapes (
+    venue TEXT NOT NULL,
+    course TEXT NOT NULL,
+    distance INTEGER NOT NULL,
+    race_class TEXT NOT NULL,
+    going TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    races INTEGER NOT NULL,
+    share REAL NOT NULL,
+    PRIMARY KEY (venue, course, distance, race_class, going, shape)
+);
+
+-- Bumped by every write to a kind of data, so readers holding it in memory know when to reload
+CREATE TABLE IF NOT EXISTS store_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS races_benchmark ON races (venue, course, distance, race_class, going);
+CREATE INDEX IF NOT EXISTS results_season ON results (season);
+CREATE INDEX IF NOT EXISTS sectionals_season ON sectionals (season);
+CREATE INDEX IF NOT EXISTS racecards_season ON racecards (season);
+"""
+
+# Keyword in a ranking header -> rankings table column, checked in order
+RANKING_COLUMNS = [
+    ('win', 'wins'),
+    ('2nd', 'seconds'),
+    ('3rd', 'thirds'),
+    ('4th', 'fourths'),
+    ('5th', 'fifths'),
+    ('total', 'total_runs'),
+    ('stake', 'stakes'),
+]
+RANKING_FIELDS = [column for _, column in RANKING_COLUMNS]
+
+# Delta days stored between two full ranking snapshots, which bounds the deltas replayed to rebuild a day
+SNAPSHOT_EVERY = 28
+
+# Every results row is indexed under its brand number and its upper-cased name
+HORSE_KEYS_SQL = """
+INSERT OR IGNORE INTO horse_runs (horse_key, race_date, result_id)
+SELECT brand_no, race_date, rowid FROM results WHERE brand_no IS NOT NULL{where}
+UNION ALL
+SELECT UPPER(horse_name), race_date, rowid FROM results WHERE horse_name IS NOT NULL{where}
+"""
+
+# Results columns returned for each past run, with the race details joined on
+RUN_COLUMNS = ['race_date', 'venue', 'race_no', 'horse', 'horse_name', 'brand_no', 'place', 'place_num',
+               'horse_no', 'jockey', 'trainer', 'actual_weight', 'declared_weight', 'draw', 'lbw', 'lbw_lengths',
+               'running_position', 'finish_seconds', 'win_odds']
+RACE_DETAIL_COLUMNS = ['race_class', 'distance', 'going', 'course']
+
+# Race details the benchmark tables are grouped by. Races missing any of them are not benchmarked.
+BENCHMARK_KEYS = ['venue', 'course', 'distance', 'race_class', 'going']
+
+# Percentiles stored with every benchmark, besides the median (the par)
+PERCENTILES = (10, 25, 75, 90)
+
+# How far a race's early/late pace ratio may be from its group's median and still count as an even pace
+PACE_TOLERANCE = 0.01
+
+# Past run column -> heading in an enriched racecard
+FORM_HEADINGS = {
+    'run': 'Run',
+    'race_date': 'Date',
+    'venue': 'Venue',
+    'race_no': 'Race',
+    'race_class': 'Class',
+    'distance': 'Distance',
+    'going': 'Going',
+    'course': 'Course',
+    'place': 'Pla.',
+    'draw': 'Dr.',
+    'jockey': 'Jockey',
+    'trainer': 'Trainer',
+    'actual_weight': 'Act. Wt.',
+    'lbw': 'LBW',
+    'running_position': 'Running Position',
+    'finish_seconds': 'Finish Time (sec)',
+    'win_odds': 'Win Odds',
+}
+
+def connect(path=HISTORY_DB, check_same_thread=True):
+    """
+    Opens the history store, creating the tables if needed.
+
+    Args:
+        path (str): SQLite database file.
+        check_same_thread (bool): False to share the connection between threads (the caller then serialises its use).
+
+    Returns:
+        sqlite3.Connection: Open connection.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT EXISTS (SELECT 1 FROM results) AND NOT EXISTS (SELECT 1 FROM horse_runs)").fetchone()[0]:
+        # A store from before the horse index existed
+        rebuild_horse_index(conn)
+    if conn.execute("SELECT EXISTS (SELECT 1 FROM races) AND NOT EXISTS (SELECT 1 FROM par_times)").fetchone()[0]:
+        # A store from before the benchmark tables existed
+        rebuild_benchmarks(conn)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rankings'").fetchone():
+        # A store from before rankings were a time series, with a full table per day
+        migrate_rankings(conn)
+    return conn
+
+
+def season_of(race_date):
+    """
+    Returns the HKJC season ('2024/25') a date belongs to. Seasons start in September.
+
+    Args:
+        race_date (str): Date as 'YYYY-MM-DD'.
+
+    Returns:
+        str: The season label.
+    """
+    year, month = int(race_date[:4]), int(race_date[5:7])
+    start = year if month >= 9 else year - 1
+    return f"{start}/{(start + 1) % 100:02d}"
+
+
+def _row(record, season, exclude=(), **values):
+    # A raceRecords record as a table row
+    row = {name: value for name, value in record.as_dict().items() if name not in exclude}
+    row.update(season=season, **values)
+    return row
+
+
+def _bump_version(conn, name):
+    conn.execute("INSERT INTO store_versions VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET version = version + 1",
+                 (name,))
+
+
+def store_versions(conn):
+    """
+    Returns how many times each kind of data was written: 'results', 'racecards' and 'rankings'.
+
+    Readers that keep the store in memory compare these to know what to reload.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        dict: Name -> version.
+    """
+    return dict(conn.execute("SELECT name, version FROM store_versions"))
+
+
+def _upsert(conn, table, rows):
+    if not rows:
+        return 0
+    columns = list(rows[0].keys())
+    keys = {
+        'races': ['race_date', 'venue', 'race_no'],
+        'results': ['race_date', 'venue', 'race_no', 'horse'],
+        'sectionals': ['race_date', 'venue', 'race_no', 'section'],
+        'racecards': ['race_date', 'venue', 'race_no', 'horse'],
+    }[table]
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in keys)
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+           f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+    conn.executemany(sql, [tuple(row[column] for column in columns) for row in rows])
+    return len(rows)
+
+
+def upsert_results(conn, race_date, venue, race_no, df):
+    """
+    Stores one race of results (a DataFrame from pastRaces) with its race details and sectionals.
+
+    Re-ingesting the same race replaces its rows, so this is safe to repeat.
+
+    Args:
+        conn: Connection from connect().
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse, e.g. 'Sha Tin'.
+        race_no (int): Race number.
+        df (pd.DataFrame): Race DataFrame whose first row holds the race details.
+
+    Returns:
+        int: Number of runners stored.
+    """
+    parsed = results_from_frame(df, race_date, venue, race_no)
+    if parsed is None:
+        return 0
+    return upsert_race_records(conn, *parsed)
+
+
+def upsert_race_records(conn, race, runners, splits):
+    """
+    Stores one race of results already parsed into raceRecords records.
+
+    Args:
+        conn: Connection from connect().
+        race (RaceMeta): Race details.
+        runners (list): RunnerResult records.
+        splits (list): SectionalSplit records.
+
+    Returns:
+        int: Number of runners stored.
+    """
+    season = season_of(race.race_date)
+    key = (race.race_date, race.venue, race.race_no)
+    with conn:
+        # A re-ingested race may have moved group, e.g. after the going was corrected
+        old_group = _benchmark_group(conn, *key)
+        _upsert(conn, 'races', [_row(race, season, exclude=('surface',))])
+        _upsert(conn, 'sectionals', [_row(split, season) for split in splits])
+        stored = _upsert(conn, 'results', [_row(runner, season, horse=runner.horse) for runner in runners])
+        conn.execute(HORSE_KEYS_SQL.format(where=' AND race_date = ? AND venue = ? AND race_no = ?'), key * 2)
+        refresh_benchmarks(conn, {old_group, _benchmark_group(conn, *key)} - {None})
+        _bump_version(conn, 'results')
+        return stored
+
+
+def upsert_meeting_results(conn, races):
+    """
+    Stores every race of a meeting, as returned by pastRaces.fetch_meeting_results.
+
+    The date and venue are read from each race's 'Race Details' row.
+
+    Args:
+        conn: Connection from connect().
+        races (list): (race number, DataFrame) pairs.
+
+    Returns:
+        int: Number of runners stored.
+    """
+    stored = 0
+    for race_num, df in races:
+        if df is None or df.empty:
+            continue
+        meeting = parse_meeting(df.iloc[0, 1])
+        if meeting is None:
+            print(f"Skipping race {race_num}: no meeting details")
+            continue
+        stored += upsert_results(conn, meeting[0], meeting[1], int(race_num), df)
+    return stored
+
+
+def upsert_racecard(conn, race_date, venue, race_no, df):
+    """
+    Stores one racecard race (a DataFrame from scrapeRacePage).
+
+    Args:
+        conn: Connection from connect().
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+        df (pd.DataFrame): Racecard DataFrame whose first row holds the track details.
+
+    Returns:
+        int: Number of runners stored.
+    """
+    parsed = racecard_from_frame(df, race_date, venue, race_no)
+    if parsed is None:
+        return 0
+    return upsert_racecard_records(conn, *parsed)
+
+
+def upsert_racecard_records(conn, race, runners):
+    """
+    Stores one racecard race already parsed into raceRecords records.
+
+    Args:
+        conn: Connection from connect().
+        race (RaceMeta): Track details.
+        runners (list): RunnerEntry records.
+
+    Returns:
+        int: Number of runners stored.
+    """
+    season = season_of(race.race_date)
+    track = {'surface': race.surface, 'course': race.course, 'distance': race.distance, 'going': race.going}
+    rows = []
+    for runner in runners:
+        row = _row(runner, season, horse=runner.horse, **track)
+        row['extra'] = json.dumps(runner.extra, ensure_ascii=False)
+        rows.append(row)
+
+    with conn:
+        _bump_version(conn, 'racecards')
+        return _upsert(conn, 'racecards', rows)
+
+
+def delete_racecard_runners(conn, race_date, venue, race_no, horses):
+    """
+    Removes runners from a stored racecard race, e.g. after they were scratched.
+
+    Args:
+        conn: Connection from connect().
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+        horses (list): Horse keys (brand number, or name if there is none).
+
+    Returns:
+        int: Number of runners removed.
+    """
+    if not horses:
+        return 0
+    with conn:
+        _bump_version(conn, 'racecards')
+        return conn.executemany("DELETE FROM racecards WHERE race_date = ? AND venue = ? AND race_no = ? AND horse = ?",
+                                [(race_date, venue, race_no, horse) for horse in horses]).rowcount
+
+
+def upsert_rankings(conn, ranking_date, kind, df):
+    """
+    Stores a trainer or jockey ranking table as that day of the ranking time series.
+
+    Args:
+        conn: Connection from connect().
+        ranking_date (str): Date the table was scraped, 'YYYY-MM-DD'.
+        kind (str): 'trainer' or 'jockey'.
+        df (pd.DataFrame): Ranking DataFrame from trainerJockey.
+
+    Returns:
+        int: Number of rows in the table.
+    """
+    if df is None or df.empty:
+        return 0
+
+    name_column = df.columns[0]
+    mapping = {}
+    for header in df.columns[1:]:
+        for keyword, column in RANKING_COLUMNS:
+            if keyword in header.lower() and column not in mapping.values():
+                mapping[header] = column
+                break
+
+    table = {}
+    for record in df.to_dict('records'):
+        name = _clean(record[name_column])
+        if not name:
+            continue
+        row = {column: None for column in RANKING_FIELDS}
+        extra = {}
+        for header, value in record.items():
+            if header in mapping:
+                row[mapping[header]] = to_int(value)
+            elif header != name_column:
+                extra[header] = _clean(value)
+        row['extra'] = extra
+        table[name] = row
+
+    with conn:
+        store_ranking_day(conn, kind, ranking_date, table)
+    return len(table)
+
+
+def store_ranking_day(conn, kind, ranking_date, table):
+    """
+    Adds one day to a ranking time series, or replaces it.
+
+    A day is stored as the names whose row changed since the previous day.
+    A full snapshot is stored instead on the first day, the first day of a
+    season (when every row resets), after SNAPSHOT_EVERY delta days, and when
+    most of the table changed. Days are normally added in order; a day
+    before the last one re-encodes the days after it.
+
+    Args:
+        conn: Connection from connect(). The caller commits.
+        kind (str): 'trainer' or 'jockey'.
+        ranking_date (str): 'YYYY-MM-DD'.
+        table (dict): Name -> row dict of RANKING_FIELDS plus 'extra' (dict of the other columns).
+    """
+    later = [(day, dict(day_table)) for day, _, day_table in _ranking_history(conn, kind, start=ranking_date)
+             if day != ranking_date]
+    for name in ('ranking_days', 'ranking_snapshots', 'ranking_deltas'):
+        conn.execute(f"DELETE FROM {name} WHERE kind = ? AND ranking_date >= ?", (kind, ranking_date))
+
+    previous = conn.execute("SELECT ranking_date, season FROM ranking_days WHERE kind = ? ORDER BY ranking_date DESC "
+                            "LIMIT 1", (kind,)).fetchone()
+    previous_table = ranking_table_on(conn, kind, previous[0]) if previous else {}
+    for day, day_table in [(ranking_date, table)] + later:
+        season = season_of(day)
+        changes = _ranking_changes(previous_table, day_table)
+        since_snapshot = conn.execute(
+            "SELECT COUNT(*) FROM ranking_days WHERE kind = ? AND ranking_date > "
+            "(SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ? AND snapshot = 1)", (kind, kind)).fetchone()[0]
+        snapshot = (previous is None or previous[1] != season or since_snapshot >= SNAPSHOT_EVERY
+                    or len(changes) > len(day_table) / 2)
+
+        conn.execute("INSERT INTO ranking_days VALUES (?, ?, ?, ?, ?)", (kind, day, season, int(snapshot), len(day_table)))
+        if snapshot:
+            conn.executemany("INSERT INTO ranking_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [(kind, day, name) + tuple(row[column] for column in RANKING_FIELDS)
+                              + (json.dumps(row['extra'], ensure_ascii=False),) for name, row in day_table.items()])
+        else:
+            conn.executemany("INSERT INTO ranking_deltas VALUES (?, ?, ?, ?)",
+                             [(kind, day, name, None if change is None else json.dumps(change, ensure_ascii=False))
+                              for name, change in changes.items()])
+        previous, previous_table = (day, season), day_table
+    _bump_version(conn, 'rankings')
+
+
+def _ranking_changes(old, new):
+    # Name -> changed fields (all of them for a new name), or None for a name no longer in the table
+    changes = {name: None for name in old.keys() - new.keys()}
+    for name, row in new.items():
+        before = old.get(name)
+        changed = {field: value for field, value in row.items() if before is None or before.get(field) != value}
+        if changed:
+            changes[name] = changed
+    return changes
+
+
+def _ranking_history(conn, kind, start=None, end=None):
+    # Yields (date, season, table) for each stored day from start to end, replaying deltas onto the last snapshot
+    begin = None
+    if start is not None:
+        begin = conn.execute("SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ? AND snapshot = 1 "
+                             "AND ranking_date <= ?", (kind, start)).fetchone()[0]
+    clauses, params = ['kind = ?'], [kind]
+    if begin is not None:
+        clauses.append('ranking_date >= ?')
+        params.append(begin)
+    if end is not None:
+        clauses.append('ranking_date <= ?')
+        params.append(end)
+    where = ' AND '.join(clauses)
+
+    snapshots, deltas = defaultdict(dict), defaultdict(list)
+    for row in conn.execute(f"SELECT ranking_date, name, {', '.join(RANKING_FIELDS)}, extra FROM ranking_snapshots "
+                            f"WHERE {where}", params):
+        values = dict(zip(RANKING_FIELDS, row[2:-1]), extra=json.loads(row[-1]) if row[-1] else {})
+        snapshots[row[0]][row[1]] = values
+    for ranking_date, name, changes in conn.execute(
+            f"SELECT ranking_date, name, changes FROM ranking_deltas WHERE {where}", params):
+        deltas[ranking_date].append((name, json.loads(changes) if changes else None))
+
+    table = {}
+    for ranking_date, season, snapshot in conn.execute(
+            f"SELECT ranking_date, season, snapshot FROM ranking_days WHERE {where} ORDER BY ranking_date", params):
+        if snapshot:
+            table = snapshots[ranking_date]
+        else:
+            table = dict(table)
+            for name, changes in deltas[ranking_date]:
+                if changes is None:
+                    table.pop(name, None)
+                else:
+                    table[name] = {**table.get(name, {}), **changes}
+        if start is None or ranking_date >= start:
+            yield ranking_date, season, table
+
+
+def ranking_table_on(conn, kind, ranking_date):
+    """
+    Rebuilds the ranking table of a day from its last snapshot and the deltas since.
+
+    Args:
+        conn: Connection from connect().
+        kind (str): 'trainer' or 'jockey'.
+        ranking_date (str): 'YYYY-MM-DD'. The latest stored day up to this date is used.
+
+    Returns:
+        dict: Name -> row dict of RANKING_FIELDS plus 'extra'. Empty if no day is stored.
+    """
+    day = conn.execute("SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ? AND ranking_date <= ?",
+                       (kind, ranking_date)).fetchone()[0]
+    if day is None:
+        return {}
+    return next(_ranking_history(conn, kind, day, day))[2]
+
+
+def migrate_rankings(conn):
+    """
+    Moves the rankings of a store from before the time series (a full table per day) into the series.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        int: Number of days migrated.
+    """
+    days = defaultdict(dict)
+    for row in conn.execute(f"SELECT kind, ranking_date, name, {', '.join(RANKING_FIELDS)}, extra FROM rankings "
+                            f"ORDER BY kind, ranking_date"):
+        days[(row[0], row[1])][row[2]] = dict(zip(RANKING_FIELDS, row[3:-1]), extra=json.loads(row[-1]) if row[-1] else {})
+    with conn:
+        for (kind, ranking_date), table in days.items():
+            store_ranking_day(conn, kind, ranking_date, table)
+        conn.execute("DROP TABLE rankings")
+    return len(days)
+
+
+def stored_meeting_dates(conn):
+    """
+    Returns the dates of every meeting with results in the store.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        set: Dates as 'YYYY-MM-DD'.
+    """
+    return {row[0] for row in conn.execute("SELECT DISTINCT race_date FROM races")}
+
+
+def horse_key(horse):
+    """
+    Returns the horse index key for a brand number ('H123') or a horse name.
+
+    Args:
+        horse (str): Brand number or name, as on a racecard or results page.
+
+    Returns:
+        str: The brand number, or the upper-cased name.
+    """
+    horse = _clean(horse)
+    return horse if re.fullmatch(r'[A-Z]\d{3}', horse) else horse.upper()
+
+
+def rebuild_horse_index(conn):
+    """
+    Rebuilds the horse index from the whole results table.
+
+    upsert_results keeps the index up to date, so this is only needed for a
+    store written before the index existed.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        int: Number of index entries.
+    """
+    with conn:
+        conn.execute("DELETE FROM horse_runs")
+        conn.execute(HORSE_KEYS_SQL.format(where=''))
+    return conn.execute("SELECT COUNT(*) FROM horse_runs").fetchone()[0]
+
+
+def _benchmark_group(conn, race_date, venue, race_no):
+    # The stored race's benchmark group, or None if it is not stored or not benchmarked
+    row = conn.execute(f"SELECT {', '.join(BENCHMARK_KEYS)} FROM races WHERE race_date = ? AND venue = ? AND race_no = ?",
+                       (race_date, venue, race_no)).fetchone()
+    return row if row is not None and None not in row else None
+
+
+def _summary(values):
+    # Count, median, best, percentiles and the sorted values themselves, as benchmark columns
+    values = sorted(values)
+    if not values:
+        return [0, None, None] + [None] * len(PERCENTILES) + ['[]']
+    quantiles = [round(float(value), 3) for value in np.percentile(values, (50,) + PERCENTILES)]
+    return [len(values), quantiles[0], values[0]] + quantiles[1:] + [json.dumps(values)]
+
+
+def pace_shape(ratio, par_ratio):
+    """
+    Classifies a race's pace against the usual pace of its group.
+
+    Args:
+        ratio (float): The race's early/late ratio: time of the first half of its sections
+            over time of the second half (the middle section of an odd number is left out).
+        par_ratio (float): Median ratio of the group's races.
+
+    Returns:
+        str: 'fast' (run faster early than usual), 'slow' or 'even'.
+    """
+    if ratio < par_ratio * (1 - PACE_TOLERANCE):
+        return 'fast'
+    if ratio > par_ratio * (1 + PACE_TOLERANCE):
+        return 'slow'
+    return 'even'
+
+
+def refresh_benchmarks(conn, groups):
+    """
+    Recomputes the par time, sectional and pace shape benchmarks of some groups.
+
+    upsert_race_records calls this for the group of every race it stores, so
+    ingesting a meeting only recomputes the handful of groups it ran in, each
+    from its own races through the races_benchmark index. Percentiles are not
+    additive, which is why a group is recomputed rather than adjusted.
+
+    Args:
+        conn: Connection from connect(). The caller commits.
+        groups (iterable): (venue, course, distance, race_class, going) tuples.
+
+    Returns:
+        int: Number of groups refreshed.
+    """
+    match = ' AND '.join(f'{key} = ?' for key in BENCHMARK_KEYS)
+    refreshed = 0
+    for group in groups:
+        group = tuple(group)
+        times = [row[0] for row in conn.execute(
+            f"SELECT total_seconds FROM races WHERE {match} AND total_seconds IS NOT NULL", group)]
+        sections = defaultdict(dict)
+        for race_date, race_no, section, seconds in conn.execute(
+                f"""
+                SELECT s.race_date, s.race_no, s.section, s.seconds FROM sectionals s
+                JOIN races r ON r.race_date = s.race_date AND r.venue = s.venue AND r.race_no = s.race_no
+                WHERE {' AND '.join(f'r.{key} = ?' for key in BENCHMARK_KEYS)} AND s.seconds IS NOT NULL
+                """, group):
+            sections[(race_date, race_no)][section] = seconds
+
+        ratios = []
+        for splits in sections.values():
+            splits = [splits[section] for section in sorted(splits)]
+            half = len(splits) // 2
+            if half:
+                ratios.append(sum(splits[:half]) / sum(splits[-half:]))
+        par_ratio = float(np.median(ratios)) if ratios else None
+
+        for table in ('par_times', 'sectional_pars', 'pace_shapes'):
+            conn.execute(f"DELETE FROM {table} WHERE {match}", group)
+        refreshed += 1
+        if not times and not ratios:
+            continue
+
+        summary = _summary(times)
+        conn.execute("INSERT INTO par_times VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     group + tuple(summary[:-1]) + (par_ratio, summary[-1]))
+
+        by_section = defaultdict(list)
+        for splits in sections.values():
+            for section, seconds in splits.items():
+                by_section[section].append(seconds)
+        conn.executemany("INSERT INTO sectional_pars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [group + (section,) + tuple(_summary(values)) for section, values in sorted(by_section.items())])
+
+        shapes = defaultdict(int)
+        for ratio in ratios:
+            shapes[pace_shape(ratio, par_ratio)] += 1
+        conn.executemany("INSERT INTO pace_shapes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [group + (shape, count, round(count / len(ratios), 4)) for shape, count in sorted(shapes.items())])
+    return refreshed
+
+
+def rebuild_benchmarks(conn):
+    """
+    Rebuilds the benchmark tables from every stored race.
+
+    upsert_race_records keeps them up to date, so this is only needed for a
+    store written before they existed.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        int: Number of groups benchmarked.
+    """
+    not_null = ' AND '.join(f'{key} IS NOT NULL' for key in BENCHMARK_KEYS)
+    with conn:
+        for table in ('par_times', 'sectional_pars', 'pace_shapes'):
+            conn.execute(f"DELETE FROM {table}")
+        groups = conn.execute(f"SELECT DISTINCT {', '.join(BENCHMARK_KEYS)} FROM races WHERE {not_null}").fetchall()
+        refresh_benchmarks(conn, groups)
+    return conn.execute("SELECT COUNT(*) FROM par_times").fetchone()[0]
+
+
+def horse_runs(conn, horses, last_runs=6, before=None):
+    """
+    Looks up the latest runs of each horse through the horse index.
+
+    Each horse costs one range read of the index plus a rowid lookup per run,
+    however large the results table grows.
+
+    Args:
+        conn: Connection from connect().
+        horses (list): Brand numbers or names.
+        last_runs (int): Runs returned per horse, latest first.
+        before (str): Only runs before this date 'YYYY-MM-DD', e.g. a racecard's date.
+
+    Returns:
+        pd.DataFrame: One row per run, with the 'lookup' key it was found under,
+            'run' (1 = latest), the results columns and the race's class, distance, going and course.
+    """
+    keys = sorted({horse_key(horse) for horse in horses if _clean(horse)})
+    if not keys:
+        df = pd.DataFrame(columns=['lookup', 'run'] + RUN_COLUMNS + RACE_DETAIL_COLUMNS)
+        df['race_date'] = pd.to_datetime(df['race_date'])
+        return df
+
+    date_clause = ' AND i.race_date < ?' if before else ''
+    selected = ', '.join([f'r.{column}' for column in RUN_COLUMNS] + [f'ra.{column}' for column in RACE_DETAIL_COLUMNS])
+    sql = f"""
+        SELECT * FROM (
+            SELECT i.horse_key AS lookup,
+                   ROW_NUMBER() OVER (PARTITION BY i.horse_key ORDER BY i.race_date DESC, i.result_id DESC) AS run,
+                   {selected}
+            FROM horse_runs i
+            JOIN results r ON r.rowid = i.result_id
+            LEFT JOIN races ra ON ra.race_date = r.race_date AND ra.venue = r.venue AND ra.race_no = r.race_no
+            WHERE i.horse_key IN ({', '.join('?' * len(keys))}){date_clause}
+        ) WHERE run <= ?
+        ORDER BY lookup, run
+    """
+    params = keys + ([before] if before else []) + [last_runs]
+    df = pd.read_sql_query(sql, conn, params=params)
+    df['race_date'] = pd.to_datetime(df['race_date'])
+    return df
+
+
+def enrich_racecard(conn, df, last_runs=6, race_date=None):
+    """
+    Joins a racecard race to each runner's last runs from the history store.
+
+    Args:
+        conn: Connection from connect().
+        df (pd.DataFrame): Racecard DataFrame from scrapeRacePage, whose first row holds the track details.
+        last_runs (int): Past runs per runner.
+        race_date (str): Racecard date 'YYYY-MM-DD', so only earlier runs are used.
+
+    Returns:
+        pd.DataFrame: One row per runner and past run (a single row with blank run columns
+            for a runner with no history), in racecard order.
+    """
+    card = df.iloc[1:]
+    if 'Horse' not in card.columns:
+        return pd.DataFrame(columns=list(FORM_HEADINGS.values()))
+    card = card[card['Horse'].map(_clean) != '']
+    runners = card[[column for column in ('Horse No.', 'Horse', 'Brand No.') if column in card.columns]].copy()
+    if runners.empty:
+        return pd.DataFrame(columns=list(runners.columns) + list(FORM_HEADINGS.values()))
+    brands = runners['Brand No.'] if 'Brand No.' in runners.columns else runners['Horse']
+    runners['lookup'] = [horse_key(_clean(brand) or name) for brand, name in zip(brands, runners['Horse'])]
+
+    runs = horse_runs(conn, runners['lookup'].tolist(), last_runs, race_date)
+    runs = runs[['lookup'] + list(FORM_HEADINGS)].rename(columns=FORM_HEADINGS)
+    runs['Date'] = runs['Date'].dt.strftime('%Y-%m-%d')
+    return runners.merge(runs, on='lookup', how='left').drop(columns='lookup')
+
+
+def _load(conn, table, date_column, season=None, start=None, end=None, columns=None):
+    clauses, params = [], []
+    if season is not None:
+        clauses.append('season = ?')
+        params.append(season)
+    if start is not None:
+        clauses.append(f'{date_column} >= ?')
+        params.append(start)
+    if end is not None:
+        clauses.append(f'{date_column} <= ?')
+        params.append(end)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    selected = ', '.join(columns) if columns else '*'
+    df = pd.read_sql_query(f"SELECT {selected} FROM {table}{where}", conn, params=params)
+    df[date_column] = pd.to_datetime(df[date_column])
+    for column in ('venue', 'season', 'going', 'course', 'race_class', 'kind', 'surface'):
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def load_results(conn, season=None, start=None, end=None, columns=None):
+    """
+    Loads runner results with typed columns, optionally filtered by season or date range.
+
+    Args:
+        conn: Connection from connect().
+        season (str): Season label such as '2024/25'.
+        start (str): First date 'YYYY-MM-DD'.
+        end (str): Last date 'YYYY-MM-DD'.
+        columns (list): Columns to load (must include race_date), or None for all.
+
+    Returns:
+        pd.DataFrame: One row per runner.
+    """
+    return _load(conn, 'results', 'race_date', season, start, end, columns)
+
+
+def load_races(conn, season=None, start=None, end=None, columns=None):
+    """Loads race details (class, distance, going, course, final time). Same filters as load_results."""
+    return _load(conn, 'races', 'race_date', season, start, end, columns)
+
+
+def load_sectionals(conn, season=None, start=None, end=None, columns=None):
+    """Loads sectional splits, one row per race section. Same filters as load_results."""
+    return _load(conn, 'sectionals', 'race_date', season, start, end, columns)
+
+
+def load_racecards(conn, season=None, start=None, end=None, columns=None):
+    """Loads racecard entries. Same filters as load_results."""
+    return _load(conn, 'racecards', 'race_date', season, start, end, columns)
+
+
+def _load_benchmarks(conn, table, venue=None, course=None, distance=None, race_class=None, going=None):
+    filters = {'venue': venue, 'course': course, 'distance': distance, 'race_class': race_class, 'going': going}
+    clauses = [f'{key} = ?' for key, value in filters.items() if value is not None]
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    df = pd.read_sql_query(f"SELECT * FROM {table}{where}", conn,
+                           params=[value for value in filters.values() if value is not None])
+    if 'times' in df.columns:
+        df['times'] = df['times'].map(json.loads)
+    return df
+
+
+def load_par_times(conn, venue=None, course=None, distance=None, race_class=None, going=None):
+    """
+    Loads the par time benchmarks, optionally for some venues, courses, distances, classes or goings.
+
+    Args:
+        conn: Connection from connect().
+
+    Returns:
+        pd.DataFrame: One row per group: race count, par (median) and best final time, percentiles,
+            median early/late pace ratio and 'times', the group's final times as a sorted list.
+    """
+    return _load_benchmarks(conn, 'par_times', venue, course, distance, race_class, going)
+
+
+def load_sectional_pars(conn, venue=None, course=None, distance=None, race_class=None, going=None):
+    """Loads the sectional benchmarks, one row per group and section. Same filters and columns as load_par_times."""
+    return _load_benchmarks(conn, 'sectional_pars', venue, course, distance, race_class, going)
+
+
+def load_pace_shapes(conn, venue=None, course=None, distance=None, race_class=None, going=None):
+    """Loads the pace shape distributions: races and share of each shape per group. Same filters as load_par_times."""
+    return _load_benchmarks(conn, 'pace_shapes', venue, course, distance, race_class, going)
+
+
+def _ranking_frame(rows):
+    columns = ['ranking_date', 'kind', 'name', 'season'] + RANKING_FIELDS + ['extra']
+    df = pd.DataFrame(rows, columns=columns)
+    df['ranking_date'] = pd.to_datetime(df['ranking_date'])
+    for column in ('kind', 'season'):
+        df[column] = df[column].astype('category')
+    return df
+
+
+def _ranking_rows(kind, ranking_date, season, table, names=None):
+    for name in sorted(table) if names is None else [name for name in names if name in table]:
+        row = table[name]
+        yield ([ranking_date, kind, name, season] + [row.get(column) for column in RANKING_FIELDS]
+               + [json.dumps(row.get('extra') or {}, ensure_ascii=False)])
+
+
+def load_rankings(conn, kind=None, season=None, start=None, end=None):
+    """
+    Loads trainer/jockey ranking tables, rebuilt from the time series.
+
+    Args:
+        conn: Connection from connect().
+        kind (str): 'trainer' or 'jockey', or None for both.
+
+    Returns:
+        pd.DataFrame: One row per name and ranking date.
+    """
+    rows = []
+    for each in ([kind] if kind is not None else ['trainer', 'jockey']):
+        for ranking_date, day_season, table in _ranking_history(conn, each, start, end):
+            if season is None or day_season == season:
+                rows.extend(_ranking_rows(each, ranking_date, day_season, table))
+    return _ranking_frame(rows)
+
+
+def load_ranking_table(conn, kind, ranking_date):
+    """
+    Loads one day's trainer or jockey ranking table.
+
+    Args:
+        conn: Connection from connect().
+        kind (str): 'trainer' or 'jockey'.
+        ranking_date (str): 'YYYY-MM-DD'. The latest stored day up to this date is used.
+
+    Returns:
+        pd.DataFrame: One row per name, like load_rankings.
+    """
+    day = conn.execute("SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ? AND ranking_date <= ?",
+                       (kind, ranking_date)).fetchone()[0]
+    if day is None:
+        return _ranking_frame([])
+    return load_rankings(conn, kind, start=day, end=day)
+
+
+def load_ranking_trajectory(conn, kind, name, start=None, end=None):
+    """
+    Loads one trainer's or jockey's ranking row on every stored day.
+
+    Args:
+        conn: Connection from connect().
+        kind (str): 'trainer' or 'jockey'.
+        name (str): Name as in the ranking table.
+        start (str): First date 'YYYY-MM-DD'.
+        end (str): Last date 'YYYY-MM-DD'.
+
+    Returns:
+        pd.DataFrame: One row per day the name was in the table, like load_rankings.
+    """
+    rows = []
+    for ranking_date, season, table in _ranking_history(conn, kind, start, end):
+        rows.extend(_ranking_rows(kind, ranking_date, season, table, [name]))
+    return _ranking_frame(rows)
+
+
+def _add_ranking_difference(totals, last, base):
+    for name, row in last.items():
+        for column in RANKING_FIELDS:
+            totals[name][column] += (row.get(column) or 0) - (base.get(name, {}).get(column) or 0)
+
+
+def ranking_window(conn, kind, days=30, end=None):
+    """
+    Works out what each trainer or jockey did over a window of days, e.g. jockey win rates over the last 30 days.
+
+    The rankings are season totals, so the window's counts are the totals at
+    its end less those at its start, season by season.
+
+    Args:
+        conn: Connection from connect().
+        kind (str): 'trainer' or 'jockey'.
+        days (int): Length of the window.
+        end (str): Last date 'YYYY-MM-DD', or None for the latest stored day.
+
+    Returns:
+        pd.DataFrame: Indexed by name: wins, places, runs and stakes in the window, and 'win_rate'.
+    """
+    if end is None:
+        end = conn.execute("SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ?", (kind,)).fetchone()[0]
+    totals = defaultdict(lambda: dict.fromkeys(RANKING_FIELDS, 0))
+    if end is not None:
+        start = (pd.Timestamp(end) - pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+        # The window starts from the last table before it, or its first day if there is none
+        base_day = conn.execute("SELECT MAX(ranking_date) FROM ranking_days WHERE kind = ? AND ranking_date <= ?",
+                                (kind, start)).fetchone()[0] or start
+
+        base = last = season = None
+        for _, day_season, table in _ranking_history(conn, kind, base_day, end):
+            if base is None:
+                base = table
+            elif day_season != season:
+                # The totals restart with the season
+                _add_ranking_difference(totals, last, base)
+                base = {}
+            last, season = table, day_season
+        if last is not None:
+            _add_ranking_difference(totals, last, base)
+
+    df = pd.DataFrame.from_dict(totals, orient='index', columns=RANKING_FIELDS).rename_axis('name')
+    df['win_rate'] = df['wins'] / df['total_runs'].where(df['total_runs'] > 0)
+    return df.sort_values(['wins', 'win_rate'], ascending=False)
+
+
+def import_workbooks(conn, data_folder='Data'):
+    """
+    Loads past results and rankings from the per-day workbooks already under Data/.
+
+    Racecard workbooks are skipped because they do not record the race date or venue.
+
+    Args:
+        conn: Connection from connect().
+        data_folder (str): Root data folder.
+
+    Returns:
+        dict: Rows stored per table.
+    """
+    stored = {'results': 0, 'rankings': 0}
+
+    for path in sorted(glob.glob(os.path.join(data_folder, '*', 'past_races_data_*.xlsx'))):
+        sheets = [df.fillna('') for df in pd.read_excel(path, sheet_name=None, dtype=str).values()]
+        # Workbooks written before the scrapers skipped top_races' link to the page already loaded
+        # have race 1 twice; the sheets carry no race number, so races are numbered by position
+        sheets = [df for i, df in enumerate(sheets) if i == 0 or not df.equals(sheets[i - 1])]
+        races = [(i + 1, df) for i, df in enumerate(sheets)]
+        stored['results'] += upsert_meeting_results(conn, races)
+
+    for kind in ('trainer', 'jockey'):
+        for path in sorted(glob.glob(os.path.join(data_folder, '*', f'{kind}_data_*.xlsx'))):
+            ranking_date = os.path.basename(os.path.dirname(path))
+            df = pd.read_excel(path, sheet_name=0, dtype=str).fillna('')
+            stored['rankings'] += upsert_rankings(conn, ranking_date, kind, df)
+
+    return stored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the race history store from existing workbooks.")
+    parser.add_argument("--db", default=HISTORY_DB, help="SQLite history store.")
+    parser.add_argument("--data-folder", default="Data", help="Folder containing the per-day workbooks.")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        stored = import_workbooks(conn, args.data_folder)
+        print(f"Stored {stored['results']} result rows and {stored['rankings']} ranking rows in {args.db}")
+    finally:
+        conn.close()
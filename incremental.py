@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pandas as pd
+import historyStore
+from backfill import parse_meeting_date, meeting_url
+from scrapeRacePage import fetch_all_pages
+from trainerJockey import fetch_trainer_jockey
+from pastRaces import fetch_meeting_results, fetch_dates
+from utils import save_to_csv_with_sheets
+import runMetrics
+
+STATE_FILE = 'Data/incremental-state.json'
+
+INCREMENTAL_STAGES = ('racecard', 'speedpro', 'trainer', 'jockey', 'dates', 'results')
+
+
+class RunState:
+    """
+    Fingerprints of what the previous incremental runs saw, kept in a small JSON file.
+    """
+
+    def __init__(self, path=STATE_FILE):
+        """
+        Args:
+            path (str): JSON state file.
+        """
+        self.path = path
+        self.fingerprints = {}
+        self.updated = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.fingerprints = state.get('fingerprints', {})
+            self.updated = state.get('updated', {})
+
+    def unchanged(self, name, value):
+        """Returns True if value has the same fingerprint as last time."""
+        return self.fingerprints.get(name) == value
+
+    def record(self, name, value):
+        self.fingerprints[name] = value
+        self.updated[name] = datetime.now().isoformat(timespec='seconds')
+
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprints': self.fingerprints, 'updated': self.updated}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def fingerprint(frames):
+    """
+    Hashes the content of one or more DataFrames.
+
+    Args:
+        frames (list): DataFrames, in order.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for df in frames:
+        digest.update(df.to_csv(index=False).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def new_meeting_dates(all_dates, stored_dates):
+    """
+    Picks the meetings from the date dropdown that are not in the history store yet.
+
+    Only meetings after the latest stored one count as new, so an empty or partial
+    store does not turn a daily run into a full backfill (use backfill.py for that).
+    With an empty store, only the latest meeting is new.
+
+    Args:
+        all_dates (list): Date strings from the results page dropdown.
+        stored_dates (set): 'YYYY-MM-DD' dates already stored.
+
+    Returns:
+        list: New meeting dates (datetime.date), oldest first.
+    """
+    dates = set()
+    for text in all_dates:
+        try:
+            dates.add(parse_meeting_date(text))
+        except ValueError:
+            continue
+    if not dates:
+        return []
+    if not stored_dates:
+        return [max(dates)]
+    latest_stored = max(stored_dates)
+    return sorted(date for date in dates if date.isoformat() > latest_stored)
+
+
+def run_incremental(fetcher, pool, cache, urls, files, today_date, history_db=historyStore.HISTORY_DB,
+                    state_file=STATE_FILE, stages=INCREMENTAL_STAGES):
+    """
+    Runs the daily scrape, skipping work whose source has not changed since the last run.
+
+    - Past results: only meetings newer than the history store are scraped, and
+      a meeting is only stored once every race of it was scraped.
+    - Racecard: every race is fetched, but the workbook is only written when the
+      card differs from the last run, and Speed Pro only scraped when the card
+      differs from the last run in which Speed Pro succeeded.
+    - Trainer/jockey rankings and the past dates list: only written when they changed.
+
+    Args:
+        fetcher: Fetch backend for server-rendered pages.
+        pool (driverPool.DriverPool): Browser pool for Speed Pro.
+        cache (pageCache.PageCache): Page cache, or None.
+        urls (dict): Page URLs keyed 'racecard', 'trainer', 'jockey', 'speedpro' and 'results'.
+        files (dict): Output workbooks keyed 'racecard', 'trainer', 'jockey', 'speedpro', 'results' and 'dates'.
+        today_date (str): Date of this run, 'YYYY-MM-DD'.
+        history_db (str): History store.
+        state_file (str): JSON file holding the previous run's fingerprints.
+        stages (iterable): Stages to run, from INCREMENTAL_STAGES. Speed Pro still fetches the racecard
+            to see whether it changed, but only a racecard stage stores it.
+
+    Returns:
+        tuple: (workbooks written this run, report as a list of (stage, status, reason)), where status
+            is 'ran', 'skipped' or 'failed'.
+    """
+    state = RunState(state_file)
+    conn = historyStore.connect(history_db)
+    report = []
+    written = []
+
+    def skipped(stage, reason):
+        report.append((stage, 'skipped', reason))
+
+    def ran(stage, reason):
+        report.append((stage, 'ran', reason))
+
+    try:
+        # Racecard first: Speed Pro only needs to run if the card changed since it last succeeded
+        card_stages = [stage for stage in ('racecard', 'speedpro') if stage in stages]
+        speed_pro = None
+        executor = ThreadPoolExecutor(max_workers=1)
+        if card_stages:
+            races = timed_stage('racecard', fetch_all_pages, fetcher, urls['racecard'], pd, None)
+            card = fingerprint([df for key, df in races])
+            for stage in card_stages:
+                if not races:
+                    skipped(stage, 'no racecard published')
+                elif state.unchanged(stage, card):
+                    skipped(stage, f'card unchanged since {state.updated.get(stage)}')
+                elif stage == 'racecard':
+                    save_to_csv_with_sheets([df for key, df in races], files['racecard'], pd)
+                    written.append(files['racecard'])
+                    for key, df in races:
+                        if key is not None:
+                            historyStore.upsert_racecard(conn, key[0], key[1], key[2], df)
+                    state.record('racecard', card)
+                    ran('racecard', f'{len(races)} races changed or new')
+                else:
+                    # Imported here so runs without Speed Pro never load Selenium
+                    from selenium.webdriver.common.by import By
+                    from speedPro import scrape_all_pages_speed_pro_pooled
+                    speed_pro = executor.submit(timed_stage, 'speedpro', scrape_all_pages_speed_pro_pooled, pool,
+                                                urls['speedpro'], By, pd, files['speedpro'], cache)
+
+        # Rankings
+        for kind in ('trainer', 'jockey'):
+            if kind not in stages:
+                continue
+            df = timed_stage(kind, fetch_trainer_jockey, fetcher, urls[kind], pd, None)
+            if df is None:
+                skipped(kind, 'ranking table could not be scraped')
+            elif state.unchanged(kind, fingerprint([df])):
+                skipped(kind, f'ranking unchanged since {state.updated.get(kind)}')
+            else:
+                save_to_csv_with_sheets([df], files[kind], pd)
+                written.append(files[kind])
+                historyStore.upsert_rankings(conn, today_date, kind, df)
+                state.record(kind, fingerprint([df]))
+                ran(kind, 'ranking changed')
+
+        # Past race dates and results, which needs the date list too
+        date_stages = [stage for stage in ('dates', 'results') if stage in stages]
+        all_dates = timed_stage('dates', fetch_dates, fetcher, pd, urls['results']) if date_stages else None
+        if date_stages and not all_dates:
+            for stage in date_stages:
+                skipped(stage, 'date list could not be scraped')
+        elif date_stages:
+            if 'dates' in stages:
+                if state.unchanged('dates', fingerprint(all_dates)):
+                    skipped('dates', 'no new meeting dates')
+                else:
+                    save_to_csv_with_sheets(all_dates, files['dates'], pd)
+                    state.record('dates', fingerprint(all_dates))
+                    ran('dates', 'date list changed')
+
+            if 'results' in stages:
+                new_dates = new_meeting_dates(all_dates[0]['Dates'].tolist(), historyStore.stored_meeting_dates(conn))
+                if not new_dates:
+                    skipped('results', 'every meeting is already stored')
+                else:
+                    frames = []
+                    stored = []
+                    error = None
+                    with runMetrics.stage('results') as entry:
+                        for date in new_dates:
+                            # A meeting is only stored whole: later runs only look for meetings after the
+                            # latest stored one, so stopping at a failed meeting has the next run retry it
+                            try:
+                                meeting = fetch_meeting_results(fetcher, meeting_url(date, urls['results']), pd)
+                                failed = [race_num for race_num, df in meeting if df.empty]
+                                if failed:
+                                    raise RuntimeError(f"races {', '.join(failed)} failed")
+                            except Exception as e:
+                                error = f"{date.isoformat()}: {e}"
+                                break
+                            historyStore.upsert_meeting_results(conn, meeting)
+                            frames.extend(df for race_num, df in meeting)
+                            stored.append(date.isoformat())
+                        if entry is not None:
+                            entry['rows'] = runMetrics.count_rows(frames)
+                        if frames:
+                            save_to_csv_with_sheets(frames, files['results'], pd)
+                    if frames:
+                        written.append(files['results'])
+                        ran('results', f"new meetings: {', '.join(stored)}")
+                    if error is not None:
+                        report.append(('results', 'failed', f'{error}, retried next run'))
+
+        if speed_pro is not None:
+            try:
+                frames = speed_pro.result()
+            except Exception as e:
+                frames = None
+                print(f"Error scraping Speed Pro: {e}")
+            if frames:
+                written.append(files['speedpro'])
+                state.record('speedpro', card)
+                ran('speedpro', 'racecard changed')
+            else:
+                report.append(('speedpro', 'failed', 'no Speed Pro tables scraped, retried next run'))
+        executor.shutdown()
+
+        state.save()
+    finally:
+        conn.close()
+
+    for stage in INCREMENTAL_STAGES:
+        if stage not in stages:
+            skipped(stage, 'not selected')
+
+    return written, report
+
+
+def timed_stage(name, task, *args):
+    """Runs task(*args) as a stage of the active run metrics, recording the rows it returned."""
+    with runMetrics.stage(name) as entry:
+        result = task(*args)
+        if entry is not None:
+            entry['rows'] = runMetrics.count_rows(result)
+    return result
+
+
+def print_report(report):
+    """Prints which stages ran or were skipped, and why."""
+    print("Incremental run summary:")
+    for stage, status, reason in report:
+        print(f"  {stage:<10} {status:<8} {reason}")
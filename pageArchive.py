@@ -0,0 +1,232 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pageCache import normalize_url, classify
+
+ARCHIVE_FOLDER = 'Data/archive'
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    url_key TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    page_class TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (url_key, fetched_at)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_class ON versions (page_class, fetched_at);
+"""
+
+
+def read_blob(folder, content_hash):
+    """
+    Reads an archived page body.
+
+    A plain function so worker processes can read the archive without opening its index.
+
+    Args:
+        folder (str): Archive folder.
+        content_hash (str): SHA-256 hash of the page.
+
+    Returns:
+        str: The page HTML.
+    """
+    with gzip.open(_blob_path(folder, content_hash), 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def _blob_path(folder, content_hash):
+    return os.path.join(folder, 'blobs', content_hash[:2], f'{content_hash}.html.gz')
+
+
+class PageArchive:
+    """
+    Permanent, content-deduplicated store of every page the scrapers fetched.
+
+    Unlike PageCache nothing ever expires or is evicted. Each distinct body is
+    stored once, gzip-compressed, under its SHA-256 hash. The index keeps one
+    row per version of a URL: when it was first fetched with that content and
+    when it was last seen unchanged. Safe to share between threads.
+    """
+
+    def __init__(self, folder=ARCHIVE_FOLDER):
+        """
+        Args:
+            folder (str): Archive folder.
+        """
+        self.folder = folder
+        self.stored = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(folder, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(folder, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(INDEX_SCHEMA)
+
+    def put(self, url, html, fetched_at=None):
+        """
+        Archives a fetched page. A page identical to the URL's latest version only updates its last_seen time.
+
+        Args:
+            url (str): Page URL.
+            html (str): Page HTML.
+            fetched_at (float): Fetch time as a Unix timestamp, defaults to now.
+
+        Returns:
+            str: SHA-256 hash of the page body.
+        """
+        url_key = normalize_url(url)
+        body = html.encode('utf-8')
+        content_hash = hashlib.sha256(body).hexdigest()
+        fetched_at = fetched_at or time.time()
+
+        with self._lock:
+            path = _blob_path(self.folder, content_hash)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with gzip.open(temp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(temp_path, path)
+            self._conn.execute("INSERT OR IGNORE INTO blobs (content_hash, size, raw_size) VALUES (?, ?, ?)",
+                               (content_hash, os.path.getsize(path), len(body)))
+
+            latest = self._conn.execute(
+                "SELECT fetched_at, content_hash FROM versions WHERE url_key = ? ORDER BY fetched_at DESC LIMIT 1",
+                (url_key,)).fetchone()
+            if latest and latest[1] == content_hash:
+                self._conn.execute("UPDATE versions SET last_seen = MAX(last_seen, ?) WHERE url_key = ? AND fetched_at = ?",
+                                   (fetched_at, url_key, latest[0]))
+                self.unchanged += 1
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO versions (url_key, fetched_at, last_seen, page_class, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url_key, fetched_at, fetched_at, classify(url_key), content_hash))
+                self.stored += 1
+            self._conn.commit()
+        return content_hash
+
+    def get(self, url, at=None):
+        """
+        Returns the archived page for a URL as it was at a given time.
+
+        Args:
+            url (str): Page URL.
+            at (float): Unix timestamp, or None for the latest version.
+
+        Returns:
+            str: The page HTML, or None if the URL was not archived by then.
+        """
+        sql = "SELECT content_hash FROM versions WHERE url_key = ?"
+        params = [normalize_url(url)]
+        if at is not None:
+            sql += " AND fetched_at <= ?"
+            params.append(at)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY fetched_at DESC LIMIT 1", params).fetchone()
+        return read_blob(self.folder, row[0]) if row else None
+
+    def versions(self, url):
+        """
+        Lists the archived versions of a URL.
+
+        Args:
+            url (str): Page URL.
+
+        Returns:
+            list: (fetched_at, last_seen, content_hash) tuples, oldest first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT fetched_at, last_seen, content_hash FROM versions WHERE url_key = ? ORDER BY fetched_at",
+                (normalize_url(url),)).fetchall()
+
+    def pages(self, page_classes=None, latest_only=True):
+        """
+        Lists archived pages, oldest fetch first.
+
+        Args:
+            page_classes (list): Page classes to include (see pageCache.classify), or None for all.
+            latest_only (bool): Only the latest version of each URL.
+
+        Returns:
+            list: (url_key, page_class, fetched_at, content_hash) tuples.
+        """
+        clauses, params = [], []
+        if page_classes:
+            clauses.append(f"page_class IN ({', '.join('?' * len(page_classes))})")
+            params.extend(page_classes)
+        if latest_only:
+            clauses.append("fetched_at = (SELECT MAX(fetched_at) FROM versions latest WHERE latest.url_key = versions.url_key)")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT url_key, page_class, fetched_at, content_hash FROM versions{where} ORDER BY fetched_at",
+                params).fetchall()
+
+    def stats(self):
+        """
+        Returns the archive's size.
+
+        Returns:
+            dict: urls, versions, blobs, bytes (compressed), raw_bytes, and this session's stored and unchanged counts.
+        """
+        with self._lock:
+            urls, versions = self._conn.execute("SELECT COUNT(DISTINCT url_key), COUNT(*) FROM versions").fetchone()
+            blobs, size, raw_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM blobs").fetchone()
+        return {'urls': urls, 'versions': versions, 'blobs': blobs, 'bytes': size, 'raw_bytes': raw_size,
+                'stored': self.stored, 'unchanged': self.unchanged}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ArchivingFetcher:
+    """
+    Fetch backend that archives every page the wrapped backend fetches.
+
+    Put it under a CachedFetcher, so only real fetches are archived.
+    """
+
+    def __init__(self, fetcher, archive):
+        """
+        Args:
+            fetcher: Fetch backend.
+            archive (PageArchive): Archive to add pages to.
+        """
+        self.fetcher = fetcher
+        self.archive = archive
+
+    def get(self, url):
+        html = self.fetcher.get(url)
+        if html is not None:
+            self.archive.put(url, html)
+        return html
+
+    def get_many(self, urls):
+        pages = self.fetcher.get_many(urls)
+        for url, html in zip(urls, pages):
+            if html is not None:
+                self.archive.put(url, html)
+        return pages
+
+    def close(self):
+        self.fetcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,354 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_FOLDER = 'Data/cache'
+
+# Seconds a page of each class stays fresh. None means the page never changes once cached.
+DEFAULT_TTLS = {
+    'results': None,               # LocalResults.aspx for a past RaceDate is final
+    'latest-results': 10 * 60,     # LocalResults.aspx without a date, or for today
+    'racecard': 10 * 60,
+    'speedpro': 10 * 60,
+    'ranking': 6 * 60 * 60,
+    'other': 0,
+}
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url_key TEXT PRIMARY KEY,
+    page_class TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access);
+CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash);
+"""
+
+
+def normalize_url(url):
+    """
+    Normalises a URL so equivalent addresses share a cache entry.
+
+    The scheme and host are lower-cased, the fragment is dropped and query
+    parameters are sorted by name, so '?RaceNo=2&RaceDate=...' and
+    '?RaceDate=...&RaceNo=2' are the same page.
+
+    Args:
+        url (str): Page URL.
+
+    Returns:
+        str: The normalised URL.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True), key=lambda item: item[0].lower()))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def classify(url, today=None):
+    """
+    Works out which class of page a URL is, which decides how long it may be cached.
+
+    Args:
+        url (str): Page URL.
+        today (datetime.date): Date to compare result dates against (defaults to today).
+
+    Returns:
+        str: A key of DEFAULT_TTLS.
+    """
+    parts = urlsplit(url)
+    path = parts.path.lower()
+    params = {key.lower(): value for key, value in parse_qsl(parts.query)}
+
+    if 'localresults.aspx' in path:
+        race_date = params.get('racedate', '').replace('/', '-')
+        if race_date and race_date < (today or date.today()).isoformat():
+            return 'results'
+        return 'latest-results'
+    if 'racecard.aspx' in path:
+        return 'racecard'
+    if 'ranking.aspx' in path:
+        return 'ranking'
+    if 'speedpro' in path:
+        return 'speedpro'
+    return 'other'
+
+
+def is_complete_page(url, html):
+    """
+    Checks a page is whole before it is cached.
+
+    A past results page is cached for good, so a maintenance, provisional or
+    empty page served under its URL must not be: it needs the meeting details
+    and a results table with rows. Other pages expire, and are always complete.
+
+    Args:
+        url (str): Page URL.
+        html (str): Page HTML.
+
+    Returns:
+        bool: True if the page may be cached.
+    """
+    if classify(url) != 'results':
+        return True
+    # Imported here, pastRaces depends on this module through fetchPolicy
+    from pageSnapshot import parse_html
+    from pastRaces import extract_results_payload
+    payload = extract_results_payload(parse_html(html))
+    return bool(payload['meeting'] and payload['headers'] and payload['rows'])
+
+
+class PageCache:
+    """
+    Local content-addressed cache of fetched pages.
+
+    Each distinct page body is stored once, gzip-compressed, under its SHA-256
+    hash. A small SQLite index maps normalised URLs to bodies with the time they
+    were fetched and last read. Entries expire by page class (see DEFAULT_TTLS)
+    and the least recently used ones are evicted once the cache grows past
+    max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=512 * 1024 * 1024, ttls=None):
+        """
+        Args:
+            folder (str): Cache folder.
+            max_bytes (int): Compressed size the cache is trimmed back to.
+            ttls (dict): Overrides for DEFAULT_TTLS.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(folder, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(folder, 'index.sqlite'), check_same_thread=False)
+        self._conn.executescript(INDEX_SCHEMA)
+
+    def get(self, url):
+        """
+        Returns the cached page for a URL if it is still fresh.
+
+        Args:
+            url (str): Page URL.
+
+        Returns:
+            str: Cached HTML, or None on a miss or expired entry.
+        """
+        url_key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, fetched_at, page_class FROM pages WHERE url_key = ?", (url_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            # Use the class the page had when it was fetched: today's results are not final yet
+            ttl = self.ttls.get(row[2], 0)
+            if ttl is not None and time.time() - row[1] > ttl:
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            try:
+                with gzip.open(self._blob_path(row[0]), 'rt', encoding='utf-8') as f:
+                    html = f.read()
+            except OSError:
+                # The body is gone, treat it as a miss and forget the entry
+                self._conn.execute("DELETE FROM pages WHERE url_key = ?", (url_key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE url_key = ?", (time.time(), url_key))
+            self._conn.commit()
+            self.hits += 1
+            return html
+
+    def put(self, url, html):
+        """
+        Stores a freshly fetched page. Pages of a class with a zero TTL are not stored.
+
+        Args:
+            url (str): Page URL.
+            html (str): Page HTML.
+
+        Returns:
+            str: SHA-256 hash of the page body.
+        """
+        url_key = normalize_url(url)
+        body = html.encode('utf-8')
+        content_hash = hashlib.sha256(body).hexdigest()
+        page_class = classify(url_key)
+        if self.ttls.get(page_class, 0) == 0:
+            return content_hash
+
+        with self._lock:
+            path = self._blob_path(content_hash)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f'{path}.{threading.get_ident()}.tmp'
+                with gzip.open(temp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(temp_path, path)
+
+            now = time.time()
+            previous = self._conn.execute("SELECT content_hash FROM pages WHERE url_key = ?", (url_key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url_key, page_class, content_hash, size, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url_key, page_class, content_hash, os.path.getsize(path), now, now))
+            if previous and previous[0] != content_hash:
+                self._drop_blob_if_unused(previous[0])
+            self._evict()
+            self._conn.commit()
+        return content_hash
+
+    def discard(self, url):
+        """
+        Forgets the cached page for a URL, so the next get is a miss.
+
+        Args:
+            url (str): Page URL.
+        """
+        url_key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE url_key = ?", (url_key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM pages WHERE url_key = ?", (url_key,))
+            self._drop_blob_if_unused(row[0])
+            self._conn.commit()
+
+    def content_hash(self, url):
+        """
+        Returns the hash of the page last cached for a URL, fresh or not.
+
+        Args:
+            url (str): Page URL.
+
+        Returns:
+            str: SHA-256 hash, or None if the URL was never cached.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM pages WHERE url_key = ?", (normalize_url(url),)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the cache's current size.
+
+        Returns:
+            dict: hits, misses, expired, evictions, hit_rate, entries and bytes.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.folder, 'blobs', content_hash[:2], f'{content_hash}.html.gz')
+
+    def _drop_blob_if_unused(self, content_hash):
+        in_use = self._conn.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        if not in_use:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def _evict(self):
+        # Sizes are counted per distinct body, since identical pages share one blob
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT url_key, content_hash, size FROM pages ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url_key = ?", (row[0],))
+            self.evictions += 1
+            in_use = self._conn.execute(
+                "SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (row[1],)).fetchone()
+            if not in_use:
+                self._drop_blob_if_unused(row[1])
+                total -= row[2]
+
+
+class CachedFetcher:
+    """
+    Fetch backend that answers from a PageCache and only sends misses to the wrapped backend.
+
+    Fetched pages are only cached if they are complete (see is_complete_page);
+    an incomplete one is still returned, and fetched again next time.
+    """
+
+    def __init__(self, fetcher, cache, is_complete=is_complete_page):
+        """
+        Args:
+            fetcher: Fetch backend to use on a cache miss.
+            cache (PageCache): Page cache.
+            is_complete (callable): Takes (url, html) and returns whether the page may be cached.
+        """
+        self.fetcher = fetcher
+        self.cache = cache
+        self.is_complete = is_complete
+
+    def get(self, url):
+        html = self.cache.get(url)
+        if html is None:
+            html = self.fetcher.get(url)
+            self._store(url, html)
+        return html
+
+    def get_many(self, urls):
+        pages = [self.cache.get(url) for url in urls]
+        missing = [i for i, page in enumerate(pages) if page is None]
+        if missing:
+            fetched = self.fetcher.get_many([urls[i] for i in missing])
+            for i, html in zip(missing, fetched):
+                if html is not None:
+                    self._store(urls[i], html)
+                pages[i] = html
+        return pages
+
+    def _store(self, url, html):
+        if self.is_complete(url, html):
+            self.cache.put(url, html)
+        else:
+            # Also drop an earlier copy, so the page is fetched again next time
+            print(f"Not caching incomplete page {url}")
+            self.cache.discard(url)
+
+    def close(self):
+        self.fetcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
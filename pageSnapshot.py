@@ -0,0 +1,152 @@
+import re
+from bs4 import BeautifulSoup, NavigableString, Comment
+
+# Attribute the snapshot script puts on every element whose computed style is 'display: none'.
+# Static pages (saved fixtures, plain HTTP responses) have no computed style, so for those we
+# fall back to inline 'display: none' styles.
+HIDDEN_ATTRIBUTE = 'data-snapshot-hidden'
+
+SNAPSHOT_SCRIPT = """
+var elements = document.body ? document.body.getElementsByTagName('*') : [];
+for (var i = 0; i < elements.length; i++) {
+    if (window.getComputedStyle(elements[i]).display === 'none') {
+        elements[i].setAttribute('%s', '1');
+    }
+}
+return document.documentElement.outerHTML;
+""" % HIDDEN_ATTRIBUTE
+
+# Tags that start a new line in the rendered text, the same way Selenium's element.text does.
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset',
+              'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table',
+              'tbody', 'thead', 'tfoot', 'tr', 'ul'}
+
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+
+# Source whitespace (including newlines) that collapses to a single space when rendered.
+# Non-breaking spaces are deliberately excluded, the browser keeps them.
+WHITESPACE = re.compile(r'[ \t\n\r\f\v]+')
+
+
+def take_snapshot(driver):
+    """
+    Captures the current page as a single HTML string with one WebDriver call.
+
+    Elements hidden by CSS are tagged with HIDDEN_ATTRIBUTE before the HTML is
+    serialised, so the in-process parser can skip them exactly like
+    value_of_css_property('display') would.
+
+    Args:
+        driver: Selenium WebDriver instance.
+
+    Returns:
+        str: The outer HTML of the whole document.
+    """
+    return driver.execute_script(SNAPSHOT_SCRIPT)
+
+
+def parse_html(html):
+    """
+    Parses an HTML string into a BeautifulSoup tree.
+
+    Args:
+        html (str): Page HTML.
+
+    Returns:
+        BeautifulSoup: The parsed document.
+    """
+    return BeautifulSoup(html, 'html.parser')
+
+
+def has_display_none(tag):
+    """
+    Checks whether the element itself is styled 'display: none'.
+
+    Args:
+        tag: BeautifulSoup Tag.
+
+    Returns:
+        bool: True if the element is not displayed.
+    """
+    if tag.has_attr(HIDDEN_ATTRIBUTE):
+        return True
+    style = tag.get('style', '').replace(' ', '').lower()
+    return 'display:none' in style
+
+
+def is_displayed(tag):
+    """
+    Checks whether the element and all of its ancestors are displayed.
+
+    Args:
+        tag: BeautifulSoup Tag.
+
+    Returns:
+        bool: True if the element would be rendered on the page.
+    """
+    while tag is not None and tag.name != '[document]':
+        if has_display_none(tag):
+            return False
+        tag = tag.parent
+    return True
+
+
+def element_text(tag):
+    """
+    Returns the visible text of an element, formatted like Selenium's element.text.
+
+    Hidden subtrees are skipped, <br> and block elements become line breaks,
+    runs of whitespace collapse to a single space and every line is stripped.
+
+    Args:
+        tag: BeautifulSoup Tag (or None).
+
+    Returns:
+        str: The visible text, or '' if the element is hidden or missing.
+    """
+    if tag is None or not is_displayed(tag):
+        return ''
+
+    parts = []
+    _collect_text(tag, parts)
+
+    lines = [WHITESPACE.sub(' ', line).replace('\xa0', ' ').strip() for line in ''.join(parts).split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+def _collect_text(tag, parts):
+    for child in tag.children:
+        if isinstance(child, Comment):
+            continue
+        if isinstance(child, NavigableString):
+            parts.append(WHITESPACE.sub(' ', str(child)))
+            continue
+        if child.name in SKIPPED_TAGS or has_display_none(child):
+            continue
+        if child.name == 'br':
+            parts.append('\n')
+            continue
+
+        block = child.name in BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        _collect_text(child, parts)
+        if block:
+            parts.append('\n')
+        elif child.name in ('td', 'th'):
+            parts.append(' ')
+
+
+def find_by_class(soup, class_name):
+    """
+    Finds the first element carrying the given class, like find_element(By.CLASS_NAME, ...).
+
+    Args:
+        soup: BeautifulSoup document or Tag to search within.
+        class_name (str): CSS class name.
+
+    Returns:
+        Tag: The first matching element, or None.
+    """
+    return soup.find(class_=class_name)
@@ -1,5 +1,53 @@
+import re
+from urllib.parse import urljoin
 from utils import save_to_csv_with_sheets
-def scrape_pastRaces(driver, url, By, pd, file_name):
+from pageSnapshot import parse_html, element_text, has_display_none, find_by_class
+from browser import wait_for_element
+from fetchPolicy import load_page
+from raceRecords import parse_meeting, race_from_details, result_from_cells
+
+# Pulls everything scrape_race needs from a results page in one JavaScript evaluation:
+# the race meeting span, the visible cells of the performance table and the race_tab grid.
+RESULTS_SCRIPT = """
+function text(el) {
+    if (!el) { return ''; }
+    return (el.innerText || '').replace(/\\u00a0/g, ' ').split('\\n')
+        .map(function (line) { return line.trim(); })
+        .filter(function (line) { return line.length > 0; })
+        .join('\\n');
+}
+function displayed(el) {
+    return window.getComputedStyle(el).display !== 'none';
+}
+function cells(row) {
+    return Array.prototype.slice.call(row.getElementsByTagName('td'));
+}
+
+var result = {meeting: null, headers: null, rows: null, race_tab: null};
+
+var meeting = document.querySelector('.raceMeeting_select');
+if (meeting && meeting.getElementsByTagName('span').length) {
+    result.meeting = text(meeting.getElementsByTagName('span')[0]);
+}
+
+var content = document.getElementById('innerContent');
+var performance = content ? content.querySelector('.performance') : null;
+if (performance && performance.querySelector('thead') && performance.querySelector('tbody')) {
+    result.headers = cells(performance.querySelector('thead')).map(text);
+    result.rows = Array.prototype.slice.call(performance.querySelector('tbody').getElementsByTagName('tr'))
+        .map(function (tr) { return cells(tr).filter(displayed).map(text); });
+}
+
+var raceTab = document.querySelector('.race_tab table tbody');
+if (raceTab) {
+    result.race_tab = Array.prototype.slice.call(raceTab.getElementsByTagName('tr'))
+        .map(function (tr) { return cells(tr).map(text); });
+}
+
+return result;
+"""
+
+def scrape_pastRaces(driver, url, By, pd, file_name, batched=False):
     """
     Scrapes past race data from the provided URL.
     
@@ -8,11 +56,13 @@ def scrape_pastRaces(driver, url, By, pd, file_name):
         url (str): URL to scrape the trainer ranking data from.
         By: Selenium By module (passed from main).
         pd: pandas module (passed from main).
+        batched (bool): Extract each race page with a single JavaScript evaluation instead of per-element calls.
     
     Returns:
         pd.DataFrame: A pandas DataFrame containing the trainer ranking data.
     """
-    driver.get(url)
+    load_page(driver, url)
+    wait_for_element(driver, By.CLASS_NAME, 'top_races')
 
     # Extract all URLs from the race navigation buttons
     urls = extract_urls(driver, By)
@@ -20,26 +70,243 @@ def scrape_pastRaces(driver, url, By, pd, file_name):
     
     print(f"Found {len(urls)} race URLs to scrape")
 
-    # Initialize a list to store DataFrames
-    all_dataframes = []
+    # Scrape each URL and hand its DataFrame to the writer as soon as it is ready. top_races also links
+    # the race already loaded, which would be scraped twice.
+    urls = [page_url for page_url in urls if 'Racecourse=S1' not in page_url]
+    urls = urls[:1] + [page_url for page_url in urls[1:] if race_number(page_url) != race_number(url)]
 
-    # Scrape each URL and append the resulting DataFrame to the list
-    urls = [url for url in urls if 'Racecourse=S1' not in url]
-    for page_url in urls:
-        # Navigate to the race page
-        driver.get(page_url)
-        
-        # Extract race number from URL for logging
-        race_num = page_url.split('RaceNo=')[-1] if 'RaceNo=' in page_url else '1'
-        
-        df = scrape_race(driver, page_url, By, pd)
-        if not df.empty:  # Only add non-empty DataFrames
-            all_dataframes.append(df)
-        else:
-            print(f"Failed to scrape Race {race_num}")
-    
+    def scraped_races():
+        for page_url in urls:
+            # Navigate to the race page
+            try:
+                load_page(driver, page_url)
+            except Exception as e:
+                print(f"Error loading {page_url}: {e}")
+                continue
+            wait_for_element(driver, By.CSS_SELECTOR, '#innerContent .performance tbody')
+
+            # Extract race number from URL for logging
+            race_num = race_number(page_url)
+
+            if batched:
+                df = scrape_race_batched(driver, pd)
+            else:
+                df = scrape_race(driver, page_url, By, pd)
+            if not df.empty:  # Only add non-empty DataFrames
+                yield df
+            else:
+                print(f"Failed to scrape Race {race_num}")
+
+    # Save all DataFrames to a CSV file with separate sheets
+    save_to_csv_with_sheets(scraped_races(), file_name, pd)
+
+def fetch_pastRaces(fetcher, url, pd, file_name):
+    """
+    Same as scrape_pastRaces, but loads every results page through a fetch backend.
+
+    Args:
+        fetcher: Fetch backend (fetchBackend.HttpFetcher or fetchBackend.SeleniumFetcher).
+        url (str): Results URL to start from.
+        pd: pandas module.
+        file_name (str): Excel file to write.
+
+    Returns:
+        list: (race number, DataFrame) pairs from fetch_meeting_results.
+    """
+    races = fetch_meeting_results(fetcher, url, pd)
     # Save all DataFrames to a CSV file with separate sheets
-    save_to_csv_with_sheets(all_dataframes, file_name, pd)
+    save_to_csv_with_sheets((df for race_num, df in races if not df.empty), file_name, pd)
+    return races
+
+def fetch_meeting_results(fetcher, url, pd):
+    """
+    Loads and parses every race of one meeting's results through a fetch backend.
+
+    Args:
+        fetcher: Fetch backend.
+        url (str): Results URL of the meeting (its first race).
+        pd: pandas module.
+
+    Returns:
+        list: (race number, DataFrame) pairs in race order. Races that failed have an empty DataFrame.
+    """
+    html = fetcher.get(url)
+
+    # Extract all URLs from the race navigation buttons
+    urls = parse_result_urls(html, url)
+    print(f"Found {len(urls) + 1} race URLs to scrape")
+
+    # The first race is the page that is already loaded, which top_races links as well
+    urls = [page_url for page_url in urls
+            if 'Racecourse=S1' not in page_url and race_number(page_url) != race_number(url)]
+
+    pages = [html] + fetcher.get_many(urls)
+    races = []
+    for page_url, page in zip([url] + urls, pages):
+        race_num = race_number(page_url)
+
+        df = parse_results_page(page, pd) if page is not None else pd.DataFrame()
+        if df.empty:
+            print(f"Failed to scrape Race {race_num}")
+        races.append((race_num, df))
+
+    return races
+
+def race_number(url):
+    """
+    Returns the race number of a results URL as text: its RaceNo, or '1' for a meeting's base URL.
+    """
+    match = re.search(r'RaceNo=(\d+)', url, re.IGNORECASE)
+    return match.group(1) if match else '1'
+
+def fetch_dates(fetcher, pd, url):
+    """
+    Same as extract_dates, but loads the results page through a fetch backend.
+
+    Args:
+        fetcher: Fetch backend.
+        pd: pandas module.
+        url (str): Results page URL.
+
+    Returns:
+        list: A single DataFrame with a 'Dates' column, or None if no dates were found.
+    """
+    try:
+        all_dates = parse_dates(fetcher.get(url))
+
+        if all_dates:
+            df = pd.DataFrame(all_dates, columns=["Dates"])
+            return [df]
+        else:
+            print("Unable to extract all past race dates")
+    except Exception as e:
+        print(f"Error extracting all past race dates: {e}")
+
+def parse_dates(html):
+    """
+    Extracts the meeting dates from the first <select> of a results page.
+
+    Args:
+        html (str): Results page HTML.
+
+    Returns:
+        list: Date strings, in page order.
+    """
+    date_select_box = parse_html(html).find('select')
+    if date_select_box is None:
+        raise ValueError("Unable to locate the date select box")
+    return [element_text(option) for option in date_select_box.find_all('option')]
+
+def parse_result_urls(html, base_url):
+    """
+    Extracts the race URLs from the 'top_races' div of a results page, excluding 'ResultsAll'.
+
+    Args:
+        html (str): Results page HTML.
+        base_url (str): URL the page was loaded from, used to resolve relative links.
+
+    Returns:
+        list: A list of absolute URLs.
+    """
+    urls = []
+    top_races_div = find_by_class(parse_html(html), "top_races")
+    if top_races_div is None:
+        print("Error extracting URLs: Unable to locate the top_races div")
+        return urls
+
+    for link in top_races_div.find_all("a"):
+        url = urljoin(base_url, link['href']) if link.get('href') else None
+        if url and 'ResultsAll' not in url:
+            urls.append(url)
+
+    print(f"Found {len(urls)} race links in top_races div (excluding 'ResultsAll')")
+    return urls
+
+def parse_results_page(html, pd):
+    """
+    Parses a results page from its HTML into the same DataFrame as scrape_race.
+
+    Args:
+        html (str): Results page HTML.
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: The race data, or an empty DataFrame on error.
+    """
+    return build_race_frame(extract_results_payload(parse_html(html)), pd)
+
+def parse_results_records(html, race_no):
+    """
+    Parses a results page straight into typed records (see raceRecords), skipping the padded DataFrame.
+
+    Args:
+        html (str): Results page HTML.
+        race_no (int): Race number of the page.
+
+    Returns:
+        tuple: (RaceMeta, list of RunnerResult, list of SectionalSplit), or None if the page
+            has no meeting details or results table.
+    """
+    return build_race_records(extract_results_payload(parse_html(html)), race_no)
+
+def build_race_records(payload, race_no):
+    """
+    Builds typed records from an extracted results page payload.
+
+    Args:
+        payload (dict): From extract_results_payload or RESULTS_SCRIPT.
+        race_no (int): Race number of the page.
+
+    Returns:
+        tuple: (RaceMeta, list of RunnerResult, list of SectionalSplit), or None if the
+            meeting details or results table are missing.
+    """
+    meeting = parse_meeting((payload.get('meeting') or '').replace('Race Meeting:  ', ''))
+    if meeting is None or payload.get('headers') is None:
+        print(f"Error extracting race {race_no}: missing meeting details or results table")
+        return None
+    race_date, venue = meeting
+
+    details = parse_race_tab(payload.get('race_tab'))
+    if details[0] == 'No Race Details Found':
+        details = [None] * 5
+    race, splits = race_from_details(race_date, venue, int(race_no), *details)
+
+    headers = [header.strip() for header in payload['headers'] if header.strip()]
+    runners = [result_from_cells(race_date, venue, int(race_no), dict(zip(headers, [cell.strip() for cell in cells])))
+               for cells in payload['rows'] or []]
+    return race, [runner for runner in runners if runner is not None], splits
+
+def extract_results_payload(soup):
+    """
+    Builds the same payload as RESULTS_SCRIPT from a parsed results page.
+
+    Args:
+        soup: Parsed results page.
+
+    Returns:
+        dict: 'meeting', 'headers', 'rows' and 'race_tab' (None where a part is missing).
+    """
+    payload = {'meeting': None, 'headers': None, 'rows': None, 'race_tab': None}
+
+    meeting = find_by_class(soup, 'raceMeeting_select')
+    if meeting is not None and meeting.find('span') is not None:
+        payload['meeting'] = element_text(meeting.find('span'))
+
+    content = soup.find(id='innerContent')
+    performance = find_by_class(content, 'performance') if content is not None else None
+    if performance is not None and performance.find('thead') is not None and performance.find('tbody') is not None:
+        payload['headers'] = [element_text(td) for td in performance.find('thead').find_all('td')]
+        payload['rows'] = [[element_text(td) for td in tr.find_all('td') if not has_display_none(td)]
+                           for tr in performance.find('tbody').find_all('tr')]
+
+    race_tab = find_by_class(soup, 'race_tab')
+    table = race_tab.find('table') if race_tab is not None else None
+    if table is not None and table.find('tbody') is not None:
+        payload['race_tab'] = [[element_text(td) for td in tr.find_all('td')]
+                               for tr in table.find('tbody').find_all('tr')]
+
+    return payload
 
 def extract_urls(driver, By):
     """
@@ -75,7 +342,8 @@ def extract_urls(driver, By):
     return urls
 
 def extract_dates(driver, By, pd, url):
-    driver.get(url)
+    load_page(driver, url)
+    wait_for_element(driver, By.TAG_NAME, 'select')
 
     try:
         date_select_box = driver.find_element(By.TAG_NAME, 'select')
@@ -191,3 +459,128 @@ def get_race_tab(driver, pd, By):
     except Exception as e:
         print(f"Error extracting race details: {e}")
         return ['No Race Details Found'] + [''] * 11
+
+def scrape_race_batched(driver, pd):
+    """
+    Scrapes the currently loaded results page with one JavaScript evaluation.
+
+    Args:
+        driver: Selenium WebDriver instance (already on the race page).
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: The same DataFrame scrape_race produces, or an empty DataFrame on error.
+    """
+    try:
+        payload = driver.execute_script(RESULTS_SCRIPT)
+    except Exception as e:
+        print(f"Error extracting table data: {e}")
+        return pd.DataFrame()
+
+    return build_race_frame(payload, pd)
+
+def build_race_frame(payload, pd):
+    """
+    Builds the past race DataFrame from an extracted results page payload.
+
+    Args:
+        payload (dict): 'meeting' text, performance 'headers' and 'rows', and the 'race_tab' grid
+            (a list of rows, each a list of cell texts). Missing parts are None.
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame containing the race data, or an empty DataFrame on error.
+    """
+    try:
+        if payload is None or payload.get('headers') is None:
+            raise ValueError("Unable to locate the performance table")
+
+        rows = []
+
+        #Locate race date and location
+        race_info = parse_race_meeting(payload.get('meeting'))
+
+        #Locate race tab data
+        race_tab_info = parse_race_tab(payload.get('race_tab'))
+        if race_tab_info and race_tab_info[0] != 'No Race Details Found':
+            # Add race tab info to race_info
+            race_info.extend(race_tab_info)
+
+        rows.append(race_info)
+
+        headers = [header.strip() for header in payload['headers'] if header.strip()]
+
+        # Add headers for race tab info
+        additional_headers = ['Class/Distance', 'Going', 'Course', 'Total Time (sec)', 'Sectional Times']
+        headers.extend(additional_headers)
+
+        for cells in payload['rows']:
+            row = [cell.strip() for cell in cells]
+            if row:  # Only append non-empty rows
+                # Add empty values for the race tab columns since they only apply to the race info row
+                row.extend([''] * len(additional_headers))
+                rows.append(row)
+
+        # Create DataFrame from the extracted data
+        df = pd.DataFrame(rows, columns=headers)
+        return df
+
+    except Exception as e:
+        print(f"Error extracting table data: {e}")
+        return pd.DataFrame()
+
+def parse_race_meeting(meeting):
+    """
+    Formats the race meeting text the same way get_race_info does.
+
+    Args:
+        meeting (str): Text of the 'raceMeeting_select' span, or None if it was not found.
+
+    Returns:
+        list: Race info row padded to 12 entries.
+    """
+    if meeting is None:
+        print("Error extracting race details: Unable to locate the race meeting")
+        return ['No Race Details Found'] + [''] * 11
+
+    formatted_info = meeting.replace('Race Meeting:  ', '')
+    return ['Race Details'] + [formatted_info] + [''] * (10)
+
+def parse_race_tab(grid):
+    """
+    Parses the race_tab grid locally, matching get_race_tab.
+
+    Args:
+        grid (list): Rows of the race_tab table body, each a list of cell texts, or None.
+
+    Returns:
+        list: [class/distance, going, course, total seconds, sectional times].
+    """
+    try:
+        if grid is None:
+            raise ValueError("Unable to locate the race_tab table")
+
+        class_distance = grid[1][0]
+        going = grid[1][2]
+        course = grid[2][2]
+
+        # Get all time values (skipping the first two cells which contain labels)
+        time_values = [cell.strip('()') for cell in grid[3][2:] if cell.strip()]
+
+        # Get the final time (last value)
+        final_time = time_values[-1]
+        minutes, seconds = final_time.split(":")
+        total_seconds = float(minutes) * 60 + float(seconds)
+
+        # Sectional times are in the fifth row
+        sectional_times = []
+        for cell in grid[4][2:]:
+            main_time = cell.split('\n')[0].strip()  # Get the main time before the blue numbers
+            if main_time:
+                sectional_times.append(main_time)
+
+        return [class_distance, going, course, total_seconds, sectional_times]
+
+    except Exception as e:
+        print(f"Error extracting race details: {e}")
+        return ['No Race Details Found'] + [''] * 11
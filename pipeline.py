@@ -0,0 +1,206 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from exportWriter import open_writer
+from pageSnapshot import parse_html
+import runMetrics
+
+_DONE = object()
+
+
+def parse_racecard(html, url):
+    """Parses a racecard page into (race key, DataFrame), as fetch_all_pages does."""
+    import pandas as pd
+    from scrapeRacePage import parse_race_page, parse_race_key
+    soup = parse_html(html)
+    return parse_race_key(soup), parse_race_page(soup, pd)
+
+
+def parse_speedpro(html, url):
+    """Parses a rendered Speed Pro page into (None, DataFrame)."""
+    import pandas as pd
+    from speedPro import parse_speed_pro_page
+    return None, parse_speed_pro_page(html, pd)
+
+
+def parse_results(html, url):
+    """Parses a results page into (race number, DataFrame), as fetch_meeting_results does."""
+    import pandas as pd
+    from pastRaces import parse_results_page, race_number
+    return race_number(url), parse_results_page(html, pd)
+
+
+def _discover(kind, html, url):
+    if kind == 'racecard':
+        from scrapeRacePage import parse_racingNum_urls
+        return parse_racingNum_urls(html, url)
+    if kind == 'speedpro':
+        from speedPro import parse_race_nav_urls
+        return parse_race_nav_urls(html, url)
+    from pastRaces import parse_result_urls
+    return parse_result_urls(html, url)
+
+
+# Kind -> (parser, whether the entry page is itself the first race)
+PIPELINES = {
+    'racecard': (parse_racecard, True),
+    'speedpro': (parse_speedpro, False),
+    'results': (parse_results, True),
+}
+
+
+async def run_pipeline(kind, fetch, url, output_file, fetch_workers=4, parse_workers=2, queue_size=8,
+                       processes=True, keep=True):
+    """
+    Scrapes every race of a page as a stream of discovery -> fetch -> parse -> write stages.
+
+    The stages are joined by bounded queues, so fetching, parsing and writing
+    overlap and at most a few pages are in memory at once. A slow page only holds
+    up one fetch worker. The writer keeps the race order: a finished race waits
+    in a small buffer until the races before it are written.
+
+    Args:
+        kind (str): 'racecard', 'speedpro' or 'results'.
+        fetch (callable): Blocking function returning a page's HTML for a URL (e.g. HttpFetcher.get).
+        url (str): Entry page, whose race links are discovered.
+        output_file (str): Workbook (or .csv.gz / .parquet) to stream the races into, or None.
+        fetch_workers (int): Pages fetched at once.
+        parse_workers (int): Pages parsed at once.
+        queue_size (int): Capacity of each queue between stages.
+        processes (bool): Parse in worker processes rather than threads.
+        keep (bool): Return the parsed races. Turn off to keep memory flat on large runs.
+
+    Returns:
+        list: (key, DataFrame) pairs in race order if keep, otherwise an empty list.
+    """
+    parser, entry_is_race = PIPELINES[kind]
+    loop = asyncio.get_running_loop()
+    io_pool = ThreadPoolExecutor(max_workers=fetch_workers + 1)
+    cpu_pool = ProcessPoolExecutor(max_workers=parse_workers) if processes else ThreadPoolExecutor(max_workers=parse_workers)
+    urls = asyncio.Queue(maxsize=queue_size)
+    pages = asyncio.Queue(maxsize=queue_size)
+    parsed = asyncio.Queue(maxsize=queue_size)
+    races = []
+
+    async def discover():
+        html = await loop.run_in_executor(io_pool, fetch, url)
+        links = [link for link in _discover(kind, html, url) if 'Racecourse=S1' not in link]
+        if entry_is_race:
+            # The entry page is the first race, which its race links list as well
+            from pastRaces import race_number
+            links = [link for link in links if race_number(link) != race_number(url)]
+        print(f"Found {len(links) + entry_is_race} {kind} pages to scrape")
+        index = 0
+        if entry_is_race:
+            await pages.put((index, url, html))
+            index += 1
+        for link in links:
+            await urls.put((index, link))
+            index += 1
+        for _ in range(fetch_workers):
+            await urls.put(_DONE)
+
+    async def fetch_worker():
+        while True:
+            item = await urls.get()
+            if item is _DONE:
+                return
+            index, page_url = item
+            try:
+                html = await loop.run_in_executor(io_pool, fetch, page_url)
+            except Exception as e:
+                print(f"Error fetching {page_url}: {e}")
+                html = None
+            await pages.put((index, page_url, html))
+
+    async def parse_worker():
+        while True:
+            item = await pages.get()
+            if item is _DONE:
+                return
+            index, page_url, html = item
+            result = None
+            if html is None:
+                print(f"Failed to fetch {page_url}")
+            else:
+                try:
+                    result = await loop.run_in_executor(cpu_pool, parser, html, page_url)
+                except Exception as e:
+                    print(f"Error parsing {page_url}: {e}")
+            await parsed.put((index, result))
+
+    async def write():
+        writer = open_writer(output_file) if output_file else None
+        start = time.perf_counter()
+        waiting = {}
+        next_index = sheets = rows = 0
+        try:
+            while True:
+                item = await parsed.get()
+                if item is _DONE:
+                    break
+                waiting[item[0]] = item[1]
+                while next_index in waiting:
+                    result = waiting.pop(next_index)
+                    next_index += 1
+                    if result is None or result[1] is None or result[1].empty:
+                        continue  # Only write non-empty DataFrames
+                    if writer is not None:
+                        try:
+                            await loop.run_in_executor(io_pool, writer.write, result[1])
+                        except Exception as e:
+                            # Keep draining the queue so the other stages can finish
+                            print(f"An error occurred while saving data: {e}")
+                            await loop.run_in_executor(io_pool, writer.abort)
+                            writer = None
+                    sheets += 1
+                    rows += len(result[1])
+                    if keep:
+                        races.append(result)
+        except BaseException:
+            # Never leave a partly written file behind
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            try:
+                await loop.run_in_executor(io_pool, writer.close)
+            except Exception as e:
+                print(f"An error occurred while saving data: {e}")
+            else:
+                runMetrics.record_export(output_file, time.perf_counter() - start, sheets, rows)
+                print(f"Data saved to {output_file}")
+
+    try:
+        writer = asyncio.ensure_future(write())
+        fetchers = [asyncio.ensure_future(fetch_worker()) for _ in range(fetch_workers)]
+        parsers = [asyncio.ensure_future(parse_worker()) for _ in range(parse_workers)]
+
+        await discover()
+        await asyncio.gather(*fetchers)
+        for _ in range(parse_workers):
+            await pages.put(_DONE)
+        await asyncio.gather(*parsers)
+        await parsed.put(_DONE)
+        await writer
+    finally:
+        io_pool.shutdown(wait=False)
+        cpu_pool.shutdown()
+    return races
+
+
+def stream_scrape(kind, fetch, url, output_file, **options):
+    """
+    Runs run_pipeline to completion from synchronous code, e.g. one of the crawler's stages.
+
+    Args:
+        kind (str): 'racecard', 'speedpro' or 'results'.
+        fetch (callable): Blocking function returning a page's HTML for a URL.
+        url (str): Entry page.
+        output_file (str): File to stream the races into, or None.
+        **options: Passed on to run_pipeline.
+
+    Returns:
+        list: (key, DataFrame) pairs in race order (see run_pipeline).
+    """
+    return asyncio.run(run_pipeline(kind, fetch, url, output_file, **options))
@@ -0,0 +1,349 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, unquote
+import numpy as np
+import pandas as pd
+import historyStore
+from historyStore import RUN_COLUMNS, RACE_DETAIL_COLUMNS, FORM_HEADINGS, horse_key
+
+# Racecard columns kept in front of the past runs of an enriched card
+CARD_COLUMNS = ['race_date', 'venue', 'race_no', 'horse_no', 'horse_name', 'brand_no', 'draw', 'weight', 'rating',
+                'jockey', 'trainer']
+
+# Finishing places that count as a place in the trainer/jockey stats
+PLACES = 3
+
+# Positions of a horse or date with nothing stored, typed like the groupby indices
+NO_POSITIONS = np.empty(0, dtype=np.intp)
+
+
+class QueryService:
+    """
+    The race history held in memory, answering the usual lookups from an LRU cache.
+
+    Results (with their race details) and racecards are loaded once. Every
+    lookup first checks historyStore.store_versions, a single small read, and
+    reloads only the kind of data that was written since, emptying the cache.
+    Rankings stay in the store's time series, whose days rebuild in a few
+    milliseconds, and only their answers are cached.
+
+    Lookups return new DataFrames, so callers may change them. The service
+    can be shared between threads.
+    """
+
+    def __init__(self, path=historyStore.HISTORY_DB, cache_size=512):
+        """
+        Args:
+            path (str): SQLite history store.
+            cache_size (int): Most lookups kept in the cache.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._conn = historyStore.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._versions = {}
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+        self.runs = self.cards = None
+        self._horse_index = self._card_index = {}
+        self._refresh()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _refresh(self):
+        # Reloads whatever was written since the last check, and drops the cached answers if anything was
+        versions = historyStore.store_versions(self._conn)
+        if versions == self._versions and self.runs is not None:
+            return
+        changed = {name for name in versions.keys() | self._versions.keys()
+                   if versions.get(name) != self._versions.get(name)}
+        if self.runs is None or 'results' in changed:
+            self._load_runs()
+        if self.cards is None or 'racecards' in changed:
+            self._load_cards()
+        self._versions = versions
+        self._cache.clear()
+        self._reloads += 1
+
+    def _load_runs(self):
+        keys = ['race_date', 'venue', 'race_no']
+        results = historyStore.load_results(self._conn, columns=RUN_COLUMNS)
+        races = historyStore.load_races(self._conn, columns=keys + RACE_DETAIL_COLUMNS)
+        for df in (results, races):
+            df['venue'] = df['venue'].astype(str)
+        runs = results.merge(races, on=keys, how='left')
+        self.runs = runs.sort_values(['race_date', 'race_no', 'place_num'], ascending=[False, False, True],
+                                     na_position='last').reset_index(drop=True)
+
+        # Horse key -> positions of its runs, latest first, under both its brand number and its name
+        index = {}
+        for keys_of in (self.runs['brand_no'], self.runs['horse_name'].str.upper()):
+            for key, positions in self.runs.groupby(keys_of).indices.items():
+                index[key] = np.union1d(index[key], positions) if key in index else positions
+        self._horse_index = index
+
+    def _load_cards(self):
+        self.cards = historyStore.load_racecards(self._conn).sort_values(['race_date', 'race_no', 'horse_no'])
+        self.cards = self.cards.reset_index(drop=True)
+        self._card_index = self.cards.groupby(self.cards['race_date'].dt.strftime('%Y-%m-%d')).indices
+
+    def _lookup(self, key, compute):
+        with self._lock:
+            self._refresh()
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return self._cache[key].copy()
+            self._misses += 1
+            value = compute()
+            self._cache[key] = value
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return value.copy()
+
+    def cache_stats(self):
+        """
+        Returns cache hits, misses and entries, and how many times the data was (re)loaded.
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'entries': len(self._cache), 'loads': self._reloads}
+
+    def _horse_runs(self, horse, last_runs, before):
+        runs = self.runs.iloc[self._horse_index.get(horse_key(horse), NO_POSITIONS)]
+        if before is not None:
+            runs = runs[runs['race_date'] < pd.Timestamp(before)]
+        runs = runs.head(last_runs).reset_index(drop=True)
+        runs.insert(0, 'run', range(1, len(runs) + 1))
+        return runs
+
+    def horse_form(self, horse, last_runs=6, before=None):
+        """
+        A horse's latest runs.
+
+        Args:
+            horse (str): Brand number or name.
+            last_runs (int): Runs returned, latest first.
+            before (str): Only runs before this date 'YYYY-MM-DD'.
+
+        Returns:
+            pd.DataFrame: One row per run: 'run' (1 = latest), the results columns and the race details.
+        """
+        return self._lookup(('horse_form', horse_key(horse), last_runs, before),
+                            lambda: self._horse_runs(horse, last_runs, before))
+
+    def racecard(self, race_date, race_no=None, last_runs=6):
+        """
+        A stored racecard with each runner's last runs before the card's date.
+
+        Args:
+            race_date (str): Card date 'YYYY-MM-DD'.
+            race_no (int): One race, or None for the whole card.
+            last_runs (int): Past runs per runner.
+
+        Returns:
+            pd.DataFrame: One row per runner and past run (a single row with blank run columns
+                for a runner with no history), in card order, with the enriched racecard's headings.
+        """
+        def compute():
+            card = self.cards.iloc[self._card_index.get(race_date, NO_POSITIONS)]
+            if race_no is not None:
+                card = card[card['race_no'] == race_no]
+            card = card[[column for column in CARD_COLUMNS if column in card.columns]].reset_index(drop=True)
+
+            # Every runner's runs in one take from the horse index, then the latest before the card per runner
+            positions = [self._horse_index.get(horse_key(brand or name), NO_POSITIONS) for brand, name in
+                         zip(card['brand_no'], card['horse_name'])]
+            runs = self.runs.iloc[np.concatenate(positions) if positions else NO_POSITIONS]
+            runs = runs.assign(runner=np.repeat(card.index, [len(each) for each in positions]))
+            runs = runs[runs['race_date'] < pd.Timestamp(race_date)]
+            runs = runs.assign(run=runs.groupby('runner').cumcount() + 1)
+            runs = runs[runs['run'] <= last_runs][['runner'] + list(FORM_HEADINGS)].rename(columns=FORM_HEADINGS)
+            return card.merge(runs, left_index=True, right_on='runner', how='left') \
+                .drop(columns='runner').reset_index(drop=True)
+
+        return self._lookup(('racecard', race_date, race_no, last_runs), compute)
+
+    def results(self, race_date, race_no=None):
+        """
+        Every runner's result at a meeting.
+
+        Args:
+            race_date (str): Meeting date 'YYYY-MM-DD'.
+            race_no (int): One race, or None for the whole meeting.
+
+        Returns:
+            pd.DataFrame: One row per runner, by race and place, with the race details.
+        """
+        def compute():
+            runs = self.runs[self.runs['race_date'] == pd.Timestamp(race_date)]
+            if race_no is not None:
+                runs = runs[runs['race_no'] == race_no]
+            return runs.sort_values(['race_no', 'place_num'], na_position='last').reset_index(drop=True)
+
+        return self._lookup(('results', race_date, race_no), compute)
+
+    def trainer_jockey_stats(self, kind, days=30, end=None):
+        """
+        Rides (or runners) of every jockey (or trainer) over a number of days, from the results.
+
+        Args:
+            kind (str): 'trainer' or 'jockey'.
+            days (int): Length of the window, or None for all of the history.
+            end (str): Last date 'YYYY-MM-DD', or None for the latest meeting.
+
+        Returns:
+            pd.DataFrame: Indexed by name: runs, wins, places (top PLACES), win and place rates.
+        """
+        def compute():
+            runs = self.runs
+            last = pd.Timestamp(end) if end is not None else runs['race_date'].max()
+            runs = runs[runs['race_date'] <= last]
+            if days is not None:
+                runs = runs[runs['race_date'] > last - pd.Timedelta(days=days)]
+            stats = runs.assign(win=runs['place_num'] == 1, place=runs['place_num'] <= PLACES) \
+                .groupby(kind).agg(runs=('horse', 'size'), wins=('win', 'sum'), places=('place', 'sum'))
+            stats['win_rate'] = stats['wins'] / stats['runs']
+            stats['place_rate'] = stats['places'] / stats['runs']
+            return stats.sort_values(['wins', 'win_rate'], ascending=False)
+
+        return self._lookup(('trainer_jockey_stats', kind, days, end), compute)
+
+    def ranking(self, kind, ranking_date=None):
+        """
+        The trainer or jockey ranking table of a day (the latest stored day up to it), or the latest one.
+        """
+        return self._lookup(('ranking', kind, ranking_date), lambda: historyStore.load_ranking_table(
+            self._conn, kind, ranking_date or date.today().isoformat()))
+
+    def ranking_window(self, kind, days=30, end=None):
+        """
+        What each trainer or jockey did over a window of days, from the rankings. See historyStore.ranking_window.
+        """
+        return self._lookup(('ranking_window', kind, days, end),
+                            lambda: historyStore.ranking_window(self._conn, kind, days, end))
+
+
+def _as_json(df):
+    return df.reset_index().to_json(orient='records', date_format='iso') if df.index.name else \
+        df.to_json(orient='records', date_format='iso')
+
+
+def route(service, path):
+    """
+    Answers an HTTP path from the service.
+
+    Paths:
+        /horse/<brand number or name>?runs=6&before=YYYY-MM-DD
+        /racecard/<date>?race=N&runs=6
+        /results/<date>?race=N
+        /stats/<trainer|jockey>?days=30&end=YYYY-MM-DD
+        /ranking/<trainer|jockey>?date=YYYY-MM-DD
+        /ranking/<trainer|jockey>/window?days=30&end=YYYY-MM-DD
+
+    Args:
+        service (QueryService): Service answering the lookups.
+        path (str): Request path and query.
+
+    Returns:
+        pd.DataFrame: The answer, or None if the path is not a lookup.
+
+    Raises:
+        ValueError: If a parameter is not valid.
+    """
+    parts = urlsplit(path)
+    segments = [unquote(segment) for segment in parts.path.strip('/').split('/')]
+    query = dict(parse_qsl(parts.query))
+    race = int(query['race']) if 'race' in query else None
+    runs = int(query.get('runs', 6))
+
+    if len(segments) == 2 and segments[0] == 'horse':
+        return service.horse_form(segments[1], runs, query.get('before'))
+    if len(segments) == 2 and segments[0] == 'racecard':
+        return service.racecard(segments[1], race, runs)
+    if len(segments) == 2 and segments[0] == 'results':
+        return service.results(segments[1], race)
+    if segments[0] in ('stats', 'ranking') and len(segments) >= 2 and segments[1] not in ('trainer', 'jockey'):
+        raise ValueError(f"unknown kind {segments[1]!r}, expected trainer or jockey")
+    if len(segments) == 2 and segments[0] == 'stats':
+        return service.trainer_jockey_stats(segments[1], int(query.get('days', 30)), query.get('end'))
+    if len(segments) == 2 and segments[0] == 'ranking':
+        return service.ranking(segments[1], query.get('date'))
+    if segments[0] == 'ranking' and segments[2:] == ['window']:
+        return service.ranking_window(segments[1], int(query.get('days', 30)), query.get('end'))
+    return None
+
+
+def start_query_server(service, port=8765):
+    """
+    Serves the service's lookups as JSON on localhost in a background thread.
+
+    Args:
+        service (QueryService): Service answering the lookups.
+        port (int): Port to listen on, 0 for any free port.
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() to stop it.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                df = route(service, self.path)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            if df is None:
+                self.send_error(404, "Unknown lookup")
+                return
+            body = _as_json(df).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer race history lookups from memory over a local HTTP endpoint.")
+    parser.add_argument("--db", default=historyStore.HISTORY_DB, help="SQLite history store.")
+    parser.add_argument("--port", type=int, default=8765, help="Port on localhost to listen on.")
+    parser.add_argument("--cache-size", type=int, default=512, help="Most lookups kept in the cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    service = QueryService(args.db, args.cache_size)
+    print(f"Loaded {len(service.runs)} runs and {len(service.cards)} racecard entries "
+          f"in {time.perf_counter() - start:.2f}s")
+    server, base_url = start_query_server(service, args.port)
+    print(f"Serving lookups on {base_url} (e.g. {base_url}/stats/jockey?days=30)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("Stopped serving.")
+    finally:
+        server.shutdown()
+        print(json.dumps(service.cache_stats()))
+        service.close()
@@ -0,0 +1,408 @@
+import ast
+import re
+from datetime import datetime
+import pandas as pd
+
+# Results page column -> RunnerResult field
+RESULT_COLUMNS = {
+    'Pla.': 'place',
+    'Horse No.': 'horse_no',
+    'Jockey': 'jockey',
+    'Trainer': 'trainer',
+    'Act. Wt.': 'actual_weight',
+    'Declar. Horse Wt.': 'declared_weight',
+    'Dr.': 'draw',
+    'LBW': 'lbw',
+    'Running Position': 'running_position',
+    'Win Odds': 'win_odds',
+}
+
+# Racecard column -> RunnerEntry field. Anything else is kept in 'extra'.
+RACECARD_COLUMNS = {
+    'Horse No.': 'horse_no',
+    'Last 6 Runs': 'last_6_runs',
+    'Brand No.': 'brand_no',
+    'Wt.': 'weight',
+    'Jockey': 'jockey',
+    'Draw': 'draw',
+    'Trainer': 'trainer',
+    'Rtg.': 'rating',
+    'Rtg.+/-': 'rating_change',
+    'Horse Wt. (Declaration)': 'horse_weight',
+    'Age': 'age',
+    'Gear': 'gear',
+}
+
+# Official margins that are not written as lengths
+LBW_LENGTHS = {'-': 0.0, 'NOSE': 0.05, 'SH': 0.1, 'HD': 0.2, 'N': 0.3}
+
+
+def clean(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value).strip()
+
+
+def to_int(value):
+    match = re.search(r'-?\d[\d,]*', str(value)) if value is not None else None
+    return int(match.group(0).replace(',', '')) if match else None
+
+
+def to_float(value):
+    match = re.search(r'-?\d+(\.\d+)?', str(value)) if value is not None else None
+    return float(match.group(0)) if match else None
+
+
+def to_seconds(value):
+    """
+    Converts a race time such as '1:09.31' or '23.52' to seconds.
+
+    Returns:
+        float: Seconds, or None if the value is not a time.
+    """
+    text = str(value).strip() if value is not None else ''
+    match = re.fullmatch(r'(?:(\d+):)?(\d+(?:\.\d+)?)', text)
+    if not match:
+        return None
+    return int(match.group(1) or 0) * 60 + float(match.group(2))
+
+
+def to_lengths(value):
+    """
+    Converts an official margin ('1-1/4', '3/4', 'SH', '-') to lengths.
+
+    Returns:
+        float: Lengths behind the winner, or None if the margin is not recognised.
+    """
+    text = str(value).strip().upper() if value is not None else ''
+    if text in LBW_LENGTHS:
+        return LBW_LENGTHS[text]
+    if re.fullmatch(r'\d+\.\d+', text):
+        return float(text)
+    match = re.fullmatch(r'(?:(\d+)-?)?(?:(\d+)/(\d+))?', text)
+    if not text or not match:
+        return None
+    whole = int(match.group(1) or 0)
+    fraction = int(match.group(2)) / int(match.group(3)) if match.group(2) else 0.0
+    return whole + fraction
+
+
+def split_horse(text):
+    """
+    Splits a results horse cell like 'GOLDEN SPIRIT (H123)' into name and brand number.
+
+    Returns:
+        tuple: (name, brand number or None).
+    """
+    match = re.fullmatch(r'(.*?)\s*\(([A-Z]\d{3})\)', str(text).strip())
+    if match:
+        return match.group(1), match.group(2)
+    return str(text).strip(), None
+
+
+def parse_meeting(text):
+    """
+    Reads the date and venue from a results race info cell like '19/10/2025 Sha Tin'.
+
+    Returns:
+        tuple: (date 'YYYY-MM-DD', venue), or None if the cell is not a meeting.
+    """
+    match = re.match(r'(\d{2}/\d{2}/\d{4})\s+(.+)', str(text).strip())
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%d/%m/%Y').date().isoformat(), match.group(2).strip()
+
+
+class Record:
+    """
+    Base of the typed race records.
+
+    Each subclass lists its fields and their DataFrame dtypes in SCHEMA and
+    stores exactly those fields in __slots__, so a record is a handful of
+    pointers instead of a dict or a padded list of strings.
+    """
+
+    __slots__ = ()
+    SCHEMA = {}
+
+    def __init__(self, **values):
+        for name in self.SCHEMA:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"{type(self).__name__} has no fields {', '.join(values)}")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.SCHEMA}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.SCHEMA)
+        return f"{type(self).__name__}({values})"
+
+
+class RaceMeta(Record):
+    """One race: where and when it was run and its track details."""
+
+    SCHEMA = {
+        'race_date': 'datetime64[ns]',
+        'venue': 'category',
+        'race_no': 'Int8',
+        'race_class': 'category',
+        'distance': 'Int16',
+        'surface': 'category',
+        'course': 'category',
+        'going': 'category',
+        'total_seconds': 'float64',
+    }
+    __slots__ = tuple(SCHEMA)
+
+
+class RunnerEntry(Record):
+    """One runner on a racecard."""
+
+    SCHEMA = {
+        'race_date': 'datetime64[ns]',
+        'venue': 'category',
+        'race_no': 'Int8',
+        'horse_no': 'Int8',
+        'horse_name': 'object',
+        'brand_no': 'object',
+        'last_6_runs': 'object',
+        'weight': 'Int16',
+        'jockey': 'category',
+        'draw': 'Int8',
+        'trainer': 'category',
+        'rating': 'Int16',
+        'rating_change': 'object',
+        'horse_weight': 'Int16',
+        'age': 'Int8',
+        'gear': 'object',
+        'extra': 'object',
+    }
+    __slots__ = tuple(SCHEMA)
+
+    @property
+    def horse(self):
+        """History store key: the brand number, or the name if there is none."""
+        return self.brand_no or self.horse_name
+
+
+class RunnerResult(Record):
+    """One runner's result in a race."""
+
+    SCHEMA = {
+        'race_date': 'datetime64[ns]',
+        'venue': 'category',
+        'race_no': 'Int8',
+        'horse_name': 'object',
+        'brand_no': 'object',
+        'place': 'category',
+        'place_num': 'Int8',
+        'horse_no': 'Int8',
+        'jockey': 'category',
+        'trainer': 'category',
+        'actual_weight': 'Int16',
+        'declared_weight': 'Int16',
+        'draw': 'Int8',
+        'lbw': 'object',
+        'lbw_lengths': 'float32',
+        'running_position': 'object',
+        'finish_seconds': 'float64',
+        'win_odds': 'float32',
+    }
+    __slots__ = tuple(SCHEMA)
+
+    @property
+    def horse(self):
+        """History store key: the brand number, or the name if there is none."""
+        return self.brand_no or self.horse_name
+
+
+class SectionalSplit(Record):
+    """The leader's time for one section of a race."""
+
+    SCHEMA = {
+        'race_date': 'datetime64[ns]',
+        'venue': 'category',
+        'race_no': 'Int8',
+        'section': 'Int8',
+        'seconds': 'float64',
+    }
+    __slots__ = tuple(SCHEMA)
+
+
+def to_frame(records, record_type=None):
+    """
+    Builds a typed DataFrame from records, one column per schema field.
+
+    Integers use pandas' nullable types, repeated text (venues, jockeys, going)
+    is categorical and race dates are datetimes, so nothing downstream has to
+    re-parse strings.
+
+    Args:
+        records (iterable): Records of one type.
+        record_type (type): Record class, needed to get the columns right when records is empty.
+
+    Returns:
+        pd.DataFrame: One row per record.
+    """
+    records = list(records)
+    record_type = record_type or (type(records[0]) if records else None)
+    if record_type is None:
+        raise ValueError("record_type is needed to build a frame from no records")
+
+    columns = {}
+    for name, dtype in record_type.SCHEMA.items():
+        values = [getattr(record, name) for record in records]
+        if dtype.startswith('datetime'):
+            columns[name] = pd.to_datetime(pd.Series(values, dtype='object'))
+        elif dtype == 'object':
+            columns[name] = pd.Series(values, dtype='object')
+        else:
+            columns[name] = pd.Series(values, dtype='object').astype(dtype)
+    return pd.DataFrame(columns)
+
+
+def result_from_cells(race_date, venue, race_no, cells):
+    """
+    Builds a RunnerResult from one row of a results table.
+
+    Args:
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+        cells (dict): Results page column -> cell text.
+
+    Returns:
+        RunnerResult: The runner, or None if the row has no horse.
+    """
+    horse_name, brand_no = split_horse(clean(cells.get('Horse')))
+    if not horse_name:
+        return None
+    values = {field: clean(cells.get(column)) or None for column, field in RESULT_COLUMNS.items()}
+    place = values['place']
+    return RunnerResult(
+        race_date=race_date, venue=venue, race_no=race_no,
+        horse_name=horse_name, brand_no=brand_no,
+        place=place,
+        place_num=to_int(place) if place and place.isdigit() else None,
+        horse_no=to_int(values['horse_no']),
+        jockey=values['jockey'],
+        trainer=values['trainer'],
+        actual_weight=to_int(values['actual_weight']),
+        declared_weight=to_int(values['declared_weight']),
+        draw=to_int(values['draw']),
+        lbw=values['lbw'],
+        lbw_lengths=to_lengths(values['lbw']),
+        running_position=values['running_position'],
+        finish_seconds=to_seconds(clean(cells.get('Finish Time'))),
+        win_odds=to_float(values['win_odds']),
+    )
+
+
+def race_from_details(race_date, venue, race_no, class_distance, going, course, total_seconds, sectional_times):
+    """
+    Builds a race's RaceMeta and SectionalSplits from its race_tab details.
+
+    Args:
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+        class_distance (str): e.g. 'Class 4 - 1200M - (60-40)'.
+        going (str): Going.
+        course (str): Course, e.g. 'TURF - "A" COURSE'.
+        total_seconds: Final time in seconds (number or text).
+        sectional_times (list): Sectional times as text, or their list's string form from a workbook.
+
+    Returns:
+        tuple: (RaceMeta, list of SectionalSplit).
+    """
+    class_distance = clean(class_distance)
+    if isinstance(sectional_times, str):
+        # Sectionals read back from a workbook are the list's string form
+        try:
+            sectional_times = ast.literal_eval(sectional_times) if sectional_times else []
+        except (ValueError, SyntaxError):
+            sectional_times = []
+
+    distance = re.search(r'(\d+)M', class_distance)
+    race = RaceMeta(
+        race_date=race_date, venue=venue, race_no=race_no,
+        race_class=class_distance.split(' - ')[0] if class_distance else None,
+        distance=to_int(distance.group(1)) if distance else None,
+        course=clean(course) or None,
+        going=clean(going) or None,
+        total_seconds=to_float(total_seconds),
+    )
+    splits = [SectionalSplit(race_date=race_date, venue=venue, race_no=race_no, section=i + 1,
+                             seconds=to_seconds(split))
+              for i, split in enumerate(sectional_times or [])]
+    return race, splits
+
+
+def results_from_frame(df, race_date, venue, race_no):
+    """
+    Reads one race of results (a DataFrame from pastRaces) into records.
+
+    Args:
+        df (pd.DataFrame): Race DataFrame whose first row holds the race details.
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+
+    Returns:
+        tuple: (RaceMeta, list of RunnerResult, list of SectionalSplit), or None if df is empty.
+    """
+    records = df.to_dict('records')
+    if not records:
+        return None
+
+    info = records[0]
+    race, splits = race_from_details(race_date, venue, race_no, info.get('Class/Distance'), info.get('Going'),
+                                     info.get('Course'), info.get('Total Time (sec)'), info.get('Sectional Times'))
+    runners = [result_from_cells(race_date, venue, race_no, cells) for cells in records[1:]]
+    return race, [runner for runner in runners if runner is not None], splits
+
+
+def racecard_from_frame(df, race_date, venue, race_no):
+    """
+    Reads one racecard race (a DataFrame from scrapeRacePage) into records.
+
+    Args:
+        df (pd.DataFrame): Racecard DataFrame whose first row holds the track details.
+        race_date (str): 'YYYY-MM-DD'.
+        venue (str): Racecourse.
+        race_no (int): Race number.
+
+    Returns:
+        tuple: (RaceMeta, list of RunnerEntry), or None if df is empty.
+    """
+    records = df.to_dict('records')
+    if not records:
+        return None
+
+    # The track details row is 'Race Details', surface, course, distance, going
+    track = [clean(value) for value in records[0].values()]
+    surface, course, distance, going = (track[1:5] + [''] * 4)[:4]
+    race = RaceMeta(race_date=race_date, venue=venue, race_no=race_no, distance=to_int(distance),
+                    surface=surface or None, course=course or None, going=going or None)
+
+    runners = []
+    for cells in records[1:]:
+        horse_name = clean(cells.get('Horse'))
+        if not horse_name:
+            continue
+        values = {field: None for field in RACECARD_COLUMNS.values()}
+        extra = {}
+        for column, value in cells.items():
+            if column in RACECARD_COLUMNS:
+                values[RACECARD_COLUMNS[column]] = clean(value) or None
+            elif column != 'Horse':
+                extra[column] = clean(value)
+        for field in ('horse_no', 'weight', 'draw', 'rating', 'horse_weight', 'age'):
+            values[field] = to_int(values[field])
+        runners.append(RunnerEntry(race_date=race_date, venue=venue, race_no=race_no,
+                                   horse_name=horse_name, extra=extra, **values))
+    return race, runners
@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pandas as pd
+from fetchBackend import HttpFetcher
+from fetchPolicy import FetchPolicy
+from pageSnapshot import parse_html
+from scrapeRacePage import parse_racingNum_urls, parse_racecard_records
+import historyStore
+
+RACECARD_URL = 'https://racing.hkjc.com/racing/information/English/racing/RaceCard.aspx'
+
+# Track details whose change is reported as a 'race' delta (e.g. the going being updated)
+RACE_FIELDS = ('surface', 'course', 'distance', 'going')
+
+
+def card_state(race, runners):
+    """
+    Turns a parsed race into plain values that can be hashed and compared between polls.
+
+    Args:
+        race (RaceMeta): Track details.
+        runners (list): RunnerEntry records.
+
+    Returns:
+        tuple: (track details dict, {horse number: runner dict}). Columns without
+            a record field (see RunnerEntry.extra) are compared too.
+    """
+    track = {field: getattr(race, field) for field in RACE_FIELDS}
+    entries = {}
+    for runner in runners:
+        values = runner.as_dict()
+        values.update(values.pop('extra') or {})
+        for field in ('race_date', 'venue', 'race_no'):
+            values.pop(field)
+        entries[str(runner.horse_no if runner.horse_no is not None else runner.horse)] = values
+    return track, entries
+
+
+def card_hash(state):
+    """SHA-256 of a card_state, independent of the page markup around it."""
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def diff_cards(old, new):
+    """
+    Compares two states of the same race.
+
+    Args:
+        old (tuple): Previous card_state.
+        new (tuple): Current card_state.
+
+    Returns:
+        list: Deltas as dicts with 'change' ('race', 'added', 'removed' or 'modified'), the
+            horse number for runner changes, and 'fields' ({field: [old, new]}) or 'runner'.
+    """
+    (old_track, old_runners), (new_track, new_runners) = old, new
+    deltas = []
+
+    fields = {field: [old_track[field], new_track[field]] for field in RACE_FIELDS
+              if old_track[field] != new_track[field]}
+    if fields:
+        deltas.append({'change': 'race', 'fields': fields})
+
+    for key in new_runners.keys() - old_runners.keys():
+        runner = new_runners[key]
+        deltas.append({'change': 'added', 'horse_no': runner['horse_no'], 'runner': runner})
+    for key in old_runners.keys() - new_runners.keys():
+        runner = old_runners[key]
+        deltas.append({'change': 'removed', 'horse_no': runner['horse_no'], 'runner': runner})
+    for key in old_runners.keys() & new_runners.keys():
+        old_runner, new_runner = old_runners[key], new_runners[key]
+        fields = {field: [old_runner.get(field), new_runner.get(field)]
+                  for field in sorted(old_runner.keys() | new_runner.keys())
+                  if old_runner.get(field) != new_runner.get(field)}
+        if fields:
+            deltas.append({'change': 'modified', 'horse_no': new_runner['horse_no'],
+                           'horse': new_runner.get('horse_name'), 'fields': fields})
+    return sorted(deltas, key=lambda delta: (delta['change'] != 'race', _number(delta.get('horse_no'))))
+
+
+def _number(horse_no):
+    try:
+        return int(horse_no)
+    except (TypeError, ValueError):
+        return 0
+
+
+class WatchedRace:
+    """
+    What the watcher last saw of one racecard page.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.body_hash = None
+        self.card_hash = None
+        self.state = None
+        self.key = None
+
+
+class RacecardWatcher:
+    """
+    Polls the racecard pages and reports the runners that changed since the previous poll.
+
+    A poll costs one conditional request per race. A race is only parsed when
+    the server sends a new body, and only diffed when its parsed card (not the
+    page markup, which changes on every request) hashes differently. Every
+    change is appended to a JSON Lines log as one delta per runner, after a
+    'snapshot' line with the whole card the first time a race is seen, so the
+    log alone is enough to rebuild the card at any point of the day.
+    """
+
+    def __init__(self, fetcher, url=RACECARD_URL, log_file=None, conn=None, rediscover_every=20, max_workers=4):
+        """
+        Args:
+            fetcher (fetchBackend.HttpFetcher): Fetch backend supporting get_conditional.
+            url (str): Racecard page linking to every race of the meeting.
+            log_file (str): Append-only JSON Lines file the deltas are written to, or None.
+            conn: History store connection the changed races are stored in, or None.
+            rediscover_every (int): Polls between re-reading the list of races.
+            max_workers (int): Races checked at once.
+        """
+        self.fetcher = fetcher
+        self.url = url
+        self.log_file = log_file
+        self.conn = conn
+        self.rediscover_every = rediscover_every
+        self.max_workers = max_workers
+        self.races = {}
+        self.polls = 0
+        self._index = WatchedRace(url)
+
+    def discover(self):
+        """
+        Reads the list of races from the racecard page, keeping what was already seen of each.
+
+        If the page cannot be loaded the races found before are kept.
+        """
+        try:
+            html, self._index.etag, self._index.last_modified = self.fetcher.get_conditional(
+                self.url, self._index.etag, self._index.last_modified)
+        except Exception as e:
+            print(f"Error reading the race list from {self.url}: {e}")
+            return
+        if html is None and self.races:
+            return
+
+        urls = [page_url for page_url in parse_racingNum_urls(html, self.url) if 'Racecourse=S1' not in page_url]
+        self.races = {page_url: self.races.get(page_url) or WatchedRace(page_url) for page_url in urls or [self.url]}
+
+    def poll(self):
+        """
+        Checks every race once and logs what changed.
+
+        Returns:
+            list: The deltas found, each with the race's date, venue and number.
+        """
+        if not self.races or self.polls % self.rediscover_every == 0:
+            self.discover()
+        self.polls += 1
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            checked = list(executor.map(self._check, self.races.values()))
+
+        deltas = []
+        for race_deltas, parsed in checked:
+            deltas.extend(race_deltas)
+            if parsed is not None and self.conn is not None:
+                race = parsed[0]
+                historyStore.upsert_racecard_records(self.conn, *parsed)
+                removed = [delta['runner'] for delta in race_deltas if delta['change'] == 'removed']
+                historyStore.delete_racecard_runners(self.conn, race.race_date, race.venue, race.race_no,
+                                                     [runner['brand_no'] or runner['horse_name'] for runner in removed])
+        if deltas and self.log_file:
+            self._append(deltas)
+        return deltas
+
+    def _check(self, watched):
+        try:
+            html, watched.etag, watched.last_modified = self.fetcher.get_conditional(
+                watched.url, watched.etag, watched.last_modified)
+        except Exception as e:
+            print(f"Error polling {watched.url}: {e}")
+            return [], None
+        if html is None:
+            return [], None
+
+        body_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        if body_hash == watched.body_hash:
+            return [], None
+        watched.body_hash = body_hash
+
+        parsed = parse_racecard_records(parse_html(html), pd)
+        if parsed is None:
+            return [], None
+        race, runners = parsed
+        state = card_state(race, runners)
+        new_hash = card_hash(state)
+        if new_hash == watched.card_hash:
+            return [], None
+
+        key = {'race_date': race.race_date, 'venue': race.venue, 'race_no': race.race_no}
+        if watched.state is None or watched.key != key:
+            deltas = [{'change': 'snapshot', 'race': state[0], 'runners': state[1]}]
+        else:
+            deltas = diff_cards(watched.state, state)
+        watched.state, watched.card_hash, watched.key = state, new_hash, key
+        return [dict(key, **delta) for delta in deltas], parsed
+
+    def _append(self, deltas):
+        folder = os.path.dirname(self.log_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        at = datetime.now().isoformat(timespec='seconds')
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            for delta in deltas:
+                f.write(json.dumps(dict(at=at, **delta), ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, interval=15.0, until=None, max_polls=None):
+        """
+        Polls until a given time or number of polls, reporting every change.
+
+        Args:
+            interval (float): Seconds from the start of one poll to the start of the next.
+            until (datetime): Stop after this time, or None to run until interrupted.
+            max_polls (int): Stop after this many polls, or None.
+        """
+        while (until is None or datetime.now() < until) and (max_polls is None or self.polls < max_polls):
+            start = time.monotonic()
+            deltas = self.poll()
+            for delta in deltas:
+                print(describe(delta))
+            print(f"Poll {self.polls}: {len(self.races)} races checked, {len(deltas)} changes "
+                  f"in {time.monotonic() - start:.2f}s")
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+
+def describe(delta):
+    """One line summary of a delta, for the console."""
+    race = f"{delta['race_date']} {delta['venue']} race {delta['race_no']}"
+    if delta['change'] == 'snapshot':
+        return f"{race}: watching {len(delta['runners'])} runners"
+    if delta['change'] == 'race':
+        return f"{race}: " + ', '.join(f"{field} {old} -> {new}" for field, (old, new) in delta['fields'].items())
+    if delta['change'] == 'modified':
+        changes = ', '.join(f"{field} {old} -> {new}" for field, (old, new) in delta['fields'].items())
+        return f"{race}: #{delta['horse_no']} {delta['horse']} {changes}"
+    return f"{race}: #{delta['horse_no']} {delta['runner'].get('horse_name')} {delta['change']}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the racecard on race day and log every runner change.")
+    parser.add_argument("--url", default=RACECARD_URL, help="Racecard page linking to every race of the meeting.")
+    parser.add_argument("--interval", type=float, default=15.0, help="Seconds between polls.")
+    parser.add_argument("--until", help="Stop at this time of day (HH:MM).")
+    parser.add_argument("--polls", type=int, default=None, help="Stop after this many polls.")
+    parser.add_argument("--log", default=None,
+                        help="Append-only JSON Lines change log (default: Data/<date>/racecard_changes_<date>.jsonl).")
+    parser.add_argument("--db", default=None, help="Also keep this history store's racecards up to date.")
+    parser.add_argument("--max-connections", type=int, default=4, help="Races checked at once.")
+    args = parser.parse_args()
+
+    today_date = datetime.now().strftime('%Y-%m-%d')
+    log_file = args.log or os.path.join('Data', today_date, f'racecard_changes_{today_date}.jsonl')
+    until = None
+    if args.until:
+        until = datetime.combine(datetime.now().date(), datetime.strptime(args.until, '%H:%M').time())
+
+    # Polls must not be slowed down by retries of a page that will be polled again shortly anyway
+    policy = FetchPolicy(rate=args.max_connections, burst=args.max_connections, attempts=2)
+    conn = historyStore.connect(args.db) if args.db else None
+    with HttpFetcher(max_connections=args.max_connections, policy=policy) as fetcher:
+        watcher = RacecardWatcher(fetcher, args.url, log_file, conn, max_workers=args.max_connections)
+        print(f"Watching {args.url} every {args.interval:g}s, changes logged to {log_file}")
+        try:
+            watcher.run(args.interval, until, args.polls)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        finally:
+            if conn is not None:
+                conn.close()
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket that paces requests and adapts its rate to how the server is coping.
+
+    Tokens refill at `rate` per second up to `burst`, and each request takes one.
+    Every fast, successful response raises the rate a little (additive increase);
+    an error or a response slower than target_latency halves it (multiplicative
+    decrease), at most once per target_latency seconds so that a burst of
+    failures from requests already in flight counts as one. Safe to share between threads.
+    """
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, target_latency=2.0, increase=0.25, burst=1):
+        """
+        Args:
+            rate (float): Starting rate in requests per second.
+            min_rate (float): The rate never drops below this.
+            max_rate (float): The rate never rises above this.
+            target_latency (float): Responses slower than this many seconds count as a sign of overload.
+            increase (float): Requests per second added after each fast success.
+            burst (float): Requests that may go out back to back after a quiet spell.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.increase = increase
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._last_decrease = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the caller may send its next request."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def record(self, latency, ok):
+        """
+        Feeds back the outcome of a request.
+
+        Args:
+            latency (float): Seconds the request took.
+            ok (bool): Whether the request succeeded.
+        """
+        with self._lock:
+            if ok and latency <= self.target_latency:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            else:
+                now = time.monotonic()
+                if self._last_decrease is None or now - self._last_decrease >= self.target_latency:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self._last_decrease = now
@@ -0,0 +1,127 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from urllib.parse import urlsplit, parse_qsl
+import pandas as pd
+from pageArchive import ARCHIVE_FOLDER, PageArchive, read_blob
+from historyStore import HISTORY_DB, connect, upsert_race_records, upsert_racecard_records, upsert_rankings
+
+# Page class (see pageCache.classify) -> what its pages are parsed into
+PAGE_KINDS = {
+    'results': 'results',
+    'latest-results': 'results',
+    'racecard': 'racecard',
+    'ranking': 'ranking',
+}
+
+
+def parse_archived(folder, url, page_class, content_hash):
+    """
+    Parses one archived page in a worker process.
+
+    Args:
+        folder (str): Archive folder.
+        url (str): Normalised URL the page was fetched from.
+        page_class (str): Its page class.
+        content_hash (str): Hash of the archived body.
+
+    Returns:
+        tuple: (kind, parsed), where parsed is None if the page could not be parsed:
+            'results' -> (RaceMeta, RunnerResults, SectionalSplits),
+            'racecard' -> (RaceMeta, RunnerEntries),
+            'trainer' / 'jockey' -> ranking DataFrame.
+    """
+    kind = PAGE_KINDS.get(page_class)
+    try:
+        html = read_blob(folder, content_hash)
+        if kind == 'results':
+            from pastRaces import parse_results_records
+            params = {key.lower(): value for key, value in parse_qsl(urlsplit(url).query)}
+            return kind, parse_results_records(html, int(params.get('raceno', 1)))
+        if kind == 'racecard':
+            from scrapeRacePage import parse_racecard_records
+            return kind, parse_racecard_records(html, pd)
+        if kind == 'ranking':
+            from trainerJockey import parse_ranking_page
+            kind = 'trainer' if 'trainer' in urlsplit(url).path.lower() else 'jockey'
+            return kind, parse_ranking_page(html, pd)
+    except Exception as e:
+        print(f"Error parsing archived {url}: {e}")
+    return kind, None
+
+
+def reparse_archive(archive_folder=ARCHIVE_FOLDER, history_db=HISTORY_DB, kinds=('results', 'racecard', 'ranking'),
+                    start=None, end=None, workers=None, chunksize=8):
+    """
+    Rebuilds the history store from the page archive, without touching the network.
+
+    Every archived version is parsed in a process pool, oldest fetch first, and
+    stored in the same order, so the newest version of a race wins. The
+    undated results and racecard URLs show a different meeting every week,
+    which is why every version is parsed and not just each URL's latest.
+
+    Args:
+        archive_folder (str): Page archive folder.
+        history_db (str): History store to write (e.g. a fresh file to compare against the current one).
+        kinds (tuple): 'results', 'racecard' and/or 'ranking'.
+        start (str): First race date 'YYYY-MM-DD' to store, or None.
+        end (str): Last race date 'YYYY-MM-DD' to store, or None.
+        workers (int): Parser processes (default: CPU count).
+        chunksize (int): Pages handed to a worker at a time.
+
+    Returns:
+        dict: Pages parsed and failed, and rows stored per kind.
+    """
+    archive = PageArchive(archive_folder)
+    pages = archive.pages([page_class for page_class, kind in PAGE_KINDS.items() if kind in kinds], latest_only=False)
+    archive.close()
+    print(f"Re-parsing {len(pages)} archived pages...")
+
+    summary = {'pages': len(pages), 'failed': 0, 'results': 0, 'racecard': 0, 'ranking': 0}
+    conn = connect(history_db)
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            urls, classes, fetch_times, hashes = zip(*pages) if pages else ([], [], [], [])
+            parsed_pages = executor.map(parse_archived, repeat(archive_folder), urls, classes, hashes,
+                                        chunksize=chunksize)
+            for fetched_at, (kind, parsed) in zip(fetch_times, parsed_pages):
+                if parsed is None:
+                    summary['failed'] += 1
+                    continue
+                if kind in ('trainer', 'jockey'):
+                    ranking_date = datetime.fromtimestamp(fetched_at).date().isoformat()
+                    if (start is None or ranking_date >= start) and (end is None or ranking_date <= end):
+                        summary['ranking'] += upsert_rankings(conn, ranking_date, kind, parsed)
+                    continue
+                race = parsed[0]
+                if (start is not None and race.race_date < start) or (end is not None and race.race_date > end):
+                    continue
+                if kind == 'results':
+                    summary['results'] += upsert_race_records(conn, *parsed)
+                else:
+                    summary['racecard'] += upsert_racecard_records(conn, *parsed)
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start_time
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the history store by re-parsing the archived pages offline.")
+    parser.add_argument("--archive", default=ARCHIVE_FOLDER, help="Page archive folder.")
+    parser.add_argument("--db", default=HISTORY_DB, help="History store to write.")
+    parser.add_argument("--kinds", nargs="+", choices=["results", "racecard", "ranking"],
+                        default=["results", "racecard", "ranking"], help="Pages to re-parse.")
+    parser.add_argument("--start", help="First race date to store (YYYY-MM-DD).")
+    parser.add_argument("--end", help="Last race date to store (YYYY-MM-DD).")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+    args = parser.parse_args()
+
+    summary = reparse_archive(args.archive, args.db, tuple(args.kinds), args.start, args.end, args.workers)
+    print(f"Re-parsed {summary['pages']} pages in {summary['seconds']:.1f}s ({summary['failed']} failed): "
+          f"{summary['results']} result rows, {summary['racecard']} racecard rows, "
+          f"{summary['ranking']} ranking rows stored in {args.db}")
@@ -0,0 +1,213 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from pageCache import normalize_url
+from pageSnapshot import take_snapshot, HIDDEN_ATTRIBUTE
+
+SITE_FIXTURES = 'fixtures/site'
+HKJC_BASE_URL = 'https://racing.hkjc.com'
+
+# Entry page of each scraper, relative to the site root (the same paths crawler.py uses)
+PAGE_PATHS = {
+    'racecard': '/racing/information/English/racing/RaceCard.aspx',
+    'trainer': '/racing/information/English/Trainers/TrainerRanking.aspx',
+    'jockey': '/racing/information/English/Jockey/JockeyRanking.aspx',
+    'speedpro': '/racing/speedpro/english/formguide/formguide.html',
+    'results': '/racing/information/English/racing/LocalResults.aspx',
+}
+
+# Recorded pages are already rendered, so their scripts are dropped and hidden cells stay hidden in a browser
+SCRIPT_TAG = re.compile(r'<script\b.*?</script>', re.IGNORECASE | re.DOTALL)
+HIDDEN_STYLE = f'<style>[{HIDDEN_ATTRIBUTE}] {{ display: none !important; }}</style>'
+
+
+def page_key(target):
+    """
+    Turns a request path and query into the key fixtures are indexed by.
+
+    The path is lower-cased (the site's paths are case-insensitive) and the
+    query is sorted, so equivalent links find the same fixture.
+
+    Args:
+        target (str): Path and query, e.g. '/racing/.../RaceCard.aspx?RaceNo=2', or a full URL.
+
+    Returns:
+        str: The fixture key.
+    """
+    parts = urlsplit(normalize_url('http://replay' + target if target.startswith('/') else target))
+    return parts.path.lower() + ('?' + parts.query if parts.query else '')
+
+
+class ReplaySite:
+    """
+    A folder of recorded pages and the index.json mapping each page's URL to its file.
+    """
+
+    def __init__(self, folder=SITE_FIXTURES):
+        """
+        Args:
+            folder (str): Fixture folder.
+        """
+        self.folder = folder
+        self.pages = {}
+        index_path = os.path.join(folder, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                for target, file_name in json.load(f)['pages'].items():
+                    self.pages[target] = file_name
+        self._keys = {page_key(target): file_name for target, file_name in self.pages.items()}
+        self._bodies = {}
+
+    def page(self, target):
+        """
+        Returns the recorded HTML for a request, or None if it was not recorded.
+        """
+        file_name = self._keys.get(page_key(target))
+        if file_name is None:
+            return None
+        if file_name not in self._bodies:
+            with open(os.path.join(self.folder, file_name), encoding='utf-8') as f:
+                self._bodies[file_name] = f.read()
+        return self._bodies[file_name]
+
+    def add(self, url, file_name, html):
+        """
+        Saves a recorded page and indexes it under its URL.
+
+        Args:
+            url (str): URL the page was loaded from.
+            file_name (str): File name inside the fixture folder.
+            html (str): Page HTML.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, file_name), 'w', encoding='utf-8') as f:
+            f.write(html)
+        parts = urlsplit(url)
+        target = parts.path + ('?' + parts.query if parts.query else '')
+        self.pages[target] = file_name
+        self._keys[page_key(target)] = file_name
+        self._bodies.pop(file_name, None)
+
+    def save_index(self):
+        with open(os.path.join(self.folder, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump({'pages': dict(sorted(self.pages.items()))}, f, indent=2)
+
+
+def start_replay_server(folder=SITE_FIXTURES, port=0, latency=0.0):
+    """
+    Serves recorded pages on localhost in a background thread.
+
+    Absolute links to racing.hkjc.com inside the pages are rewritten to the
+    local server, so the scrapers never leave the machine.
+
+    Args:
+        folder (str): Fixture folder with an index.json.
+        port (int): Port to listen on, 0 for any free port.
+        latency (float): Seconds added to every response, to imitate the real site.
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() to stop it.
+    """
+    site = ReplaySite(folder)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            html = site.page(self.path)
+            if latency:
+                time.sleep(latency)
+            if html is None:
+                self.send_error(404, "Page not recorded")
+                return
+            body = html.replace(HKJC_BASE_URL, base_url).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def record_site(driver, By, folder=SITE_FIXTURES, base_url=HKJC_BASE_URL):
+    """
+    Records the racecard, ranking, Speed Pro and results pages of the live site as replay fixtures.
+
+    Each page is saved as rendered in the browser (see pageSnapshot), so the
+    Speed Pro form guide replays without its data feed.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        By: Selenium By module.
+        folder (str): Fixture folder to write.
+        base_url (str): Site to record.
+
+    Returns:
+        ReplaySite: The recorded site.
+    """
+    from scrapeRacePage import extract_urls_from_racingNum
+    from speedPro import extract_urls_from_race_nav, wait_for_element
+    from pastRaces import extract_urls
+
+    site = ReplaySite(folder)
+    discover = {
+        'racecard': lambda: extract_urls_from_racingNum(driver, By),
+        'speedpro': lambda: extract_urls_from_race_nav(driver, By),
+        'results': lambda: extract_urls(driver, By),
+    }
+
+    def record(url, file_name):
+        driver.get(url)
+        if 'speedpro' in url:
+            wait_for_element(driver, By.CLASS_NAME, "datatable", timeout=15)
+        html = SCRIPT_TAG.sub('', take_snapshot(driver)).replace('</head>', HIDDEN_STYLE + '</head>', 1)
+        site.add(url, file_name, html)
+        print(f"Recorded {url} -> {file_name}")
+
+    for kind, path in PAGE_PATHS.items():
+        url = base_url + path
+        record(url, f'{kind}.html')
+        if kind in discover:
+            urls = [page_url for page_url in discover[kind]() if 'Racecourse=S1' not in page_url]
+            for i, page_url in enumerate(urls):
+                record(page_url, f'{kind}_race{i + 1}.html')
+
+    site.save_index()
+    return site
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded HKJC pages locally, or record them from the live site.")
+    parser.add_argument("--fixtures", default=SITE_FIXTURES, help="Folder of recorded pages.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to serve on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to every response.")
+    parser.add_argument("--record", action="store_true", help="Record the live site into the fixtures folder first.")
+    args = parser.parse_args()
+
+    if args.record:
+        from selenium.webdriver.common.by import By
+        from browser import create_driver
+        driver = create_driver()
+        try:
+            record_site(driver, By, args.fixtures)
+        finally:
+            driver.quit()
+
+    server, url = start_replay_server(args.fixtures, args.port, args.latency)
+    print(f"Replaying {args.fixtures} on {url} (e.g. python crawler.py --base-url {url}), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
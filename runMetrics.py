@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pageCache import classify
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = None
+_local = threading.local()
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident memory of this process so far, in MB (None where the OS does not report it).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of a list of numbers, interpolating between the nearest ranks.
+
+    Args:
+        values (list): Numbers, in any order.
+        fraction (float): Percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile, or None for an empty list.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def count_rows(result):
+    """
+    Counts the data rows in whatever a stage returned: a DataFrame, a list of them, or (key, DataFrame) pairs.
+    """
+    if result is None:
+        return 0
+    if hasattr(result, 'shape'):
+        return len(result)
+    if isinstance(result, (list, tuple)):
+        rows = 0
+        for item in result:
+            if isinstance(item, tuple) and len(item) == 2 and hasattr(item[1], 'shape'):
+                item = item[1]
+            rows += count_rows(item) if hasattr(item, 'shape') else 0
+        return rows
+    return 0
+
+
+class RunMetrics:
+    """
+    Collects timings and counters for one crawler run.
+
+    Records wall time, rows and peak memory per stage, the latency of every page
+    load (driver.get or HTTP request), WebDriver commands by name, and how long
+    each export took. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.stages = {}
+        self.pages = []
+        self.commands = Counter()
+        self.exports = []
+        self.extra = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage. Pages loaded and files exported on the same thread are attributed to it.
+
+        Args:
+            name (str): Stage name.
+
+        Yields:
+            dict: The stage's entry, set entry['rows'] to the number of rows it parsed.
+        """
+        previous = getattr(_local, 'stage', None)
+        _local.stage = name
+        start = time.perf_counter()
+        entry = {'seconds': None, 'rows': 0, 'ok': False}
+        with self._lock:
+            self.stages[name] = entry
+        try:
+            yield entry
+            entry['ok'] = True
+        finally:
+            entry['seconds'] = round(time.perf_counter() - start, 3)
+            entry['peak_memory_mb'] = peak_memory_mb()
+            _local.stage = previous
+
+    def record_page(self, url, seconds, source, ok=True):
+        """
+        Records one page load.
+
+        Args:
+            url (str): Page URL.
+            seconds (float): Time the load took.
+            source (str): 'webdriver' or 'http'.
+            ok (bool): False if the load failed.
+        """
+        with self._lock:
+            self.pages.append({
+                'url': url,
+                'class': classify(url),
+                'stage': getattr(_local, 'stage', None),
+                'source': source,
+                'seconds': round(seconds, 4),
+                'ok': ok,
+            })
+
+    def record_command(self, command):
+        with self._lock:
+            self.commands[command] += 1
+
+    def record_export(self, path, seconds, sheets, rows):
+        with self._lock:
+            self.exports.append({'file': path, 'stage': getattr(_local, 'stage', None), 'seconds': round(seconds, 3),
+                                 'sheets': sheets, 'rows': rows})
+
+    def summary(self):
+        """
+        Returns every metric as a JSON-serialisable dict.
+        """
+        with self._lock:
+            pages = list(self.pages)
+            commands = dict(self.commands)
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+            exports = list(self.exports)
+
+        by_class = {}
+        for page in pages:
+            by_class.setdefault(page['class'], []).append(page['seconds'])
+        latency = {
+            page_class: {
+                'pages': len(seconds),
+                'mean': round(sum(seconds) / len(seconds), 4),
+                'p50': round(percentile(seconds, 0.5), 4),
+                'p95': round(percentile(seconds, 0.95), 4),
+                'max': round(max(seconds), 4),
+            }
+            for page_class, seconds in sorted(by_class.items())
+        }
+
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._start, 3),
+            'peak_memory_mb': peak_memory_mb(),
+            'stages': stages,
+            'page_latency': latency,
+            'slowest_pages': sorted(pages, key=lambda page: page['seconds'], reverse=True)[:10],
+            'pages': pages,
+            'webdriver_commands': commands,
+            'webdriver_element_calls': sum(count for command, count in commands.items() if 'Element' in command),
+            'exports': exports,
+            **self.extra,
+        }
+
+    def write(self, path):
+        """
+        Writes the metrics to a JSON file.
+
+        Args:
+            path (str): Output file, e.g. Data/<date>/run_metrics_<date>.json.
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"Run metrics saved to {path}")
+
+    def print_summary(self):
+        """Prints a short table of stage times, page latencies and exports."""
+        summary = self.summary()
+        print(f"Run took {summary['wall_seconds']:.1f}s, peak memory {summary['peak_memory_mb']} MB")
+        for name, stage in summary['stages'].items():
+            seconds = f"{stage['seconds']:.1f}s" if stage['seconds'] is not None else '-'
+            status = '' if stage['ok'] else ' (failed)'
+            print(f"  {name:<16} {seconds:>8} {stage['rows']:>7} rows{status}")
+        for page_class, latency in summary['page_latency'].items():
+            print(f"  {page_class:<16} {latency['pages']:>4} pages  p50 {latency['p50']:.2f}s  "
+                  f"p95 {latency['p95']:.2f}s  max {latency['max']:.2f}s")
+        if summary['webdriver_commands']:
+            print(f"  WebDriver calls: {sum(summary['webdriver_commands'].values())} "
+                  f"({summary['webdriver_element_calls']} element calls)")
+        for export in summary['exports']:
+            print(f"  exported {export['file']} ({export['sheets']} sheets, {export['rows']} rows) "
+                  f"in {export['seconds']:.2f}s")
+
+
+def activate(metrics):
+    """
+    Makes a RunMetrics the one the module-level helpers report to (None switches them off).
+    """
+    global _active
+    _active = metrics
+
+
+def active():
+    return _active
+
+
+@contextmanager
+def stage(name):
+    """Times a stage on the active RunMetrics, if there is one."""
+    if _active is None:
+        yield None
+    else:
+        with _active.stage(name) as entry:
+            yield entry
+
+
+def record_page(url, seconds, source, ok=True):
+    if _active is not None:
+        _active.record_page(url, seconds, source, ok)
+
+
+def record_export(path, seconds, sheets, rows):
+    if _active is not None:
+        _active.record_export(path, seconds, sheets, rows)
+
+
+def instrument_driver(driver, metrics=None):
+    """
+    Counts every WebDriver command a driver sends and times its page loads.
+
+    All WebDriver calls, including those made through elements, go through
+    driver.execute, so wrapping it on the instance catches them all.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        metrics (RunMetrics): Where to record, defaults to the active RunMetrics at call time.
+
+    Returns:
+        WebDriver: The same driver.
+    """
+    execute = driver.execute
+
+    def instrumented_execute(command, params=None):
+        recorder = metrics or _active
+        if recorder is None:
+            return execute(command, params)
+        recorder.record_command(command)
+        if command != 'get':
+            return execute(command, params)
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = execute(command, params)
+            ok = True
+            return result
+        finally:
+            recorder.record_page((params or {}).get('url', ''), time.perf_counter() - start, 'webdriver', ok)
+
+    driver.execute = instrumented_execute
+    return driver
@@ -1,5 +1,12 @@
+import re
+from datetime import datetime
+from urllib.parse import urljoin
 from utils import save_to_csv_with_sheets
-def scrape_all_pages(driver, url, By, pd, fileName):
+from pageSnapshot import take_snapshot, parse_html, element_text, has_display_none, find_by_class
+from browser import wait_for_element
+from fetchPolicy import load_page
+from raceRecords import racecard_from_frame
+def scrape_all_pages(driver, url, By, pd, fileName, snapshot=False):
     """
     Scrapes all pages linked within the 'racingNum' class, compiles data from each page, 
     and saves it as a CSV file with separate sheets for each page.
@@ -9,12 +16,14 @@ def scrape_all_pages(driver, url, By, pd, fileName):
         url (str): Base URL to start scraping from.
         By: Selenium By module.
         pd: pandas module.
+        snapshot (bool): Parse each page from a single HTML snapshot instead of per-cell WebDriver calls.
 
     Returns:
         None: Saves the collected data as a CSV file with multiple sheets.
     """
     # Navigate to the base URL
-    driver.get(url)
+    load_page(driver, url)
+    wait_for_element(driver, By.CLASS_NAME, 'racingNum')
 
     # Extract all URLs from the 'racingNum' class
     urls = extract_urls_from_racingNum(driver, By)
@@ -23,17 +32,80 @@ def scrape_all_pages(driver, url, By, pd, fileName):
     # Filter out URLs containing 'Racecourse=S1'
     urls = [url for url in urls if 'Racecourse=S1' not in url]
 
-    # Initialize a list to store DataFrames
-    all_dataframes = []
+    # Scrape each URL and hand its DataFrame to the writer as soon as it is ready
+    def scraped_races():
+        for page_url in urls:
+            df = scrape_race(driver, page_url, By, pd, snapshot)
+            if df is not None and not df.empty:  # Only add non-empty DataFrames
+                yield df
+            else:
+                print(f"Failed to scrape {page_url}")
 
-    # Scrape each URL and append the resulting DataFrame to the list
-    for page_url in urls:
-        df = scrape_race(driver, page_url, By, pd)
+    # Save all DataFrames to a CSV file with separate sheets
+    save_to_csv_with_sheets(scraped_races(), fileName, pd)
+
+def fetch_all_pages(fetcher, url, pd, fileName):
+    """
+    Same as scrape_all_pages, but loads every page through a fetch backend and parses the HTML in-process.
+
+    Args:
+        fetcher: Fetch backend (fetchBackend.HttpFetcher or fetchBackend.SeleniumFetcher).
+        url (str): Base URL to start scraping from.
+        pd: pandas module.
+        fileName (str): Excel file to write, or None to only return the data.
+
+    Returns:
+        list: (race key, DataFrame) pairs in race order, where the race key is
+            (date, venue, race number) from parse_race_key, or None if it was not found.
+            The DataFrames are also saved as a CSV file with multiple sheets.
+    """
+    html = fetcher.get(url)
+
+    # Extract all URLs from the 'racingNum' class
+    urls = parse_racingNum_urls(html, url)
+
+    # Filter out URLs containing 'Racecourse=S1'
+    urls = [page_url for page_url in urls if 'Racecourse=S1' not in page_url]
+
+    # The base page is already loaded, only fetch the other races
+    pages = [html] + fetcher.get_many(urls)
+    races = []
+    for page_url, page in zip([url] + urls, pages):
+        if page is None:
+            print(f"Failed to fetch {page_url}")
+            continue
+        soup = parse_html(page)
+        df = parse_race_page(soup, pd)
+        key = parse_race_key(soup)
+        # The base page is also linked from 'racingNum' as its own race
+        if key is not None and key in [race_key for race_key, _ in races]:
+            continue
         if not df.empty:  # Only add non-empty DataFrames
-            all_dataframes.append(df)
+            races.append((key, df))
 
     # Save all DataFrames to a CSV file with separate sheets
-    save_to_csv_with_sheets(all_dataframes, fileName, pd)
+    if fileName:
+        save_to_csv_with_sheets([df for key, df in races], fileName, pd)
+    return races
+
+def parse_racingNum_urls(html, base_url):
+    """
+    Extracts all race URLs from the 'racingNum' class of a racecard page's HTML.
+
+    Args:
+        html (str): Racecard page HTML.
+        base_url (str): URL the page was loaded from, used to resolve relative links.
+
+    Returns:
+        list: A list of absolute URLs.
+    """
+    urls = []
+    soup = parse_html(html)
+    for element in soup.find_all(class_='racingNum'):
+        for link in element.find_all('a'):
+            if link.get('href'):
+                urls.append(urljoin(base_url, link['href']))
+    return urls
 
 def extract_urls_from_racingNum(driver, By):
     """
@@ -66,18 +138,28 @@ def extract_urls_from_racingNum(driver, By):
     return urls
 
 
-def scrape_race(driver, url, By, pd):
+def scrape_race(driver, url, By, pd, snapshot=False):
     """
     Scrapes the table with the inner table structure from the provided URL.
     
     Args:
         driver: Selenium WebDriver instance.
         url (str): URL to scrape the table data from.
+        snapshot (bool): Take one HTML snapshot of the page and parse it in-process.
     
     Returns:
-        pd.DataFrame: A pandas DataFrame containing the scraped table data.
+        pd.DataFrame: A pandas DataFrame containing the scraped table data, or an empty DataFrame on error.
     """
-    driver.get(url)
+    try:
+        load_page(driver, url)
+    except Exception as e:
+        print(f"Error loading {url}: {e}")
+        return pd.DataFrame()
+    # The page may still be loading (lean browser), wait for the racecard itself
+    wait_for_element(driver, By.CSS_SELECTOR, '#racecardlist tbody')
+    if snapshot:
+        return parse_race_page(take_snapshot(driver), pd)
+
     headers = []
     rows = []
     
@@ -108,6 +190,7 @@ def scrape_race(driver, url, By, pd):
 
     except Exception as e:
         print(f"Error scraping the table: {e}")
+        return pd.DataFrame()
 
         
 def get_race_info(driver, pd, By):
@@ -129,3 +212,126 @@ def get_race_info(driver, pd, By):
    except Exception as e:
        print(f"Error extracting race details: {e}")
        return ['No Race Details Found'] + [''] * 10
+
+
+def parse_race_page(html, pd):
+    """
+    Parses a racecard page from its HTML, producing the same DataFrame as scrape_race.
+
+    Args:
+        html (str): Racecard page HTML, e.g. from take_snapshot or a saved fixture, or an already parsed page.
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame containing the racecard table data, or an empty DataFrame on error.
+    """
+    soup = parse_html(html) if isinstance(html, str) else html
+    rows = []
+
+    race_info = parse_race_info(soup)
+    rows.append(race_info)
+
+    try:
+        # Locate the table by its ID
+        table = soup.find(id='racecardlist')
+
+        # Locate the inner table
+        inner_table = table.find('table')
+
+        # Extract table headers from the inner table's <thead>
+        inner_thead = inner_table.find('thead')
+        headers = [element_text(th) for th in inner_thead.find_all('td') if element_text(th)]
+        headers.remove("Colour")
+        # Extract table rows from the inner table's <tbody>
+        inner_tbody = inner_table.find('tbody')
+        for tr in inner_tbody.find_all('tr'):
+            row = [element_text(td) for td in tr.find_all('td') if not has_display_none(td)]
+            if row:  # Only append non-empty rows
+                row.pop(2) #Remove colour
+                rows.append(row)
+        # Create DataFrame from the extracted data
+        df = pd.DataFrame(rows, columns=headers)
+        return df
+
+    except Exception as e:
+        print(f"Error scraping the table: {e}")
+        return pd.DataFrame()  # Return an empty DataFrame in case of error
+
+
+def parse_racecard_records(html, pd):
+    """
+    Parses a racecard page into typed records (see raceRecords).
+
+    Args:
+        html (str): Racecard page HTML, or an already parsed page.
+        pd: pandas module.
+
+    Returns:
+        tuple: (RaceMeta, list of RunnerEntry), or None if the race details or table are missing.
+    """
+    soup = parse_html(html) if isinstance(html, str) else html
+    key = parse_race_key(soup)
+    df = parse_race_page(soup, pd)
+    if key is None or df.empty:
+        return None
+    return racecard_from_frame(df, *key)
+
+
+def parse_race_info(soup):
+    """
+    Parses the 'f_fs13' race details block, matching get_race_info.
+
+    Args:
+        soup: Parsed racecard page.
+
+    Returns:
+        list: 'Race Details' followed by the track details, padded to 11 entries.
+    """
+    try:
+        race_detail_element = find_by_class(soup, "f_fs13")
+
+        if race_detail_element:
+            # Filter lines containing 'turf' or 'all weather track'
+            filtered_line = [subline.strip() for line in element_text(race_detail_element).split('\n')
+                             if 'turf' in line.lower() or 'all weather track' in line.lower()
+                             for subline in line.split(',')]
+
+            return ['Race Details'] + filtered_line + [''] * (10 - len(filtered_line))
+
+        return ['No Race Details Found'] + [''] * 10
+
+    except Exception as e:
+        print(f"Error extracting race details: {e}")
+        return ['No Race Details Found'] + [''] * 10
+
+
+def parse_race_key(soup):
+    """
+    Reads the race date, venue and race number from the 'f_fs13' race details block.
+
+    The block starts with lines like 'Race 1 - SAMPLE HANDICAP' and
+    'Sunday, October 19, 2025, Sha Tin, 13:00'.
+
+    Args:
+        soup: Parsed racecard page.
+
+    Returns:
+        tuple: (date 'YYYY-MM-DD', venue, race number), or None if the details are missing.
+    """
+    race_detail_element = find_by_class(soup, "f_fs13")
+    if race_detail_element is None:
+        return None
+
+    race_no = None
+    for line in element_text(race_detail_element).split('\n'):
+        race_match = re.match(r'Race (\d+)', line)
+        if race_match:
+            race_no = int(race_match.group(1))
+            continue
+
+        date_match = re.search(r'([A-Z][a-z]+ \d{1,2}, \d{4}), ([^,]+)', line)
+        if date_match and race_no is not None:
+            race_date = datetime.strptime(date_match.group(1), '%B %d, %Y').date().isoformat()
+            return race_date, date_match.group(2).strip(), race_no
+
+    return None
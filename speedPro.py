@@ -1,7 +1,15 @@
+import base64
+import json
+import re
+import time
+from urllib.parse import urljoin, urlsplit, urlunsplit
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from utils import save_to_csv_with_sheets
+from pageSnapshot import take_snapshot, parse_html, element_text, find_by_class
+from browser import wait_for_element
+from fetchPolicy import load_page
 
 def scrape_all_pages_speed_pro(driver, url, By, pd, fileName):
     """
@@ -18,22 +26,50 @@ def scrape_all_pages_speed_pro(driver, url, By, pd, fileName):
         None: Saves the collected data as an Excel file with multiple sheets.
     """
     # Navigate to the base URL
-    driver.get(url)
+    load_page(driver, url)
 
     # Extract all URLs from the 'race-nav' class
     urls = extract_urls_from_race_nav(driver, By)
 
-    # Initialize a list to store DataFrames
-    all_dataframes = []
+    # Scrape each URL and hand its DataFrame to the writer as soon as it is ready
+    def scraped_pages():
+        for page_url in urls:
+            df = scrape_speed_pro_page(driver, page_url, By, pd)
+            if not df.empty:  # Only add non-empty DataFrames
+                yield df
 
-    # Scrape each URL and append the resulting DataFrame to the list
-    for page_url in urls:
-        df = scrape_speed_pro_page(driver, page_url, By, pd)
-        if not df.empty:  # Only add non-empty DataFrames
-            all_dataframes.append(df)
+    # Save all DataFrames to an Excel file with separate sheets
+    save_to_csv_with_sheets(scraped_pages(), fileName, pd)
+
+def scrape_all_pages_speed_pro_pooled(pool, url, By, pd, fileName, cache=None):
+    """
+    Same as scrape_all_pages_speed_pro, but the race pages are scraped in parallel across a DriverPool.
+
+    Args:
+        pool (driverPool.DriverPool): Pool of WebDriver workers.
+        url (str): Base URL to start scraping from.
+        By: Selenium By module.
+        pd: pandas module.
+        fileName (str): Excel file to write.
+        cache (pageCache.PageCache): Optional page cache consulted before loading each race page.
+
+    Returns:
+        list: The race DataFrames, also saved as an Excel file with multiple sheets, in race order.
+    """
+    # Navigate to the base URL and extract all URLs from the 'race-nav' class
+    with pool.driver() as driver:
+        load_page(driver, url)
+        urls = extract_urls_from_race_nav(driver, By)
+
+    if cache is None:
+        frames = pool.map(lambda driver, page_url: scrape_speed_pro_page(driver, page_url, By, pd), urls)
+    else:
+        frames = pool.map(lambda driver, page_url: scrape_speed_pro_page_cached(driver, page_url, By, pd, cache), urls)
+    all_dataframes = [df for df in frames if df is not None and not df.empty]
 
     # Save all DataFrames to an Excel file with separate sheets
     save_to_csv_with_sheets(all_dataframes, fileName, pd)
+    return all_dataframes
 
 def scrape_speed_pro_page(driver, url, By, pd):
     """
@@ -46,11 +82,11 @@ def scrape_speed_pro_page(driver, url, By, pd):
     Returns:
         pd.DataFrame: A single DataFrame containing all subtables combined.
     """
-    driver.get(url)
     master_headers = []
     all_data = []  # Will hold all rows of data
 
     try:
+        load_page(driver, url)
         main_table = wait_for_element(driver, By.CLASS_NAME, "datatable", timeout=15)
 
         if not main_table:
@@ -84,7 +120,102 @@ def scrape_speed_pro_page(driver, url, By, pd):
         print(f"Error scraping the table: {e}")
         return pd.DataFrame()  # Return an empty DataFrame in case of error
 
-    
+
+def scrape_speed_pro_page_cached(driver, url, By, pd, cache):
+    """
+    Scrapes a Speed Pro page from the page cache, loading it in the browser only on a miss.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        url (str): URL of the page to scrape.
+        By: Selenium By module.
+        pd: pandas module.
+        cache (pageCache.PageCache): Page cache.
+
+    Returns:
+        pd.DataFrame: Same DataFrame as scrape_speed_pro_page.
+    """
+    html = cache.get(url)
+    if html is None:
+        html = load_speed_pro_snapshot(driver, url, By)
+        if html is None:
+            return pd.DataFrame()
+        cache.put(url, html)
+
+    return parse_speed_pro_page(html, pd)
+
+def load_speed_pro_snapshot(driver, url, By):
+    """
+    Loads a Speed Pro page and snapshots it once the datatable has rendered.
+
+    Args:
+        driver: Selenium WebDriver instance.
+        url (str): URL of the page to load.
+        By: Selenium By module.
+
+    Returns:
+        str: The rendered page HTML, or None if the datatable never appeared.
+    """
+    load_page(driver, url)
+    if not wait_for_element(driver, By.CLASS_NAME, "datatable", timeout=15):
+        print("Failed to load the datatable.")
+        return None
+    return take_snapshot(driver)
+
+def parse_speed_pro_page(html, pd):
+    """
+    Parses a rendered Speed Pro page snapshot into the same DataFrame as scrape_speed_pro_page.
+
+    Args:
+        html (str): Page HTML captured after the datatable rendered.
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: A single DataFrame containing all subtables combined.
+    """
+    try:
+        main_table = find_by_class(parse_html(html), "datatable")
+
+        if not main_table:
+            print("Failed to load the datatable.")
+            return pd.DataFrame()  # Return an empty DataFrame
+
+        # Extract master headers (first row of the table)
+        master_headers = [element_text(th) for th in main_table.find_all('th') if element_text(th)]
+
+        current_subtable = []
+        for row in main_table.find_all('tr'):
+            row_data = [element_text(td) for td in row.find_all('td')]
+
+            if len(row_data) > 0:
+                if row.get('class') == ['comment']:
+                    current_subtable.append([row_data[0], '', ''] + row_data[1:])
+                else:
+                    current_subtable.append(row_data)
+
+        return pd.DataFrame(current_subtable, columns=master_headers)
+
+    except Exception as e:
+        print(f"Error scraping the table: {e}")
+        return pd.DataFrame()  # Return an empty DataFrame in case of error
+
+def parse_race_nav_urls(html, base_url):
+    """
+    Extracts all race URLs from the 'race-nav' element of a rendered Speed Pro page.
+
+    Args:
+        html (str): Speed Pro page HTML.
+        base_url (str): URL the page was loaded from, used to resolve relative links.
+
+    Returns:
+        list: A list of absolute URLs.
+    """
+    race_nav = find_by_class(parse_html(html), 'race-nav')
+    if race_nav is None:
+        print("Unable to locate the race-nav element.")
+        return []
+    return [urljoin(base_url, link['href']) for link in race_nav.find_all('a') if link.get('href')]
+
 def extract_urls_from_race_nav(driver, By):
     """
     Extracts all URLs from the 'race-nav' class elements on the page.
@@ -113,27 +244,266 @@ def extract_urls_from_race_nav(driver, By):
         print("Timeout while waiting for the race-nav element.")
         return []
 
-def wait_for_element(driver, by, value, timeout=10):
+# Columns of the rendered datatable, which the feed's rows are laid out in
+SPEED_PRO_COLUMNS = ['No.', 'Horse', 'Draw', 'Energy Required', 'Fitness Ratings', 'Status', 'Running Position']
+
+# Feed field names accepted for each column header, compared lower-case without punctuation.
+# A header missing here, or a field no runner has, makes the feed unusable for that page
+FEED_FIELDS = {
+    'No.': ['no', 'horseno', 'runnerno', 'number', 'saddlecloth'],
+    'Horse': ['horse', 'horsename', 'name', 'horsenameen'],
+    'Draw': ['draw', 'barrier', 'gate'],
+    'Energy Required': ['energyrequired', 'energy', 'er'],
+    'Fitness Ratings': ['fitnessratings', 'fitnessrating', 'fitness', 'fr'],
+    'Status': ['status', 'energystatus'],
+    'Running Position': ['runningposition', 'runpos', 'position', 'runningstyle'],
+}
+# The brand number is shown after the horse's name, as on the page: 'GOLDEN SPIRIT (H123)'
+BRAND_FIELDS = ['brandno', 'brandnumber', 'horsecode', 'horseid', 'code']
+COMMENT_FIELDS = ['comment', 'comments', 'remark', 'remarks']
+
+def _field_key(name):
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+def _feed_value(record, names):
+    """Returns the first of names present in a feed record, as the text the page would show."""
+    for name in names:
+        if name in record:
+            value = record[name]
+            if value is None:
+                return ''
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            return str(value).strip()
+    return None
+
+def find_runner_records(payload):
     """
-    Waits for an element to be present in the DOM and visible.
+    Finds the list of runners in a decoded feed response.
+
+    The feed's layout is not fixed, so every list of objects in it is scored by
+    how many of the datatable's columns its first entries have, and the best one wins.
 
     Args:
-        driver: Selenium WebDriver instance.
-        by: The locator strategy (e.g., By.ID, By.CLASS_NAME).
-        value: The value of the locator.
-        timeout (int): Maximum wait time in seconds.
+        payload: Decoded JSON.
+
+    Returns:
+        list: Runner dicts with their keys normalised (see FEED_FIELDS), or [] if none has at least two columns.
+    """
+    best, best_score = [], 1
+    pending = [payload]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, list):
+            records = [item for item in value if isinstance(item, dict)]
+            if records:
+                keys = {_field_key(key) for record in records[:5] for key in record}
+                score = sum(1 for names in FEED_FIELDS.values() if keys.intersection(names))
+                if score > best_score:
+                    best, best_score = records, score
+            pending.extend(value)
+    return [{_field_key(key): value for key, value in record.items()} for record in best]
+
+def parse_speed_pro_feed(payloads, pd, headers=SPEED_PRO_COLUMNS):
+    """
+    Parses Speed Pro data feed responses into the same DataFrame as scrape_speed_pro_page.
+
+    A runner's comment becomes a row of its own under the runner, laid out like
+    the page's comment rows.
+
+    Args:
+        payloads (list): Decoded JSON responses the page loaded; the one holding the runners is picked out.
+        pd: pandas module.
+        headers (list): Column headers of the rendered datatable, in order.
 
     Returns:
-        WebElement: The located element.
+        pd.DataFrame: A single DataFrame containing all subtables combined, empty if no runners were found.
 
     Raises:
-        TimeoutException: If the element is not found within the timeout.
+        ValueError: If the runners do not have a field for every header, rather than leave columns blank.
     """
-    try:
-        element = WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((by, value))
-        )
-        return element
-    except TimeoutException:
-        print(f"Timeout: Element with {by} = {value} not found within {timeout} seconds.")
+    runners = max((find_runner_records(payload) for payload in payloads), key=len, default=[])
+    if not runners:
+        return pd.DataFrame()
+
+    missing = [header for header in headers
+               if header not in FEED_FIELDS or any(_feed_value(runner, FEED_FIELDS[header]) is None for runner in runners)]
+    if missing:
+        raise ValueError(f"feed has no field for the columns {', '.join(missing)}")
+
+    rows = []
+    for runner in runners:
+        row = [_feed_value(runner, FEED_FIELDS[header]) for header in headers]
+        brand = _feed_value(runner, BRAND_FIELDS)
+        if brand and 'Horse' in headers:
+            horse = headers.index('Horse')
+            if f'({brand})' not in row[horse]:
+                row[horse] = f'{row[horse]} ({brand})'
+        rows.append(row)
+
+        comment = _feed_value(runner, COMMENT_FIELDS)
+        if comment:
+            rows.append([row[0], '', '', comment])
+    return pd.DataFrame(rows, columns=headers)
+
+def capture_feed(driver, url, settle=0.5, timeout=15):
+    """
+    Loads a Speed Pro page and collects the JSON responses its scripts fetched, without waiting for the table to render.
+
+    Responses are read from Chrome's performance log, so the driver must have been
+    created with browser.create_driver(capture_network=True).
+
+    Args:
+        driver: Selenium WebDriver instance.
+        url (str): URL of the page to load.
+        settle (float): Seconds without a new JSON response after which the page is taken to be done loading data.
+        timeout (float): Longest wait for the data in seconds.
+
+    Returns:
+        list: (response URL, decoded JSON) pairs, in the order the responses finished.
+    """
+    driver.get_log('performance')  # Drop the events of earlier pages
+    load_page(driver, url)
+
+    json_requests = {}
+    finished = []
+    start = last_seen = time.monotonic()
+    while time.monotonic() - start < timeout:
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            params = message.get('params', {})
+            if message.get('method') == 'Network.responseReceived':
+                response = params.get('response', {})
+                if 'json' in response.get('mimeType', '') or response.get('url', '').split('?')[0].endswith('.json'):
+                    json_requests[params['requestId']] = response['url']
+            elif message.get('method') == 'Network.loadingFinished' and params.get('requestId') in json_requests:
+                finished.append(params['requestId'])
+                last_seen = time.monotonic()
+        if finished and time.monotonic() - last_seen >= settle:
+            break
+        time.sleep(0.1)
+
+    responses = []
+    for request_id in finished:
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            text = base64.b64decode(body['body']).decode('utf-8') if body.get('base64Encoded') else body['body']
+            responses.append((json_requests[request_id], json.loads(text)))
+        except Exception as e:
+            print(f"Unable to read {json_requests[request_id]}: {e}")
+    return responses
+
+def derive_feed_url(page_url, known_page_url, known_feed_url):
+    """
+    Works out another race's feed URL from one already captured.
+
+    The numbers that differ between the two page URLs (e.g. race=1 and race=2)
+    are swapped in the known feed URL. Each must appear there exactly once,
+    otherwise the feed cannot be guessed.
+
+    Args:
+        page_url (str): Page whose feed is wanted.
+        known_page_url (str): Page whose feed was captured.
+        known_feed_url (str): The feed it loaded.
+
+    Returns:
+        str: The feed URL, or None if it cannot be derived.
+    """
+    pieces, known_pieces = re.split(r'(\d+)', page_url), re.split(r'(\d+)', known_page_url)
+    if len(pieces) != len(known_pieces) or pieces[0::2] != known_pieces[0::2]:
         return None
+
+    # Only the path and query are rewritten, a numeric host is left alone
+    parts = urlsplit(known_feed_url)
+    target = urlunsplit(('', '', parts.path, parts.query, ''))
+    for new, old in zip(pieces[1::2], known_pieces[1::2]):
+        if new == old:
+            continue
+        number = re.compile(rf'(?<!\d){old}(?!\d)')
+        if len(number.findall(target)) != 1:
+            return None
+        target = number.sub(new, target)
+    feed_url = urlunsplit((parts.scheme, parts.netloc, '', '', '')) + target
+    return feed_url
+
+def scrape_all_pages_speed_pro_feed(pool, url, By, pd, fileName, fetcher=None):
+    """
+    Same as scrape_all_pages_speed_pro_pooled, but each race is read from the JSON the form guide loads
+    instead of walking its rendered table.
+
+    The first race is loaded in a browser and its data responses captured
+    (see capture_feed), so the pool's drivers must capture network traffic.
+    The other races' feed URLs are then derived from it and fetched directly,
+    without a browser. A feed without a field for every column of
+    SPEED_PRO_COLUMNS is not used. A race whose feed cannot be fetched or
+    parsed is captured in the browser, and one with no usable feed at all is
+    read from its rendered table, the only case that waits for it to render.
+
+    Args:
+        pool (driverPool.DriverPool): Pool of WebDriver workers created with capture_network=True.
+        url (str): Base URL to start scraping from.
+        By: Selenium By module.
+        pd: pandas module.
+        fileName (str): Excel file to write.
+        fetcher: Fetch backend for the derived feed URLs, or None to capture every race in the browser.
+
+    Returns:
+        list: The race DataFrames, also saved as an Excel file with multiple sheets, in race order.
+    """
+    # Navigate to the base URL and extract all URLs from the 'race-nav' class
+    with pool.driver() as driver:
+        load_page(driver, url)
+        urls = extract_urls_from_race_nav(driver, By)
+    if not urls:
+        save_to_csv_with_sheets([], fileName, pd)
+        return []
+
+    captured = {}
+
+    def capture(driver, page_url):
+        for feed_url, payload in capture_feed(driver, page_url):
+            try:
+                df = parse_speed_pro_feed([payload], pd)
+            except ValueError as e:
+                print(f"Speed Pro data feed {feed_url} does not match the table's columns: {e}")
+                continue
+            if not df.empty:
+                captured.setdefault('feed', (page_url, feed_url))
+                return df
+        print(f"No usable Speed Pro data feed found for {page_url}, reading the rendered table.")
+        if not wait_for_element(driver, By.CLASS_NAME, "datatable", timeout=15):
+            print("Failed to load the datatable.")
+            return pd.DataFrame()
+        return parse_speed_pro_page(take_snapshot(driver), pd)
+
+    # An empty first race stays in the remaining races, so it is captured again
+    first = pool.run(capture, urls[0])
+    frames = {urls[0]: first} if first is not None and not first.empty else {}
+
+    # The rest straight from their feeds, where they can be worked out
+    feed_urls = {}
+    if fetcher is not None and 'feed' in captured:
+        for page_url in urls[1:]:
+            feed_url = derive_feed_url(page_url, *captured['feed'])
+            if feed_url is not None:
+                feed_urls[page_url] = feed_url
+    if feed_urls:
+        for page_url, body in zip(feed_urls, fetcher.get_many(list(feed_urls.values()))):
+            try:
+                df = parse_speed_pro_feed([json.loads(body)], pd) if body is not None else pd.DataFrame()
+            except ValueError as e:
+                print(f"Unable to parse {feed_urls[page_url]}: {e}")
+                df = pd.DataFrame()
+            if not df.empty:
+                frames[page_url] = df
+
+    remaining = [page_url for page_url in urls if page_url not in frames]
+    frames.update(zip(remaining, pool.map(capture, remaining)))
+    all_dataframes = [frames[page_url] for page_url in urls
+                      if frames[page_url] is not None and not frames[page_url].empty]
+
+    # Save all DataFrames to an Excel file with separate sheets
+    save_to_csv_with_sheets(all_dataframes, fileName, pd)
+    return all_dataframes
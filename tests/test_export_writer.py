@@ -0,0 +1,65 @@
+import gzip
+import os
+import pandas as pd
+import pytest
+from exportWriter import export_format, open_writer, with_format
+from utils import save_to_csv_with_sheets
+
+RACES = [pd.DataFrame({'Horse': ['A', 'B'], 'Sectional Times': [[24.1, 22.5], None]}),
+         pd.DataFrame({'Horse': ['C'], 'Extra': ['x']})]
+
+
+def test_workbook_has_a_sheet_per_frame(tmp_path):
+    path = str(tmp_path / 'races.xlsx')
+    save_to_csv_with_sheets(iter(RACES), path, pd)
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['Page_1', 'Page_2']
+    assert sheets['Page_1']['Sectional Times'].tolist()[0] == '[24.1, 22.5]'
+
+
+@pytest.mark.parametrize('file_name', ['races.xlsx', 'races.csv', 'races.csv.gz'])
+def test_nothing_is_saved_without_frames(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    with pytest.raises(ValueError):
+        open_writer(path).close()
+    save_to_csv_with_sheets([], path, pd)
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('file_name', ['races.xlsx', 'races.csv', 'races.csv.gz'])
+def test_nothing_is_saved_after_an_error(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+
+    def failing_races():
+        yield RACES[0]
+        raise RuntimeError("scrape failed")
+
+    save_to_csv_with_sheets(failing_races(), path, pd)
+    assert not os.path.exists(path)
+
+
+def test_csv_is_only_compressed_for_csv_gz(tmp_path):
+    plain, compressed = str(tmp_path / 'races.csv'), str(tmp_path / 'races.csv.gz')
+    for path in (plain, compressed):
+        save_to_csv_with_sheets(RACES, path, pd)
+
+    with open(plain, encoding='utf-8') as f:
+        text = f.read()
+    with gzip.open(compressed, 'rt', encoding='utf-8') as f:
+        assert f.read() == text
+    df = pd.read_csv(plain)
+    assert list(df.columns) == ['Sheet', 'Horse', 'Sectional Times']
+    assert df['Sheet'].tolist() == ['Page_1', 'Page_1', 'Page_2']
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'races.parquet')
+    save_to_csv_with_sheets(RACES, path, pd)
+    assert pd.read_parquet(path)['Horse'].tolist() == ['A', 'B', 'C']
+
+
+def test_formats_follow_the_extension():
+    assert [export_format(name) for name in ('a.xlsx', 'a.csv', 'a.CSV.GZ', 'a.parquet')] == ['xlsx', 'csv', 'csv', 'parquet']
+    assert with_format('Data/race_data.xlsx', 'csv') == 'Data/race_data.csv.gz'
+    assert with_format('Data/race_data.csv.gz', 'parquet') == 'Data/race_data.parquet'
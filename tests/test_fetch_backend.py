@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import pytest
+import requests
+from fetchBackend import HttpFetcher
+
+
+def test_get_returns_page_with_links_rewritten(page_url, replay_site, site_html):
+    with HttpFetcher(max_connections=2) as fetcher:
+        html = fetcher.get(page_url('trainer'))
+    assert html == site_html('trainer_ranking.html').replace('https://racing.hkjc.com', replay_site)
+
+
+def test_missing_page_raises(replay_site):
+    with HttpFetcher(max_connections=2) as fetcher:
+        with pytest.raises(requests.HTTPError):
+            fetcher.get(replay_site + '/not-recorded.aspx')
+
+
+def test_get_many_keeps_order_and_marks_failures(page_url, replay_site):
+    urls = [page_url('jockey'), replay_site + '/not-recorded.aspx', page_url('trainer')]
+    with HttpFetcher(max_connections=2) as fetcher:
+        pages = fetcher.get_many(urls)
+    assert pages[1] is None
+    assert 'Jockey' in pages[0] and 'Trainer' in pages[2]
+
+
+def test_get_conditional_without_validators(page_url):
+    with HttpFetcher(max_connections=2) as fetcher:
+        html, etag, last_modified = fetcher.get_conditional(page_url('racecard'))
+    assert 'racecardlist' in html
+    assert etag is None and last_modified is None
+
+
+def test_http_errors_do_not_load_selenium():
+    check = ("import sys, requests; from fetchPolicy import is_retryable; import incremental; "
+             "assert is_retryable(requests.ConnectionError()); assert not is_retryable(ValueError()); "
+             "assert 'selenium' not in sys.modules")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', check], cwd=root, check=True)
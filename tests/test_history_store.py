@@ -0,0 +1,249 @@
+import json
+import random
+import sqlite3
+from datetime import date, timedelta
+import pandas as pd
+import historyStore
+import raceRecords
+from fetchBackend import HttpFetcher
+from pastRaces import fetch_pastRaces, parse_results_page, parse_results_records
+from scrapeRacePage import parse_race_page
+from utils import save_to_csv_with_sheets
+
+RESULTS_DATE = '2025-10-19'
+
+
+def stored_runners(conn):
+    rows = conn.execute("SELECT race_no, horse_name FROM results ORDER BY race_no, place_num").fetchall()
+    runners = {}
+    for race_no, horse_name in rows:
+        runners.setdefault(race_no, []).append(horse_name)
+    return runners
+
+
+def expected_runners(site_html, race_no):
+    _, runners, _ = parse_results_records(site_html(f'results_race{race_no}.html'), race_no)
+    return [runner.horse_name for runner in sorted(runners, key=lambda runner: runner.place_num or 99)]
+
+
+def test_import_scraped_workbook_numbers_races(tmp_path, page_url, site_html):
+    workbook = tmp_path / RESULTS_DATE / f'past_races_data_{RESULTS_DATE}.xlsx'
+    with HttpFetcher(max_connections=2) as fetcher:
+        races = fetch_pastRaces(fetcher, page_url('results'), pd, str(workbook))
+    assert [race_num for race_num, _ in races] == ['1', '2']
+
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        historyStore.import_workbooks(conn, str(tmp_path))
+        assert stored_runners(conn) == {1: expected_runners(site_html, 1), 2: expected_runners(site_html, 2)}
+        assert [row[0] for row in conn.execute("SELECT DISTINCT race_no FROM horse_runs h "
+                                               "JOIN results r ON r.rowid = h.result_id ORDER BY 1")] == [1, 2]
+    finally:
+        conn.close()
+
+
+def test_import_drops_duplicate_first_race_sheet(tmp_path, site_html):
+    # Workbooks scraped before the fix hold race 1 twice
+    race1 = parse_results_page(site_html('results_race1.html'), pd)
+    race2 = parse_results_page(site_html('results_race2.html'), pd)
+    workbook = tmp_path / RESULTS_DATE / f'past_races_data_{RESULTS_DATE}.xlsx'
+    save_to_csv_with_sheets([race1, race1, race2], str(workbook), pd)
+
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        historyStore.import_workbooks(conn, str(tmp_path))
+        assert stored_runners(conn) == {1: expected_runners(site_html, 1), 2: expected_runners(site_html, 2)}
+        assert [row[0] for row in conn.execute("SELECT race_no FROM races ORDER BY 1")] == [1, 2]
+    finally:
+        conn.close()
+
+
+def store_results(conn, site_html):
+    for race_no in (1, 2):
+        historyStore.upsert_race_records(conn, *parse_results_records(site_html(f'results_race{race_no}.html'), race_no))
+
+
+def test_horse_runs_latest_first(tmp_path, site_html):
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        store_results(conn, site_html)
+        runs = historyStore.horse_runs(conn, ['H123', 'unknown horse'])
+        assert runs['lookup'].unique().tolist() == [historyStore.horse_key('H123')]
+        assert runs['run'].tolist() == list(range(1, len(runs) + 1))
+        assert runs['race_date'].is_monotonic_decreasing
+
+        assert historyStore.horse_runs(conn, ['H123'], before=RESULTS_DATE).empty
+        empty = historyStore.horse_runs(conn, [])
+        assert empty.empty and pd.api.types.is_datetime64_any_dtype(empty['race_date'])
+    finally:
+        conn.close()
+
+
+def test_enrich_racecard(tmp_path, site_html):
+    card = parse_race_page(site_html('racecard_race1.html'), pd)
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        store_results(conn, site_html)
+        form = historyStore.enrich_racecard(conn, card, race_date='2025-10-20')
+        assert form['Horse'].drop_duplicates().tolist() == card['Horse'].iloc[1:].tolist()
+        assert set(form['Date'].dropna()) == {RESULTS_DATE}
+
+        # Before the stored meeting every runner has a single row without history
+        form = historyStore.enrich_racecard(conn, card, race_date=RESULTS_DATE)
+        assert len(form) == len(card) - 1 and form['Date'].isna().all()
+
+        # A card with its details row but no runners
+        assert historyStore.enrich_racecard(conn, card.iloc[:1]).empty
+    finally:
+        conn.close()
+
+
+def ranking_days(count=60, names=20, seed=7):
+    """Synthetic daily jockey tables crossing the 2025/26 season start, with about 10% of rows changing a day."""
+    rng = random.Random(seed)
+    totals = {f'Jockey {i}': dict.fromkeys(historyStore.RANKING_FIELDS, 0) for i in range(names)}
+    days = []
+    for offset in range(count):
+        day = (date(2025, 8, 1) + timedelta(days=offset)).isoformat()
+        if day == '2025-09-01':
+            totals = {name: dict.fromkeys(historyStore.RANKING_FIELDS, 0) for name in totals}
+        for name in rng.sample(sorted(totals), max(1, names // 10)):
+            row = totals[name]
+            row['total_runs'] += 1
+            row[rng.choice(historyStore.RANKING_FIELDS[:5])] += 1
+            row['stakes'] += rng.randrange(1000, 100000)
+        if offset == 20:
+            totals.pop('Jockey 0')
+        table = {name: dict(row, extra={'Rank': str(i + 1)})
+                 for i, (name, row) in enumerate(sorted(totals.items()))}
+        days.append((day, table))
+    return days
+
+
+def test_ranking_series_round_trips(tmp_path):
+    days = ranking_days()
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        with conn:
+            for day, table in days:
+                historyStore.store_ranking_day(conn, 'jockey', day, table)
+        for day, table in days:
+            assert historyStore.ranking_table_on(conn, 'jockey', day) == table
+
+        snapshots = [day for day, in conn.execute("SELECT ranking_date FROM ranking_days WHERE snapshot = 1")]
+        assert snapshots[0] == days[0][0] and '2025-09-01' in snapshots
+        assert len(snapshots) < len(days) / 5
+        assert len(historyStore.load_rankings(conn, 'jockey')) == sum(len(table) for _, table in days)
+    finally:
+        conn.close()
+
+
+def test_ranking_series_ingestion_order_does_not_matter(tmp_path):
+    days = ranking_days()
+    shuffled = list(days)
+    random.Random(3).shuffle(shuffled)
+    stores = {}
+    for name, order in (('in-order', days), ('shuffled', shuffled)):
+        conn = historyStore.connect(str(tmp_path / f'{name}.sqlite'))
+        with conn:
+            for day, table in order:
+                historyStore.store_ranking_day(conn, 'jockey', day, table)
+        stores[name] = conn
+    try:
+        for table in ('ranking_days', 'ranking_snapshots', 'ranking_deltas'):
+            query = f"SELECT * FROM {table} ORDER BY 1, 2, 3"
+            assert stores['shuffled'].execute(query).fetchall() == stores['in-order'].execute(query).fetchall()
+    finally:
+        for conn in stores.values():
+            conn.close()
+
+
+def test_ranking_window_across_season_start(tmp_path):
+    days = dict(ranking_days())
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        with conn:
+            for day, table in days.items():
+                historyStore.store_ranking_day(conn, 'jockey', day, table)
+        window = historyStore.ranking_window(conn, 'jockey', days=10, end='2025-09-05')
+
+        # Totals from the window's base day to the season's last day, then everything of the new season
+        base, season_end, end = days['2025-08-26'], days['2025-08-31'], days['2025-09-05']
+        for name, row in end.items():
+            for column in historyStore.RANKING_FIELDS:
+                expected = season_end[name][column] - base[name][column] + row[column]
+                assert window.loc[name, column] == expected
+    finally:
+        conn.close()
+
+
+def test_old_rankings_table_is_migrated(tmp_path):
+    days = ranking_days(count=10)
+    path = str(tmp_path / 'history.sqlite')
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE rankings (ranking_date TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL, "
+                "season TEXT NOT NULL, wins INTEGER, seconds INTEGER, thirds INTEGER, fourths INTEGER, "
+                "fifths INTEGER, total_runs INTEGER, stakes INTEGER, extra TEXT, PRIMARY KEY (ranking_date, kind, name))")
+    old.executemany("INSERT INTO rankings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(day, 'jockey', name, historyStore.season_of(day))
+                     + tuple(row[column] for column in historyStore.RANKING_FIELDS) + (json.dumps(row['extra']),)
+                     for day, table in days for name, row in table.items()])
+    old.commit()
+    old.close()
+
+    conn = historyStore.connect(path)
+    try:
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rankings'").fetchone() is None
+        for day, table in days:
+            assert historyStore.ranking_table_on(conn, 'jockey', day) == table
+    finally:
+        conn.close()
+
+
+def synthetic_races(count=40, seed=11):
+    """Synthetic races over a few benchmark groups, with three or four random sectionals each."""
+    rng = random.Random(seed)
+    races = []
+    for i in range(count):
+        race_date = (date(2025, 9, 7) + timedelta(days=7 * (i // 8))).isoformat()
+        race = raceRecords.RaceMeta(race_date=race_date, venue='Sha Tin', race_no=i % 8 + 1,
+                                    race_class=rng.choice(['Class 3', 'Class 4']), distance=rng.choice([1200, 1400]),
+                                    course='TURF - "A" COURSE', going=rng.choice(['GOOD', 'GOOD TO FIRM']))
+        splits = [raceRecords.SectionalSplit(race_date=race_date, venue='Sha Tin', race_no=race.race_no,
+                                             section=section, seconds=round(rng.uniform(22, 26), 2))
+                  for section in range(1, rng.choice([3, 4]) + 1)]
+        race.total_seconds = round(sum(split.seconds for split in splits), 2)
+        races.append((race, splits))
+    return races
+
+
+def benchmark_tables(conn):
+    return {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4, 5, 6").fetchall()
+            for table in ('par_times', 'sectional_pars', 'pace_shapes')}
+
+
+def test_incremental_benchmarks_match_rebuild(tmp_path):
+    races = synthetic_races()
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        for race, splits in races:
+            historyStore.upsert_race_records(conn, race, [], splits)
+
+        # Re-ingest races with corrected details: race 0 moves to a group of its own and back,
+        # emptying that group, race 1 moves to a new group and race 2 keeps its group
+        for index, changes in ((0, {'going': 'YIELDING'}), (1, {'race_class': 'Class 1'}),
+                               (0, {'going': 'GOOD'}), (2, {'total_seconds': 99.0})):
+            race, splits = races[index]
+            for name, value in changes.items():
+                setattr(race, name, value)
+            historyStore.upsert_race_records(conn, race, [], splits)
+
+        incremental = benchmark_tables(conn)
+        assert incremental['par_times'] and incremental['sectional_pars'] and incremental['pace_shapes']
+        assert not any(row[4] == 'YIELDING' for row in incremental['par_times'])
+        assert any(row[3] == 'Class 1' for row in incremental['par_times'])
+
+        historyStore.rebuild_benchmarks(conn)
+        assert benchmark_tables(conn) == incremental
+    finally:
+        conn.close()
@@ -0,0 +1,63 @@
+import historyStore
+import incremental
+import speedPro
+from fetchBackend import HttpFetcher
+
+
+class DroppingFetcher(HttpFetcher):
+    """HttpFetcher that fails every page whose URL contains a given text."""
+
+    def __init__(self, drop, **kwargs):
+        super().__init__(**kwargs)
+        self.drop = drop
+
+    def get_many(self, urls):
+        return [None if self.drop in url else page for url, page in zip(urls, super().get_many(urls))]
+
+
+def run(tmp_path, fetcher, page_url, stages):
+    urls = {page: page_url(page) for page in ('racecard', 'speedpro', 'results')}
+    files = {stage: str(tmp_path / f'{stage}.xlsx') for stage in ('racecard', 'speedpro', 'results', 'dates')}
+    return incremental.run_incremental(fetcher, None, None, urls, files, '2025-10-19',
+                                       history_db=str(tmp_path / 'history.sqlite'),
+                                       state_file=str(tmp_path / 'state.json'), stages=stages)
+
+
+def stored_races(tmp_path):
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        return [row[0] for row in conn.execute("SELECT race_no FROM races ORDER BY race_no")]
+    finally:
+        conn.close()
+
+
+def test_meeting_with_failed_race_is_retried(tmp_path, page_url):
+    with DroppingFetcher('RaceNo=2', max_connections=2) as fetcher:
+        _, report = run(tmp_path, fetcher, page_url, ('results',))
+    assert [status for stage, status, reason in report if stage == 'results'] == ['failed']
+    assert stored_races(tmp_path) == []
+
+    with HttpFetcher(max_connections=2) as fetcher:
+        _, report = run(tmp_path, fetcher, page_url, ('results',))
+    assert [status for stage, status, reason in report if stage == 'results'] == ['ran']
+    assert stored_races(tmp_path) == [1, 2]
+
+
+def test_speed_pro_is_retried_after_failing(tmp_path, page_url, monkeypatch):
+    attempts = []
+
+    def speed_pro(pool, url, By, pd, file_name, cache=None):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise RuntimeError("browser crashed")
+        return [pd.DataFrame({'Horse': ['A']})]
+
+    monkeypatch.setattr(speedPro, 'scrape_all_pages_speed_pro_pooled', speed_pro)
+    statuses = []
+    with HttpFetcher(max_connections=2) as fetcher:
+        for _ in range(3):
+            _, report = run(tmp_path, fetcher, page_url, ('racecard', 'speedpro'))
+            statuses.append(dict((stage, status) for stage, status, reason in report if stage in ('racecard', 'speedpro')))
+    assert statuses == [{'racecard': 'ran', 'speedpro': 'failed'},
+                        {'racecard': 'skipped', 'speedpro': 'ran'},
+                        {'racecard': 'skipped', 'speedpro': 'skipped'}]
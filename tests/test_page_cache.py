@@ -0,0 +1,74 @@
+import pageCache
+from pageCache import CachedFetcher, PageCache
+
+RESULTS_URL = 'https://racing.hkjc.com/racing/information/English/Racing/LocalResults.aspx?RaceDate=2025/10/19&Racecourse=ST&RaceNo=1'
+RACECARD_URL = 'https://racing.hkjc.com/racing/information/English/racing/RaceCard.aspx?RaceNo={}'
+MAINTENANCE_PAGE = '<html><body><p>The site is under maintenance.</p></body></html>'
+
+
+class PageFetcher:
+    """Fetch backend serving fixed pages and counting the requests it gets."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url):
+        self.requests.append(url)
+        return self.pages[url]
+
+    def get_many(self, urls):
+        return [self.get(url) for url in urls]
+
+    def close(self):
+        pass
+
+
+def test_entries_expire_after_their_ttl(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path), ttls={'racecard': 60})
+    now = pageCache.time.time()
+    cache.put(RACECARD_URL.format(1), '<html>card</html>')
+    assert cache.get(RACECARD_URL.format(1)) == '<html>card</html>'
+
+    monkeypatch.setattr(pageCache.time, 'time', lambda: now + 61)
+    assert cache.get(RACECARD_URL.format(1)) is None
+    assert cache.stats()['expired'] == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path))
+    for race_no in (1, 2, 3):
+        cache.put(RACECARD_URL.format(race_no), f'<html>{race_no}{"x" * race_no * 1000}</html>')
+    cache.get(RACECARD_URL.format(1))
+
+    cache.max_bytes = cache.stats()['bytes'] - 1
+    cache.put(RACECARD_URL.format(1), '<html>1' + 'x' * 1000 + '</html>')
+    assert cache.get(RACECARD_URL.format(2)) is None
+    assert cache.get(RACECARD_URL.format(1)) is not None
+    assert cache.stats()['evictions'] >= 1
+    cache.close()
+
+
+def test_incomplete_results_page_is_fetched_again(tmp_path):
+    fetcher = PageFetcher({RESULTS_URL: MAINTENANCE_PAGE})
+    with CachedFetcher(fetcher, PageCache(str(tmp_path))) as cached:
+        assert cached.get(RESULTS_URL) == MAINTENANCE_PAGE
+        assert cached.get_many([RESULTS_URL]) == [MAINTENANCE_PAGE]
+    assert len(fetcher.requests) == 2
+
+
+def test_complete_results_page_is_kept(tmp_path, site_html):
+    page = site_html('results_race1.html')
+    fetcher = PageFetcher({RESULTS_URL: page})
+    cache = PageCache(str(tmp_path))
+    with CachedFetcher(fetcher, cache) as cached:
+        assert cached.get(RESULTS_URL) == page
+        assert cached.get(RESULTS_URL) == page
+    assert len(fetcher.requests) == 1
+
+    # An incomplete copy fetched later drops the stored one instead of replacing it
+    cached = CachedFetcher(PageFetcher({RESULTS_URL: MAINTENANCE_PAGE}), cache)
+    cached._store(RESULTS_URL, MAINTENANCE_PAGE)
+    assert cache.get(RESULTS_URL) is None
+    cache.close()
@@ -0,0 +1,31 @@
+import pandas as pd
+from fetchBackend import HttpFetcher
+from pastRaces import fetch_dates, fetch_meeting_results, parse_result_urls, parse_results_page, race_number
+
+
+def test_results_page_parses(site_html):
+    df = parse_results_page(site_html('results_race1.html'), pd)
+    assert df.columns[0] == 'Pla.'
+    assert {'Horse', 'Jockey', 'Finish Time', 'Sectional Times'} <= set(df.columns)
+    assert df.iloc[0, 0] == 'Race Details'
+    assert len(df) > 1
+
+
+def test_result_urls_are_absolute(site_html):
+    base_url = 'http://replay/racing/information/English/racing/LocalResults.aspx'
+    urls = parse_result_urls(site_html('results_race1.html'), base_url)
+    assert [race_number(url) for url in urls] == ['1', '2']
+    assert all(url.startswith('http://replay/') for url in urls)
+
+
+def test_fetch_dates(page_url):
+    with HttpFetcher(max_connections=2) as fetcher:
+        frames = fetch_dates(fetcher, pd, page_url('results'))
+    assert frames[0]['Dates'].tolist()[:2] == ['19/10/2025', '15/10/2025']
+
+
+def test_fetch_meeting_results(page_url):
+    with HttpFetcher(max_connections=2) as fetcher:
+        races = fetch_meeting_results(fetcher, page_url('results'), pd)
+    assert [race_num for race_num, df in races] == ['1', '2']
+    assert all(not df.empty for race_num, df in races)
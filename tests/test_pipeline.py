@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+from fetchBackend import HttpFetcher
+from pipeline import stream_scrape
+
+
+@pytest.mark.parametrize('kind, keys', [
+    ('racecard', [('2025-10-19', 'Sha Tin', 1), ('2025-10-19', 'Sha Tin', 2)]),
+    ('results', ['1', '2']),
+    ('speedpro', [None, None]),
+])
+def test_each_race_is_scraped_once(tmp_path, page_url, kind, keys):
+    output_file = str(tmp_path / f'{kind}.xlsx')
+    with HttpFetcher(max_connections=2) as fetcher:
+        races = stream_scrape(kind, fetcher.get, page_url(kind), output_file, fetch_workers=2, processes=False)
+    assert [key for key, df in races] == keys
+    assert all(not df.empty for key, df in races)
+
+    assert len(pd.read_excel(output_file, sheet_name=None)) == len(keys)
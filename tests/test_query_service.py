@@ -0,0 +1,55 @@
+import pandas as pd
+import historyStore
+from pastRaces import parse_results_records
+from queryService import QueryService, CARD_COLUMNS, FORM_HEADINGS
+from scrapeRacePage import parse_race_page
+
+RESULTS_DATE = '2025-10-19'
+CARD_DATE = '2025-10-26'
+
+
+def store_race(path, site_html, race_no):
+    conn = historyStore.connect(path)
+    try:
+        historyStore.upsert_race_records(conn, *parse_results_records(site_html(f'results_race{race_no}.html'), race_no))
+    finally:
+        conn.close()
+
+
+def store_card(path, site_html):
+    conn = historyStore.connect(path)
+    try:
+        for race_no in (1, 2):
+            card = parse_race_page(site_html(f'racecard_race{race_no}.html'), pd)
+            historyStore.upsert_racecard(conn, CARD_DATE, 'Sha Tin', race_no, card)
+    finally:
+        conn.close()
+
+
+def test_lookup_sees_race_ingested_after_it(tmp_path, site_html):
+    path = str(tmp_path / 'history.sqlite')
+    store_race(path, site_html, 1)
+    with QueryService(path) as service:
+        assert service.results(RESULTS_DATE)['race_no'].unique().tolist() == [1]
+        assert service.results(RESULTS_DATE)['race_no'].unique().tolist() == [1]
+        assert service.cache_stats()['hits'] == 1
+
+        # Written through another connection, as the daily run does while the service is up
+        store_race(path, site_html, 2)
+        assert service.results(RESULTS_DATE)['race_no'].unique().tolist() == [1, 2]
+        assert service.cache_stats()['loads'] == 2
+
+
+def test_racecard_on_date_without_card(tmp_path, site_html):
+    path = str(tmp_path / 'history.sqlite')
+    store_race(path, site_html, 1)
+    store_card(path, site_html)
+    with QueryService(path) as service:
+        card = service.racecard(CARD_DATE)
+        assert card['race_no'].unique().tolist() == [1, 2]
+        assert set(card['Date'].dropna()) == {pd.Timestamp(RESULTS_DATE)}
+
+        empty = service.racecard('2030-01-01')
+        assert empty.empty
+        assert list(empty.columns) == CARD_COLUMNS + list(FORM_HEADINGS.values())
+        assert service.racecard(CARD_DATE, race_no=9).empty
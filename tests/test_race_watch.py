@@ -0,0 +1,141 @@
+import json
+import re
+import historyStore
+import raceWatch
+from fetchBackend import HttpFetcher
+from raceWatch import RacecardWatcher
+from scrapeRacePage import parse_racecard_records
+
+
+class FailingIndexFetcher(HttpFetcher):
+    """HttpFetcher whose racecard index page fails on chosen calls."""
+
+    def __init__(self, index_url, fail_calls, **kwargs):
+        super().__init__(**kwargs)
+        self.index_url = index_url
+        self.fail_calls = fail_calls
+        self.index_calls = 0
+
+    def get_conditional(self, url, etag=None, last_modified=None):
+        if url == self.index_url:
+            self.index_calls += 1
+            if self.index_calls in self.fail_calls:
+                raise OSError("connection reset")
+        return super().get_conditional(url, etag, last_modified)
+
+
+def test_failed_rediscovery_keeps_watching(tmp_path, page_url):
+    url = page_url('racecard')
+    with FailingIndexFetcher(url, {2}, max_connections=2) as fetcher:
+        watcher = RacecardWatcher(fetcher, url, str(tmp_path / 'changes.jsonl'), rediscover_every=1)
+        first = watcher.poll()
+        races = list(watcher.races)
+        assert [delta['change'] for delta in first] == ['snapshot'] * len(races)
+
+        assert watcher.poll() == []
+        assert list(watcher.races) == races
+        assert fetcher.index_calls == 2
+
+
+def test_failed_first_discovery_is_retried(tmp_path, page_url):
+    url = page_url('racecard')
+    with FailingIndexFetcher(url, {1}, max_connections=2) as fetcher:
+        watcher = RacecardWatcher(fetcher, url, str(tmp_path / 'changes.jsonl'))
+        assert watcher.poll() == []
+        assert len(watcher.poll()) == 2
+
+
+class EditingFetcher(HttpFetcher):
+    """HttpFetcher that edits one page's body, or answers 304 Not Modified for every page."""
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.edit = None
+        self.not_modified = False
+
+    def get_conditional(self, url, etag=None, last_modified=None):
+        if self.not_modified:
+            return None, etag, last_modified
+        html, etag, last_modified = super().get_conditional(url, etag, last_modified)
+        if url == self.url and self.edit is not None:
+            html = self.edit(html)
+        return html, etag, last_modified
+
+
+def runner_rows(html):
+    return re.findall(r'<tr>\s*<td>\d+</td>.*?</tr>', html, re.DOTALL)
+
+
+def change_card(html):
+    """Updates the going, changes runner 1's jockey, scratches runner 2 and adds runner 9."""
+    rows = runner_rows(html)
+    added = (rows[0].replace('<td>1</td>', '<td>9</td>', 1).replace('GOLDEN SPIRIT', 'NEW ARRIVAL')
+             .replace('H123', 'N999'))
+    html = html.replace(rows[1], '').replace(rows[-1], rows[-1] + added)
+    return html.replace('Z Purton', 'J Moreira').replace('1200M, Good', '1200M, Good To Yielding')
+
+
+def stored_card(conn):
+    return dict(conn.execute("SELECT horse_name, jockey FROM racecards WHERE race_no = 1").fetchall())
+
+
+def test_changes_are_logged_and_stored(tmp_path, page_url):
+    url = page_url('racecard')
+    race_url = url + '?RaceDate=2025/10/19&Racecourse=ST&RaceNo=1'
+    log_file = tmp_path / 'changes.jsonl'
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        with EditingFetcher(race_url, max_connections=2) as fetcher:
+            watcher = RacecardWatcher(fetcher, url, str(log_file), conn=conn)
+            watcher.poll()
+            assert stored_card(conn)['HAPPY TIMES'] == 'H Bowman'
+
+            fetcher.edit = change_card
+            deltas = watcher.poll()
+        assert [(delta['change'], delta.get('horse_no')) for delta in deltas] == [
+            ('race', None), ('modified', 1), ('removed', 2), ('added', 9)]
+        assert deltas[0]['fields'] == {'going': ['Good', 'Good To Yielding']}
+        assert deltas[1]['fields']['jockey'] == ['Z Purton', 'J Moreira']
+        assert deltas[3]['runner']['horse_name'] == 'NEW ARRIVAL'
+        assert all(delta['race_no'] == 1 for delta in deltas)
+
+        card = stored_card(conn)
+        assert 'HAPPY TIMES' not in card
+        assert card['GOLDEN SPIRIT'] == 'J Moreira' and 'NEW ARRIVAL' in card
+
+        logged = [json.loads(line)['change'] for line in log_file.read_text(encoding='utf-8').splitlines()]
+        assert logged == ['snapshot', 'snapshot', 'race', 'modified', 'removed', 'added']
+    finally:
+        conn.close()
+
+
+def test_unchanged_pages_are_not_parsed(tmp_path, page_url, monkeypatch):
+    parsed = []
+
+    def counting_parse(soup, pd):
+        parsed.append(soup)
+        return parse_racecard_records(soup, pd)
+
+    monkeypatch.setattr(raceWatch, 'parse_racecard_records', counting_parse)
+    url = page_url('racecard')
+    race_url = url + '?RaceDate=2025/10/19&Racecourse=ST&RaceNo=1'
+    with EditingFetcher(race_url, max_connections=2) as fetcher:
+        watcher = RacecardWatcher(fetcher, url)
+        assert len(watcher.poll()) == 2
+        assert len(parsed) == 2
+
+        # Same body
+        assert watcher.poll() == []
+        assert len(parsed) == 2
+
+        # New markup around the same card: parsed, but nothing changed
+        fetcher.edit = lambda html: html.replace('</body>', '<!-- served 12:00 --></body>')
+        assert watcher.poll() == []
+        assert len(parsed) == 3
+
+        # 304 Not Modified
+        fetcher.not_modified = True
+        fetcher.edit = change_card
+        assert watcher.poll() == []
+        assert len(parsed) == 3
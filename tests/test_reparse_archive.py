@@ -0,0 +1,54 @@
+import historyStore
+from conftest import SITE_FOLDER
+from pageArchive import PageArchive
+from replayServer import HKJC_BASE_URL, ReplaySite
+from reparseArchive import reparse_archive
+
+RACE_1_URL = HKJC_BASE_URL + '/racing/information/English/Racing/LocalResults.aspx?RaceDate=2025/10/19&Racecourse=ST&RaceNo=1'
+FETCHED_AT = 1760900000.0
+
+
+def archive_site(folder):
+    """Archives every recorded page of the replay site under its live URL."""
+    site = ReplaySite(SITE_FOLDER)
+    archive = PageArchive(folder)
+    for target in site.pages:
+        archive.put(HKJC_BASE_URL + target, site.page(target), fetched_at=FETCHED_AT)
+    return archive
+
+
+def test_reparse_rebuilds_the_store(tmp_path, site_html):
+    archive = archive_site(str(tmp_path / 'archive'))
+    # A later version of race 1, e.g. after an inquiry, must win over the first one
+    archive.put(RACE_1_URL, site_html('results_race1.html').replace('K Teetan', 'Z Purton'), fetched_at=FETCHED_AT + 60)
+    archive.close()
+
+    db = str(tmp_path / 'history.sqlite')
+    summary = reparse_archive(str(tmp_path / 'archive'), db, workers=1)
+    assert summary['failed'] == 0
+    assert summary['results'] > 0 and summary['racecard'] > 0 and summary['ranking'] > 0
+
+    conn = historyStore.connect(db)
+    try:
+        assert [row[0] for row in conn.execute("SELECT race_no FROM races ORDER BY 1")] == [1, 2]
+        jockeys = {row[0] for row in conn.execute("SELECT jockey FROM results WHERE race_no = 1")}
+        assert 'Z Purton' in jockeys and 'K Teetan' not in jockeys
+        assert {row[0] for row in conn.execute("SELECT race_no FROM racecards")} == {1, 2}
+        assert not historyStore.load_ranking_table(conn, 'trainer', '2025-12-31').empty
+        assert not historyStore.load_ranking_table(conn, 'jockey', '2025-12-31').empty
+    finally:
+        conn.close()
+
+
+def test_reparse_only_stores_the_date_range(tmp_path):
+    archive_site(str(tmp_path / 'archive')).close()
+
+    db = str(tmp_path / 'history.sqlite')
+    summary = reparse_archive(str(tmp_path / 'archive'), db, kinds=('results',), end='2025-10-18', workers=1)
+    assert summary['results'] == 0 and summary['racecard'] == 0 and summary['ranking'] == 0
+
+    conn = historyStore.connect(db)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,24 @@
+import pandas as pd
+from fetchBackend import HttpFetcher
+from scrapeRacePage import fetch_all_pages, parse_race_page
+
+
+def test_page_without_racecard_is_empty_frame():
+    df = parse_race_page('<html><body><p>No racecard published</p></body></html>', pd)
+    assert isinstance(df, pd.DataFrame)
+    assert df.empty
+
+
+def test_racecard_page_parses(site_html):
+    df = parse_race_page(site_html('racecard_race1.html'), pd)
+    assert list(df.columns[:4]) == ['Horse No.', 'Last 6 Runs', 'Horse', 'Brand No.']
+    assert 'Colour' not in df.columns
+    assert df.iloc[0, 0] == 'Race Details'
+    assert df['Horse'].iloc[1:].tolist()[:2] == ['GOLDEN SPIRIT', 'HAPPY TIMES']
+
+
+def test_fetch_all_pages_skips_other_venues(page_url):
+    with HttpFetcher(max_connections=2) as fetcher:
+        races = fetch_all_pages(fetcher, page_url('racecard'), pd, None)
+    assert [key for key, df in races] == [('2025-10-19', 'Sha Tin', 1), ('2025-10-19', 'Sha Tin', 2)]
+    assert all(not df.empty for key, df in races)
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+import pandas as pd
+import pytest
+from selenium.webdriver.common.by import By
+import speedPro
+from speedPro import parse_speed_pro_feed, parse_speed_pro_page, scrape_all_pages_speed_pro_feed
+
+RACE_URLS = ['http://replay/formguide.html?race=1', 'http://replay/formguide.html?race=2']
+
+
+def feed_for(table):
+    """
+    Builds a feed payload holding the runners of a parsed Speed Pro table.
+
+    The field names are aliases from FEED_FIELDS itself, as no live feed has been
+    recorded: the tests below check how a feed is laid out and when it is rejected,
+    not that the aliases match the real feed.
+    """
+    runners = []
+    for row in table.itertuples(index=False):
+        if row[2] == '' and runners and str(runners[-1]['horseNo']) == row[0]:
+            runners[-1]['comment'] = row[3]
+            continue
+        name, brand = row[1].rsplit(' (', 1)
+        runners.append({'horseNo': int(row[0]), 'horseName': name, 'brandNo': brand.rstrip(')'), 'draw': row[2],
+                        'energyRequired': row[3], 'fitnessRatings': row[4], 'status': row[5],
+                        'runningPosition': row[6]})
+    return {'data': {'runners': runners}}
+
+
+def test_feed_rows_are_laid_out_like_the_table(site_html):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    df = parse_speed_pro_feed([feed_for(table)], pd, list(table.columns))
+    pd.testing.assert_frame_equal(df, table)
+
+
+def test_feed_missing_a_column_is_rejected(site_html):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    payload = feed_for(table)
+    for runner in payload['data']['runners']:
+        runner['runPos'] = runner.pop('runningPosition')
+    payload['data']['runners'][0].pop('runPos')
+
+    with pytest.raises(ValueError, match='Running Position'):
+        parse_speed_pro_feed([payload], pd, list(table.columns))
+
+
+def test_unknown_page_header_is_rejected(site_html):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    headers = list(table.columns) + ['Weight']
+
+    with pytest.raises(ValueError, match='Weight'):
+        parse_speed_pro_feed([feed_for(table)], pd, headers)
+
+
+class FakePool:
+    """DriverPool stand-in running every task in the calling thread with a dummy driver."""
+
+    @contextmanager
+    def driver(self):
+        yield object()
+
+    def run(self, task, *args):
+        return task(object(), *args)
+
+    def map(self, task, items):
+        return [task(object(), item) for item in items]
+
+
+def fake_browser(monkeypatch, site_html, feeds, table_rendered=True):
+    """Patches speedPro's browser calls: each capture of a race returns the next of its feeds."""
+    captures = []
+    monkeypatch.setattr(speedPro, 'load_page', lambda driver, url: None)
+    monkeypatch.setattr(speedPro, 'extract_urls_from_race_nav', lambda driver, By: list(RACE_URLS))
+    monkeypatch.setattr(speedPro, 'save_to_csv_with_sheets', lambda frames, file_name, pd: None)
+
+    def capture_feed(driver, url):
+        captures.append(url)
+        return feeds[url].pop(0)
+
+    def wait_for_element(driver, by, value, timeout=10):
+        captures.append('waited for the table')
+        return table_rendered
+
+    monkeypatch.setattr(speedPro, 'capture_feed', capture_feed)
+    monkeypatch.setattr(speedPro, 'wait_for_element', wait_for_element)
+    monkeypatch.setattr(speedPro, 'take_snapshot', lambda driver: site_html('speedpro_race1.html'))
+    return captures
+
+
+def test_feed_races_do_not_wait_for_the_table(site_html, monkeypatch):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    feed = [('http://replay/feed?race=1', feed_for(table))]
+    captures = fake_browser(monkeypatch, site_html, {url: [feed] for url in RACE_URLS})
+
+    frames = scrape_all_pages_speed_pro_feed(FakePool(), RACE_URLS[0], By, pd, 'speedpro.xlsx')
+    assert len(frames) == 2
+    assert 'waited for the table' not in captures
+
+
+def test_mismatched_feed_reads_the_rendered_table(site_html, monkeypatch):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    payload = feed_for(table)
+    for runner in payload['data']['runners']:
+        runner.pop('status')
+    feeds = {url: [[('http://replay/feed', payload)]] for url in RACE_URLS}
+    fake_browser(monkeypatch, site_html, feeds)
+
+    frames = scrape_all_pages_speed_pro_feed(FakePool(), RACE_URLS[0], By, pd, 'speedpro.xlsx')
+    assert len(frames) == 2
+    pd.testing.assert_frame_equal(frames[0], table)
+
+
+def test_empty_first_race_is_captured_again(site_html, monkeypatch):
+    table = parse_speed_pro_page(site_html('speedpro_race1.html'), pd)
+    feed = [('http://replay/feed?race=1', feed_for(table))]
+    feeds = {RACE_URLS[0]: [[], feed], RACE_URLS[1]: [feed]}
+    captures = fake_browser(monkeypatch, site_html, feeds, table_rendered=False)
+
+    frames = scrape_all_pages_speed_pro_feed(FakePool(), RACE_URLS[0], By, pd, 'speedpro.xlsx')
+    assert len(frames) == 2
+    assert captures.count(RACE_URLS[0]) == 2
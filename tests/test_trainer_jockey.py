@@ -0,0 +1,17 @@
+import pandas as pd
+from fetchBackend import HttpFetcher
+from trainerJockey import fetch_trainer_jockey, parse_ranking_page
+
+
+def test_ranking_page_parses(site_html):
+    df = parse_ranking_page(site_html('trainer_ranking.html'), pd)
+    assert list(df.columns) == ['Trainer', 'No. of Wins', 'No. of 2nds', 'No. of 3rds', 'No. of 4ths',
+                                'No. of 5ths', 'Total Rides', 'Stakes won']
+    assert df.iloc[0].tolist()[:2] == ['J Size', '25']
+
+
+def test_fetch_rankings(page_url, site_html):
+    with HttpFetcher(max_connections=2) as fetcher:
+        for kind, file_name in (('trainer', 'trainer_ranking.html'), ('jockey', 'jockey_ranking.html')):
+            df = fetch_trainer_jockey(fetcher, page_url(kind), pd, None)
+            pd.testing.assert_frame_equal(df, parse_ranking_page(site_html(file_name), pd))
@@ -0,0 +1,83 @@
+import historyStore
+import workQueue
+from backfill import race_task, run_task
+from fetchBackend import HttpFetcher
+from workQueue import WorkQueue
+
+
+def queue_file(tmp_path):
+    return str(tmp_path / 'queue.sqlite')
+
+
+def test_expired_lease_is_claimed_by_another_worker(tmp_path, monkeypatch):
+    queue = WorkQueue(queue_file(tmp_path), lease_seconds=60)
+    queue.add([('task', 'race', {'url': 'a'}, 0)])
+    assert [task[0] for task in queue.claim('worker-1')] == ['task']
+    assert queue.claim('worker-2') == []
+
+    now = workQueue.time.time()
+    monkeypatch.setattr(workQueue.time, 'time', lambda: now + 61)
+    assert queue.stats()['expired'] == 1
+    assert queue.claim('worker-2') == [('task', 'race', {'url': 'a'}, 2)]
+
+    # The first worker lost its lease: it can neither finish nor keep the task
+    assert not queue.complete('task', 'worker-1')
+    assert queue.heartbeat('worker-1') == 0
+    assert queue.complete('task', 'worker-2')
+    assert queue.stats()['done'] == 1
+    queue.close()
+
+
+def test_heartbeat_keeps_the_lease(tmp_path, monkeypatch):
+    queue = WorkQueue(queue_file(tmp_path), lease_seconds=60)
+    queue.add([('task', 'race', {}, 0)])
+    queue.claim('worker-1')
+
+    now = workQueue.time.time()
+    monkeypatch.setattr(workQueue.time, 'time', lambda: now + 50)
+    assert queue.heartbeat('worker-1') == 1
+    monkeypatch.setattr(workQueue.time, 'time', lambda: now + 100)
+    assert queue.claim('worker-2') == []
+    queue.close()
+
+
+def test_task_fails_after_max_attempts(tmp_path, monkeypatch):
+    queue = WorkQueue(queue_file(tmp_path), lease_seconds=60, max_attempts=2)
+    queue.add([('task', 'race', {}, 0)])
+    for attempt in (1, 2):
+        assert queue.claim('worker')[0][3] == attempt
+        assert queue.fail('task', 'worker', f'error {attempt}')
+    assert queue.claim('worker') == []
+    assert queue.failures() == [('task', 2, 'error 2')]
+
+    # A task whose worker keeps dying is given up once its last lease expires
+    queue.add([('crashing', 'race', {}, 0)])
+    now = workQueue.time.time()
+    for attempt in (1, 2, 3):
+        monkeypatch.setattr(workQueue.time, 'time', lambda: now + 61 * attempt)
+        claimed = queue.claim('worker')
+        assert [task[0] for task in claimed] == (['crashing'] if attempt < 3 else [])
+    assert [task_id for task_id, _, _ in queue.failures()] == ['crashing', 'task']
+
+    assert queue.retry_failed() == 2
+    assert queue.stats()['pending'] == 2
+    queue.close()
+
+
+def test_meeting_task_queues_its_races(tmp_path, page_url):
+    url = page_url('results') + '?RaceDate=2025/10/19'
+    queue = WorkQueue(queue_file(tmp_path))
+    conn = historyStore.connect(str(tmp_path / 'history.sqlite'))
+    try:
+        with HttpFetcher(max_connections=1) as fetcher:
+            stored = run_task('meeting', {'url': url, 'race_no': 1}, fetcher, conn, queue)
+            assert stored > 0
+            tasks = queue.claim('worker', limit=10)
+            assert [task[0] for task in tasks] == ['race 2025-10-19 ST 02']
+            task_id, kind, payload, _ = tasks[0]
+            assert run_task(kind, payload, fetcher, conn, queue) > 0
+        assert [row[0] for row in conn.execute("SELECT race_no FROM races ORDER BY 1")] == [1, 2]
+        assert race_task(payload['url'].replace('RaceNo=2', 'RaceNo=1')) is None
+    finally:
+        conn.close()
+        queue.close()
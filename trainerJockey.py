@@ -1,4 +1,7 @@
 from utils import save_to_csv_with_sheets
+from pageSnapshot import parse_html, element_text
+from browser import wait_for_element
+from fetchPolicy import load_page
 def scrape_trainer_jockey(driver, url, By, pd, file_name):
     """
     Scrapes the trainer ranking table from the provided URL.
@@ -12,11 +15,13 @@ def scrape_trainer_jockey(driver, url, By, pd, file_name):
     Returns:
         pd.DataFrame: A pandas DataFrame containing the trainer ranking data.
     """
-    driver.get(url)
     headers = []
     rows = []
 
     try:
+        load_page(driver, url)
+        wait_for_element(driver, By.CSS_SELECTOR, '#innerContent tbody')
+
         # Locate the table by its ID
         table = driver.find_element(By.ID, 'innerContent')
         
@@ -42,3 +47,59 @@ def scrape_trainer_jockey(driver, url, By, pd, file_name):
 
     except Exception as e:
         print(f"Error extracting table data: {e}")
+
+def fetch_trainer_jockey(fetcher, url, pd, file_name):
+    """
+    Same as scrape_trainer_jockey, but loads the ranking page through a fetch backend.
+
+    Args:
+        fetcher: Fetch backend (fetchBackend.HttpFetcher or fetchBackend.SeleniumFetcher).
+        url (str): URL of the trainer or jockey ranking page.
+        pd: pandas module.
+        file_name (str): Excel file to write, or None to only return the data.
+
+    Returns:
+        pd.DataFrame: The ranking table, or None if it could not be scraped.
+    """
+    try:
+        df = parse_ranking_page(fetcher.get(url), pd)
+        if file_name:
+            save_to_csv_with_sheets([df], file_name, pd)
+        return df
+
+    except Exception as e:
+        print(f"Error extracting table data: {e}")
+
+def parse_ranking_page(html, pd):
+    """
+    Parses a trainer or jockey ranking table from the page HTML.
+
+    Args:
+        html (str): Ranking page HTML.
+        pd: pandas module.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame containing the ranking data.
+    """
+    soup = parse_html(html)
+    rows = []
+
+    # Locate the table by its ID
+    table = soup.find(id='innerContent')
+
+    # Locate the inner table
+    inner_table = table.find_all('table')[1]
+
+    # Extract table headers from the inner table's <thead>
+    inner_thead = inner_table.find('thead')
+    inner_tr = inner_thead.find_all('tr')[1]
+    headers = [element_text(td) for td in inner_tr.find_all('td') if element_text(td)]
+
+    # Extract table rows from the inner table's <tbody>
+    inner_tbody = inner_table.find('tbody')
+    for tr in inner_tbody.find_all('tr'):
+        row = [element_text(td) for td in tr.find_all('td') if element_text(td)]
+        if row:  # Only append non-empty rows
+            rows.append(row)
+
+    return pd.DataFrame(rows, columns=headers)
@@ -1,25 +1,37 @@
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+import runMetrics
 
-def save_to_csv_with_sheets(dataframes, output_file, pd):
+def save_to_csv_with_sheets(dataframes, output_file, pd, fmt=None):
     """
     Saves a list of DataFrames into an Excel file with each DataFrame on a separate sheet.
 
+    The DataFrames are streamed out one at a time (see exportWriter), so a generator
+    can be passed to avoid holding every race in memory.
+
     Args:
-        dataframes (list of pd.DataFrame): List of DataFrames to save.
-        output_file (str): File path for the Excel file.
+        dataframes (iterable of pd.DataFrame): DataFrames to save.
+        output_file (str): File path for the Excel file (or .csv.gz / .parquet file).
+        fmt (str): 'xlsx', 'csv' or 'parquet'. Defaults to the file extension.
 
     Returns:
         None
     """
+    # openpyxl is only loaded by runs that write a workbook
+    from exportWriter import open_writer
     try:
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            for i, df in enumerate(dataframes):
-                sheet_name = f"Page_{i + 1}"  # Unique sheet name for each DataFrame
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        start = time.perf_counter()
+        sheets = rows = 0
+        with open_writer(output_file, fmt) as writer:
+            for df in dataframes:
+                writer.write(df)  # Sheets are named Page_1, Page_2, ...
+                sheets += 1
+                rows += len(df)
+        runMetrics.record_export(output_file, time.perf_counter() - start, sheets, rows)
         print(f"Data saved to {output_file}")
     except Exception as e:
         print(f"An error occurred while saving data: {e}")
@@ -0,0 +1,232 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+QUEUE_FILE = 'Data/backfill-queue.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_claimable ON tasks (status, priority, task_id);
+"""
+
+
+def worker_name():
+    """Default worker id: host and process, so workers on several machines sharing a queue stay distinct."""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    """
+    Durable task queue in a SQLite file, shared by any number of worker processes.
+
+    A worker claims tasks by taking a lease on them. While it works it renews
+    its leases with heartbeat(); if it crashes they expire and the tasks are
+    claimed again by another worker. Every claim counts as an attempt, and a
+    task that keeps failing is given up after max_attempts. Claims are a single
+    UPDATE, so two workers never hold the same task.
+
+    Each process (and thread) needs its own WorkQueue. SQLite locking is only
+    reliable on a local disk, so workers on other machines should reach the
+    queue through a local file, not a network share.
+    """
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=120.0, max_attempts=4):
+        """
+        Args:
+            path (str): SQLite queue file.
+            lease_seconds (float): How long a claim lasts without a heartbeat.
+            max_attempts (int): Claims of a task before it is marked failed.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def add(self, tasks):
+        """
+        Adds tasks, ignoring any whose id is already queued (in whatever state).
+
+        Args:
+            tasks (iterable): (task_id, kind, payload dict, priority) tuples. Lower priorities are claimed first.
+
+        Returns:
+            int: Number of tasks added.
+        """
+        now = time.time()
+        rows = [(task_id, kind, json.dumps(payload), priority, now) for task_id, kind, payload, priority in tasks]
+        before = self._conn.total_changes
+        # One transaction for the lot, the connection otherwise commits every statement
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (task_id, kind, payload, priority, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        return self._conn.total_changes - before
+
+    def claim(self, worker_id, limit=1):
+        """
+        Leases up to limit tasks: pending ones, and ones whose lease has expired.
+
+        Args:
+            worker_id (str): Id of the claiming worker.
+            limit (int): Most tasks to claim.
+
+        Returns:
+            list: (task_id, kind, payload dict, attempt number) tuples.
+        """
+        now = time.time()
+        rows = self._conn.execute(
+            """
+            UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+            WHERE task_id IN (
+                SELECT task_id FROM tasks
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY priority, task_id LIMIT ?)
+            RETURNING task_id, kind, payload, attempts
+            """, (worker_id, now + self.lease_seconds, now, limit)).fetchall()
+
+        tasks = []
+        for task_id, kind, payload, attempts in rows:
+            if attempts > self.max_attempts:
+                # Claimed again after its last attempt's lease expired, e.g. it keeps crashing its worker
+                self._finish(task_id, worker_id, 'failed', 'lease expired on the last attempt')
+            else:
+                tasks.append((task_id, kind, json.loads(payload), attempts))
+        return sorted(tasks)
+
+    def heartbeat(self, worker_id):
+        """
+        Renews every lease a worker holds.
+
+        Returns:
+            int: Number of leases renewed.
+        """
+        return self._conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE status = 'leased' AND lease_owner = ?",
+            (time.time() + self.lease_seconds, worker_id)).rowcount
+
+    def complete(self, task_id, worker_id):
+        """
+        Marks a leased task done.
+
+        Returns:
+            bool: False if the worker had lost the lease (the task may have been done by another worker too).
+        """
+        return self._finish(task_id, worker_id, 'done', None)
+
+    def fail(self, task_id, worker_id, error):
+        """
+        Releases a task that failed, to be retried unless it is out of attempts.
+
+        Returns:
+            bool: False if the worker had lost the lease.
+        """
+        return self._conn.execute(
+            """
+            UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                lease_owner = NULL, lease_expires = NULL, last_error = ?,
+                finished_at = CASE WHEN attempts >= ? THEN ? END
+            WHERE task_id = ? AND status = 'leased' AND lease_owner = ?
+            """, (self.max_attempts, str(error), self.max_attempts, time.time(), task_id, worker_id)).rowcount == 1
+
+    def retry_failed(self):
+        """
+        Puts every failed task back in the queue with its attempts reset.
+
+        Returns:
+            int: Number of tasks requeued.
+        """
+        return self._conn.execute(
+            "UPDATE tasks SET status = 'pending', attempts = 0, finished_at = NULL WHERE status = 'failed'").rowcount
+
+    def stats(self):
+        """
+        Returns the number of tasks in each state, split into expired and live leases.
+
+        Returns:
+            dict: pending, leased, expired, done and failed counts.
+        """
+        counts = {'pending': 0, 'leased': 0, 'expired': 0, 'done': 0, 'failed': 0}
+        rows = self._conn.execute(
+            "SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END, COUNT(*) "
+            "FROM tasks GROUP BY 1", (time.time(),)).fetchall()
+        counts.update(dict(rows))
+        return counts
+
+    def failures(self):
+        """Lists failed tasks as (task_id, attempts, last_error) tuples."""
+        return self._conn.execute(
+            "SELECT task_id, attempts, last_error FROM tasks WHERE status = 'failed' ORDER BY task_id").fetchall()
+
+    def close(self):
+        self._conn.close()
+
+    def _finish(self, task_id, worker_id, status, error):
+        return self._conn.execute(
+            "UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, last_error = ?, finished_at = ? "
+            "WHERE task_id = ? AND status = 'leased' AND lease_owner = ?",
+            (status, error, time.time(), task_id, worker_id)).rowcount == 1
+
+
+class Heartbeat:
+    """
+    Background thread renewing a worker's leases, with its own queue connection.
+
+    Use as a context manager around the worker's loop.
+    """
+
+    def __init__(self, path, worker_id, lease_seconds):
+        """
+        Args:
+            path (str): SQLite queue file.
+            worker_id (str): Worker whose leases are renewed.
+            lease_seconds (float): Lease length; leases are renewed every third of it.
+        """
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        queue = WorkQueue(self.path, self.lease_seconds)
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    queue.heartbeat(self.worker_id)
+                except sqlite3.Error as e:
+                    print(f"Heartbeat of {self.worker_id} failed: {e}")
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()